@@ -0,0 +1 @@
+"""Benchmarks of mmzip over generated zip corpora, run with python -m benchmarks.run."""
@@ -0,0 +1,43 @@
+import sys
+import json
+import argparse
+
+def compare(base: dict, head: dict, threshold: float) -> list:
+    """(name, seconds ratio, peak rss ratio, regressed) of the benchmarks in both results."""
+    base_map = {result["name"]: result for result in base["results"]}
+    row_list = []
+    for result in head["results"]:
+        base_result = base_map.get(result["name"])
+        if base_result is None:
+            continue
+        seconds_ratio = result["seconds"] / base_result["seconds"] if base_result["seconds"] > 0 else None
+        rss_ratio = result["peak_rss_bytes"] / base_result["peak_rss_bytes"] if base_result["peak_rss_bytes"] > 0 else None
+        regressed = any(ratio is not None and ratio > threshold for ratio in (seconds_ratio, rss_ratio))
+        row_list.append((result["name"], seconds_ratio, rss_ratio, regressed))
+    return row_list
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=1.1, help="ratio above which a benchmark counts as regressed")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    if base["meta"]["corpus"]["corpus"] != head["meta"]["corpus"]["corpus"]:
+        print("warning: the results were taken on different corpora", file=sys.stderr)
+    print("{:<24} {:>10} {:>10}".format("benchmark", "time", "peak rss"))
+    regressed = False
+    for name, seconds_ratio, rss_ratio, row_regressed in compare(base, head, args.threshold):
+        print("{:<24} {:>10} {:>10}{}".format(
+            name,
+            "-" if seconds_ratio is None else "{:.2f}x".format(seconds_ratio),
+            "-" if rss_ratio is None else "{:.2f}x".format(rss_ratio),
+            "  REGRESSED" if row_regressed else ""))
+        regressed = regressed or row_regressed
+    sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import json
+import math
+import random
+import pathlib
+import zipfile
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# corpus parameters and their defaults
+CORPUS_ARCHIVE_COUNT = "archive_count"
+CORPUS_FILE_COUNT = "file_count"
+CORPUS_SIZE_MEDIAN = "size_median"
+CORPUS_SIZE_SIGMA = "size_sigma"
+CORPUS_SIZE_MAX = "size_max"
+CORPUS_DUPLICATE_RATIO = "duplicate_ratio"
+CORPUS_COMPRESSIBILITY = "compressibility"
+CORPUS_SEED = "seed"
+
+DEFAULT_CORPUS = {
+    CORPUS_ARCHIVE_COUNT: 3,
+    CORPUS_FILE_COUNT: 200,
+    CORPUS_SIZE_MEDIAN: 32 * 1024,
+    CORPUS_SIZE_SIGMA: 1.5,
+    CORPUS_SIZE_MAX: 8 * 1024 * 1024,
+    CORPUS_DUPLICATE_RATIO: 0.3,
+    CORPUS_COMPRESSIBILITY: 0.5,
+    CORPUS_SEED: 0
+}
+
+CORPUS_INFO_FILE_NAME = "corpus.json"
+
+_BLOCK_SIZE = 4096
+_WORDS = b"lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna aliqua ".split()
+
+def _file_size(rnd: random.Random, corpus: dict) -> int:
+    size = int(rnd.lognormvariate(math.log(corpus[CORPUS_SIZE_MEDIAN]), corpus[CORPUS_SIZE_SIGMA]))
+    return min(size, corpus[CORPUS_SIZE_MAX])
+
+def _file_data(seed: int, size: int, compressibility: float) -> bytes:
+    """Blocks of words or of random bytes, compressibility is the share of word blocks."""
+    rnd = random.Random(seed)
+    block_list = []
+    remain = size
+    while remain > 0:
+        block_size = min(_BLOCK_SIZE, remain)
+        if rnd.random() < compressibility:
+            words = []
+            length = 0
+            while length < block_size:
+                word = rnd.choice(_WORDS)
+                words.append(word)
+                length += len(word) + 1
+            block_list.append(b" ".join(words)[:block_size])
+        else:
+            block_list.append(rnd.randbytes(block_size))
+        remain -= block_size
+    return b"".join(block_list)
+
+def generate_corpus(corpus_dir: str, **kwargs) -> dict:
+    """Write archive_count zip files into corpus_dir and return the parameters used.
+
+    Every archive holds file_count files with log-normal sizes. A share of
+    duplicate_ratio of them repeats the content of a file written before,
+    in the same archive or an earlier one, so both in-archive and
+    cross-archive dedup have work to do. An existing corpus generated with
+    the same parameters is reused.
+    """
+    corpus = dict(DEFAULT_CORPUS)
+    for key, value in kwargs.items():
+        if key not in corpus:
+            raise Exception("unknown corpus parameter: " + key)
+        if value is not None:
+            corpus[key] = value
+    corpus_dir_path = pathlib.Path(corpus_dir)
+    info_path = corpus_dir_path / CORPUS_INFO_FILE_NAME
+    if info_path.exists() and json.loads(info_path.read_text())["corpus"] == corpus:
+        logger.info("Reusing corpus in %s", corpus_dir_path)
+        return json.loads(info_path.read_text())
+    corpus_dir_path.mkdir(parents=True, exist_ok=True)
+
+    rnd = random.Random(corpus[CORPUS_SEED])
+    written = []
+    archive_list = []
+    total_size = 0
+    for archive_num in range(corpus[CORPUS_ARCHIVE_COUNT]):
+        archive_path = corpus_dir_path / "corpus{:03}.zip".format(archive_num)
+        logger.info("Generating %s", archive_path)
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for file_num in range(corpus[CORPUS_FILE_COUNT]):
+                # files are kept as (seed, size) and regenerated when repeated
+                if written and rnd.random() < corpus[CORPUS_DUPLICATE_RATIO]:
+                    seed, size = rnd.choice(written)
+                else:
+                    seed, size = rnd.getrandbits(64), _file_size(rnd, corpus)
+                    written.append((seed, size))
+                data = _file_data(seed, size, corpus[CORPUS_COMPRESSIBILITY])
+                zf.writestr("dir{:02}/file{:05}.bin".format(file_num % 10, file_num), data)
+                total_size += len(data)
+        archive_list.append(archive_path.name)
+    info = {
+        "corpus": corpus,
+        "archive_list": archive_list,
+        "total_size": total_size,
+        "distinct_size": sum(size for _, size in written)
+    }
+    info_path.write_text(json.dumps(info, indent=2))
+    return info
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import shutil
+import pathlib
+import platform
+import argparse
+import datetime
+import resource
+import subprocess
+import tracemalloc
+import multiprocessing
+import logging
+import mmzip
+import benchmarks.corpus as corpus
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# work directory layout, each benchmark reads what the one before it wrote
+_MMDIR_FORMAT = "mmdir{:03}"
+_REMOVE_SAME_FILE_DIR = "remove_same_file"
+_FUSION_DIR = "fusion"
+_MMZIP_FILE = "fusion.mmzip"
+_MMZIP_EXTRACT_DIR = "mmzip_extract"
+_MMDIR_EXTRACT_DIR = "mmdir_extract"
+
+def _remove(path: pathlib.Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+def _setup_zip_to_mmdir(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    for archive_num in range(len(info["archive_list"])):
+        _remove(work_dir / _MMDIR_FORMAT.format(archive_num))
+
+def _run_zip_to_mmdir(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    for archive_num, archive_name in enumerate(info["archive_list"]):
+        mmzip.zip_to_mmdir(str(corpus_dir / archive_name), str(work_dir / _MMDIR_FORMAT.format(archive_num)))
+
+def _setup_mmdir_remove_same_file(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    # runs on a copy, the fusion benchmark wants the mmdirs with their duplicates
+    _remove(work_dir / _REMOVE_SAME_FILE_DIR)
+    shutil.copytree(work_dir / _MMDIR_FORMAT.format(0), work_dir / _REMOVE_SAME_FILE_DIR)
+
+def _run_mmdir_remove_same_file(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    mmzip.mmdir_remove_same_file(str(work_dir / _REMOVE_SAME_FILE_DIR))
+
+def _setup_mmdir_fusion(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    _remove(work_dir / _FUSION_DIR)
+
+def _run_mmdir_fusion(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    mm_dir_path_list = [str(work_dir / _MMDIR_FORMAT.format(archive_num)) for archive_num in range(len(info["archive_list"]))]
+    mmzip.mmdir_fusion_list(mm_dir_path_list, str(work_dir / _FUSION_DIR))
+
+def _setup_mmdir_to_mmzip(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    _remove(work_dir / _MMZIP_FILE)
+
+def _run_mmdir_to_mmzip(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    mmzip.MMDir(str(work_dir / _FUSION_DIR)).to_mmzip(str(work_dir / _MMZIP_FILE), workers=options["workers"])
+
+def _setup_mmzip_extract(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    _remove(work_dir / _MMZIP_EXTRACT_DIR)
+    (work_dir / _MMZIP_EXTRACT_DIR).mkdir()
+
+def _run_mmzip_extract(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    mm_zip = mmzip.MMZip(str(work_dir / _MMZIP_FILE))
+    try:
+        for entry_set_num in mm_zip.get_entry_set_num_list():
+            mm_zip.extract(entry_set_num, str(work_dir / _MMZIP_EXTRACT_DIR / str(entry_set_num)), workers=options["workers"])
+    finally:
+        mm_zip.close()
+
+def _setup_mmdir_extract(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    _remove(work_dir / _MMDIR_EXTRACT_DIR)
+    (work_dir / _MMDIR_EXTRACT_DIR).mkdir()
+
+def _run_mmdir_extract(corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict) -> None:
+    mm_dir = mmzip.MMDir(str(work_dir / _FUSION_DIR))
+    for entry_set_num in mm_dir.get_entry_set_num_list():
+        mm_dir.extract(entry_set_num, str(work_dir / _MMDIR_EXTRACT_DIR / str(entry_set_num)), workers=options["workers"])
+
+# name: (setup, run, output the next benchmarks read), in the order they must run
+BENCHMARK_MAP = {
+    "zip_to_mmdir": (_setup_zip_to_mmdir, _run_zip_to_mmdir, _MMDIR_FORMAT.format(0)),
+    "mmdir_remove_same_file": (_setup_mmdir_remove_same_file, _run_mmdir_remove_same_file, None),
+    "mmdir_fusion": (_setup_mmdir_fusion, _run_mmdir_fusion, _FUSION_DIR),
+    "mmdir_to_mmzip": (_setup_mmdir_to_mmzip, _run_mmdir_to_mmzip, _MMZIP_FILE),
+    "mmzip_extract": (_setup_mmzip_extract, _run_mmzip_extract, None),
+    "mmdir_extract": (_setup_mmdir_extract, _run_mmdir_extract, None)
+}
+
+def _measure(name: str, corpus_dir: str, work_dir: str, info: dict, options: dict, trace_memory: bool, queue) -> None:
+    """Run one benchmark in a fresh process, so its peak RSS is its own."""
+    run_func = BENCHMARK_MAP[name][1]
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    run_func(pathlib.Path(corpus_dir), pathlib.Path(work_dir), info, options)
+    seconds = time.perf_counter() - start
+    result = {
+        "seconds": seconds,
+        # kilobytes on Linux, bytes on macOS
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    }
+    if trace_memory:
+        result["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    queue.put(result)
+
+def run_benchmark(name: str, corpus_dir: pathlib.Path, work_dir: pathlib.Path, info: dict, options: dict, repeat: int = 1, trace_memory: bool = False) -> dict:
+    setup_func = BENCHMARK_MAP[name][0]
+    context = multiprocessing.get_context("spawn")
+    run_list = []
+    for _ in range(repeat):
+        setup_func(corpus_dir, work_dir, info, options)
+        queue = context.Queue()
+        process = context.Process(target=_measure, args=(name, str(corpus_dir), str(work_dir), info, options, trace_memory, queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise Exception("benchmark {} failed with exit code {}".format(name, process.exitcode))
+        run_list.append(queue.get())
+    seconds = min(run["seconds"] for run in run_list)
+    result = {
+        "name": name,
+        "repeat": repeat,
+        "seconds": seconds,
+        "seconds_list": [run["seconds"] for run in run_list],
+        "peak_rss_bytes": max(run["peak_rss_bytes"] for run in run_list),
+        "input_bytes": info["total_size"],
+        "throughput_mb_s": info["total_size"] / seconds / (1024 * 1024) if seconds > 0 else None
+    }
+    if trace_memory:
+        result["tracemalloc_peak_bytes"] = max(run["tracemalloc_peak_bytes"] for run in run_list)
+    logger.info("%s: %.3fs, peak rss %.1f MiB", name, seconds, result["peak_rss_bytes"] / (1024 * 1024))
+    return result
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=pathlib.Path(__file__).parent, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_all(corpus_dir: str, work_dir: str, name_list: list = None, repeat: int = 1, workers: int = 1, trace_memory: bool = False, corpus_params: dict = None) -> dict:
+    """Generate the corpus if needed, run the benchmarks and return the results.
+
+    A benchmark left out of name_list still runs once, untimed, when a
+    selected one needs its output and it is not in work_dir yet.
+    """
+    corpus_dir_path = pathlib.Path(corpus_dir)
+    work_dir_path = pathlib.Path(work_dir)
+    work_dir_path.mkdir(parents=True, exist_ok=True)
+    info = corpus.generate_corpus(corpus_dir, **(corpus_params or {}))
+    options = {"workers": workers}
+    if name_list is None:
+        name_list = list(BENCHMARK_MAP.keys())
+    for name in name_list:
+        if name not in BENCHMARK_MAP:
+            raise Exception("unknown benchmark: " + name)
+
+    all_names = list(BENCHMARK_MAP.keys())
+    last_index = max(all_names.index(name) for name in name_list)
+    result_list = []
+    for name in all_names[:last_index + 1]:
+        setup_func, run_func, output = BENCHMARK_MAP[name]
+        if name in name_list:
+            result_list.append(run_benchmark(name, corpus_dir_path, work_dir_path, info, options, repeat, trace_memory))
+        elif output is not None and not (work_dir_path / output).exists():
+            logger.info("Preparing %s", name)
+            setup_func(corpus_dir_path, work_dir_path, info, options)
+            run_func(corpus_dir_path, work_dir_path, info, options)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "workers": workers,
+            "corpus": info
+        },
+        "results": result_list
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark mmzip over a generated zip corpus.")
+    parser.add_argument("--corpus-dir", default="bench_work/corpus")
+    parser.add_argument("--work-dir", default="bench_work/work")
+    parser.add_argument("--output", "-o", help="JSON file for the results, stdout if omitted")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARK_MAP.keys()), help="benchmark to run, may be repeated")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true", help="also record the tracemalloc peak, slows the run down")
+    for key, value in corpus.DEFAULT_CORPUS.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(value), default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    corpus_params = {key: getattr(args, key) for key in corpus.DEFAULT_CORPUS}
+    results = run_all(args.corpus_dir, args.work_dir, args.only, args.repeat, args.workers, args.trace_memory, corpus_params)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        pathlib.Path(args.output).write_text(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,10 @@ from mmzip.rar_to_mmdir import rar_to_mmdir
 from mmzip.zip_to_mmdir import zip_to_mmdir
 from mmzip.mmdir_remove_same_file import mmdir_remove_same_file
 from mmzip.mmdir import MMDir
-from mmzip.mmdir_fusion import mmdir_fusion
-from mmzip.mmzip import MMZip
\ No newline at end of file
+from mmzip.mmdir_fusion import mmdir_fusion, mmdir_fusion_list
+from mmzip.mmzip import MMZip
+from mmzip.mm_convert_entry_set import mmdir_convert_entry_set, mmzip_convert_entry_set
+from mmzip.mm_observer import MMObserver, MMProgressReporter, add_observer, remove_observer, observing
+from mmzip.mm_batch import mmdir_batch_ingest
+from mmzip.archive_to_mmzip import zip_to_mmzip, rar_to_mmzip
+from mmzip.mm_async import AsyncMMDir, AsyncMMZip, MMAsyncPool, async_zip_to_mmdir, async_rar_to_mmdir
\ No newline at end of file
@@ -0,0 +1,140 @@
+import mmap
+import json
+import shutil
+import pathlib
+import logging
+import zipfile
+import rarfile
+import mmzip.mm_const as mm_const
+import mmzip.mm_digest as mm_digest
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_zip_writer as mm_zip_writer
+import mmzip.mm_observer as mm_observer
+import mmzip.mm_member_index as mm_member_index
+import mmzip.mm_archive as mm_archive
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# The source is planned from its directory first: members are grouped by
+# size and CRC-32, and only members sharing both are read to compare their
+# digests. mm_info/ is then written, followed by one member per distinct
+# content, so the data is read and written once and nothing is staged on
+# disk. A member index ends the zip.
+
+def zip_to_mmzip(file_path: str, output_path: str, compress_type: int = zipfile.ZIP_DEFLATED, compresslevel: int = None, entry_set_format: str = mm_const.ENTRY_SET_FORMAT_JSON) -> None:
+    """Convert a zip file straight into a deduplicated MMZip.
+
+    A member already compressed with compress_type is copied as it is,
+    without decompressing it. Any other one is recompressed with
+    compress_type, or stored if it does not compress, and a member that
+    would be stored and already is is copied as it is too.
+    """
+    logger.info("Converting %s to %s", file_path, output_path)
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            info_list = zf.infolist()
+            entry_list, data_list, data_index = _plan(info_list, lambda info: zf.open(info), mm_archive.zip_info_to_entry_dict)
+            entry_set = mm_archive.zip_create_entry_set(pathlib.Path(file_path).name, zf.comment, entry_list)
+            with open(file_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                    def _write_data(zipf: zipfile.ZipFile, info: zipfile.ZipInfo, entry_name: str) -> None:
+                        encrypted = info.flag_bits & 0x1 != 0
+                        if not encrypted and info.compress_type == compress_type:
+                            mm_zip_writer.copy_member_raw(zipf, mapping, info, entry_name)
+                            return
+                        member_compress_type = _choose_compress_type(lambda: zf.open(info), info.file_size, compress_type)
+                        if not encrypted and info.compress_type == member_compress_type:
+                            mm_zip_writer.copy_member_raw(zipf, mapping, info, entry_name)
+                        else:
+                            _write_recompressed(zipf, lambda: zf.open(info), info.file_size, entry_name, member_compress_type)
+                    _write_mmzip(output_path, entry_set, entry_set_format, data_list, data_index, _write_data, compress_type, compresslevel)
+    except zipfile.BadZipFile as e:
+        logger.error("Failed to convert ZIP file: %s", e)
+        raise
+
+def rar_to_mmzip(file_path: str, output_path: str, compress_type: int = zipfile.ZIP_DEFLATED, compresslevel: int = None, entry_set_format: str = mm_const.ENTRY_SET_FORMAT_JSON) -> None:
+    """Convert a rar file straight into a deduplicated MMZip.
+
+    Members are recompressed with compress_type, or stored if they do not compress.
+    """
+    logger.info("Converting %s to %s", file_path, output_path)
+    try:
+        with rarfile.RarFile(file_path) as rf:
+            info_list = rf.infolist()
+            entry_list, data_list, data_index = _plan(info_list, lambda info: rf.open(info.filename), mm_archive.rar_info_to_entry_dict)
+            entry_set = mm_archive.rar_create_entry_set(pathlib.Path(file_path).name, rf.comment, entry_list)
+
+            def _write_data(zipf: zipfile.ZipFile, info: rarfile.RarInfo, entry_name: str) -> None:
+                member_compress_type = _choose_compress_type(lambda: rf.open(info.filename), info.file_size, compress_type)
+                _write_recompressed(zipf, lambda: rf.open(info.filename), info.file_size, entry_name, member_compress_type)
+            _write_mmzip(output_path, entry_set, entry_set_format, data_list, data_index, _write_data, compress_type, compresslevel)
+    except rarfile.Error as e:
+        logger.error("Failed to convert RAR file: %s", e)
+        raise
+
+def _plan(info_list: list, open_func, info_to_entry_func) -> tuple:
+    """Entry list, [(member info, data entry name)] of the distinct members and their data index."""
+    entry_list = []
+    data_list = []
+    data_index = mm_data_index.MMDataIndex()
+    # (size, crc) -> [[data entry name, digest or None, member info]]
+    candidate_map = {}
+
+    def _digest(info) -> str:
+        with open_func(info) as f:
+            return mm_digest.stream_digest(f)
+
+    with mm_observer.phase("convert_plan", len(info_list)):
+        for info in info_list:
+            entry_name = None
+            if not info.is_dir():
+                key = (info.file_size, info.CRC)
+                candidate_list = candidate_map.setdefault(key, [])
+                digest = None
+                if candidate_list:
+                    digest = _digest(info)
+                    for candidate in candidate_list:
+                        if candidate[1] is None:
+                            candidate[1] = _digest(candidate[2])
+                            data_index.set_digest(candidate[0], candidate[1])
+                        if candidate[1] == digest:
+                            entry_name = candidate[0]
+                            mm_observer.dedup_hit(info.file_size)
+                            break
+                if entry_name is None:
+                    entry_name = mm_const.FILE_PATH_FORMAT_DATA.format(len(data_list) + 1)
+                    candidate_list.append([entry_name, digest, info])
+                    data_list.append((info, entry_name))
+                    data_index.add(entry_name, info.file_size, digest)
+                mm_observer.file_done(info.file_size)
+            entry_list.append(info_to_entry_func(info, entry_name))
+    return entry_list, data_list, data_index
+
+def _choose_compress_type(open_func, size: int, compress_type: int) -> int:
+    with open_func() as f:
+        return mm_zip_writer.choose_stream_compress_type(f, size, compress_type)
+
+def _write_recompressed(zipf: zipfile.ZipFile, open_func, size: int, entry_name: str, compress_type: int) -> None:
+    zip_info = zipfile.ZipInfo(entry_name)
+    zip_info.compress_type = compress_type
+    zip_info._compresslevel = zipf.compresslevel
+    with open_func() as f:
+        with zipf.open(zip_info, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as of:
+            shutil.copyfileobj(f, of, mm_const.COPY_CHUNK_SIZE)
+
+def _write_mmzip(output_path: str, entry_set: dict, entry_set_format: str, data_list: list, data_index: mm_data_index.MMDataIndex, write_data_func, compress_type: int, compresslevel: int) -> None:
+    info = {
+        mm_const.INFO_DICT_TYPE: mm_const.INFO_DICT_TYPE_MMZIP,
+        mm_const.INFO_DICT_ENTRY_SET_FORMAT: entry_set_format
+    }
+    with zipfile.ZipFile(output_path, "w", compress_type, compresslevel=compresslevel) as zipf:
+        zipf.writestr(mm_const.FILE_PATH_DATA_INDEX, data_index.dumps())
+        zipf.writestr(mm_entry_set.get_entry_set_file_path(0, entry_set_format), mm_entry_set.dumps(entry_set, entry_set_format))
+        zipf.writestr(mm_const.FILE_PATH_INFO_JSON, json.dumps(info))
+        with mm_observer.phase("convert_write", len(data_list)):
+            for member_info, entry_name in data_list:
+                write_data_func(zipf, member_info, entry_name)
+                mm_observer.file_done(member_info.file_size)
+        mm_member_index.write_member_index(zipf)
@@ -0,0 +1,99 @@
+import zipfile
+import pathlib
+import logging
+import functools
+import rarfile
+import mmzip.mm_const as mm_const
+import mmzip.mm_data_writer as mm_data_writer
+import mmzip.mm_observer as mm_observer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Reading zip and rar files into entry sets, shared by the converters, the
+# MMDir and MMZip add_archive() and the batch workers.
+
+def read_archive(file_path: str, data_writer: mm_data_writer.MMDataWriter) -> dict:
+    """Store the members of a zip or rar file through data_writer and return its entry set."""
+    file_path_p = pathlib.Path(file_path)
+    if rarfile.is_rarfile(file_path):
+        try:
+            with rarfile.RarFile(file_path) as rf:
+                entry_list = rar_extract_and_create_entry_list(rf, data_writer)
+                return rar_create_entry_set(file_path_p.name, rf.comment, entry_list)
+        except rarfile.Error as e:
+            logger.error("Failed to extract RAR file: %s", e)
+            raise
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            entry_list = zip_extract_and_create_entry_list(zf, data_writer)
+            return zip_create_entry_set(file_path_p.name, zf.comment, entry_list)
+    except zipfile.BadZipFile as e:
+        logger.error("Failed to extract ZIP file: %s", e)
+        raise
+
+def zip_extract_and_create_entry_list(zf: zipfile.ZipFile, data_writer: mm_data_writer.MMDataWriter) -> list:
+    return _extract_and_create_entry_list(zf.infolist(), lambda info: functools.partial(zf.open, info), zip_info_to_entry_dict, data_writer)
+
+def rar_extract_and_create_entry_list(rf: rarfile.RarFile, data_writer: mm_data_writer.MMDataWriter) -> list:
+    return _extract_and_create_entry_list(rf.infolist(), lambda info: functools.partial(rf.open, info.filename), rar_info_to_entry_dict, data_writer)
+
+def _extract_and_create_entry_list(info_list: list, open_func_factory, info_to_entry_func, data_writer: mm_data_writer.MMDataWriter) -> list:
+    entry_list = []
+    total_files = None
+    total_bytes = None
+    if mm_observer.is_enabled():
+        total_files = sum(1 for info in info_list if not info.is_dir())
+        total_bytes = sum(info.file_size for info in info_list if not info.is_dir())
+    with mm_observer.phase("ingest", total_files, total_bytes):
+        for info in info_list:
+            entry_name = None
+            chunk_list = None
+            if not info.is_dir():
+                try:
+                    if data_writer.is_chunk_target(info.file_size):
+                        chunk_list = data_writer.add_chunks(open_func_factory(info))
+                    else:
+                        entry_name = data_writer.add(open_func_factory(info), info.file_size)
+                except IOError as e:
+                    logger.error("Failed to extract file %s: %s", info.filename, e)
+                    raise
+                mm_observer.file_done(info.file_size)
+            entry = info_to_entry_func(info, entry_name)
+            if chunk_list is not None:
+                entry[mm_const.ENTRY_CHUNK_LIST] = chunk_list
+            entry_list.append(entry)
+    return entry_list
+
+def zip_info_to_entry_dict(info: zipfile.ZipInfo, entry_name: str) -> dict:
+    return {
+        mm_const.ENTRY_FILE_NAME: info.filename,
+        mm_const.ENTRY_DATE_TIME: info.date_time,
+        mm_const.ENTRY_IS_DIR: info.is_dir(),
+        mm_const.ENTRY_COMMENT: str(info.comment, "utf-8"),
+        mm_const.ENTRY_ENTRY_NAME: entry_name,
+        mm_const.ENTRY_CRC: None if info.is_dir() else info.CRC
+    }
+
+def rar_info_to_entry_dict(info: rarfile.RarInfo, entry_name: str) -> dict:
+    return {
+        mm_const.ENTRY_FILE_NAME: info.filename,
+        mm_const.ENTRY_DATE_TIME: info.date_time,
+        mm_const.ENTRY_IS_DIR: info.is_dir(),
+        mm_const.ENTRY_COMMENT: info.comment,
+        mm_const.ENTRY_ENTRY_NAME: entry_name,
+        mm_const.ENTRY_CRC: None if info.is_dir() else info.CRC
+    }
+
+def zip_create_entry_set(file_name: str, comment: bytes, entry_list: list) -> dict:
+    return _create_entry_set(file_name, str(comment, "utf-8"), entry_list)
+
+def rar_create_entry_set(file_name: str, comment: str, entry_list: list) -> dict:
+    return _create_entry_set(file_name, comment, entry_list)
+
+def _create_entry_set(file_name: str, comment: str, entry_list: list) -> dict:
+    return {
+        mm_const.ENTRY_SET_FILE_NAME: file_name,
+        mm_const.ENTRY_SET_ENTRY_LIST: entry_list,
+        mm_const.ENTRY_SET_COMMENT: comment
+    }
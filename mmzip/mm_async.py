@@ -0,0 +1,212 @@
+import asyncio
+import weakref
+import logging
+import threading
+import functools
+import concurrent.futures
+import mmzip.mm_const as mm_const
+from mmzip.mmdir import MMDir
+from mmzip.mmzip import MMZip
+from mmzip.zip_to_mmdir import zip_to_mmdir
+from mmzip.rar_to_mmdir import rar_to_mmdir
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Every blocking call runs as a job of an MMAsyncPool. A job waits for a
+# free slot before it is submitted, so callers are held back instead of
+# queueing without bound. Long jobs (extraction, ingest, verify) are given
+# at most half of the threads, the rest stays free for the short ones
+# (listing, opening and reading a chunk), so one large archive can not hold
+# every thread. Member streaming reads one chunk per job and only when the
+# consumer asks for it.
+
+class MMAsyncPool:
+    """Bounded thread pool running the blocking work of the async API, for use from one event loop.
+
+    A job cancelled before it starts never runs. One already running can
+    not be interrupted, extraction stops before its next file and the
+    others run to their end with the result dropped.
+    """
+    max_workers: int
+    max_long_jobs: int
+
+    def __init__(self, max_workers: int = 4, max_long_jobs: int = None):
+        self.max_workers = max_workers
+        self.max_long_jobs = max_long_jobs or max(1, max_workers // 2)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mmzip_async")
+        self._slot = asyncio.Semaphore(max_workers)
+        self._long_slot = asyncio.Semaphore(self.max_long_jobs)
+
+    async def run(self, func, *args, long: bool = False, cancel_event: threading.Event = None, **kwargs):
+        """Run func(*args, **kwargs) in the pool once a slot is free and return its result."""
+        if long:
+            await self._long_slot.acquire()
+        try:
+            await self._slot.acquire()
+        except BaseException:
+            if long:
+                self._long_slot.release()
+            raise
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release(long)
+            raise
+
+        def _done(_):
+            # the slot is given back when the thread is free, not when the caller stops waiting
+            try:
+                loop.call_soon_threadsafe(self._release, long)
+            except RuntimeError:
+                # the loop is closed, nobody waits for the slot any more
+                pass
+        future.add_done_callback(_done)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            if cancel_event is not None:
+                cancel_event.set()
+            raise
+
+    def _release(self, long: bool) -> None:
+        self._slot.release()
+        if long:
+            self._long_slot.release()
+
+    def run_detached(self, func, *args) -> None:
+        """Run a short cleanup job in the pool without a slot or waiting for it.
+
+        A job still queued when the pool is shut down runs in the thread shutting it down.
+        """
+        try:
+            future = self._executor.submit(func, *args)
+        except RuntimeError:
+            # the pool is shut down
+            func(*args)
+            return
+
+        def _done(future: concurrent.futures.Future) -> None:
+            if future.cancelled():
+                func(*args)
+        future.add_done_callback(_done)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+# the semaphores of a pool belong to one event loop, so there is a default pool per loop
+_default_pool_map = weakref.WeakKeyDictionary()
+
+def get_default_pool() -> MMAsyncPool:
+    loop = asyncio.get_running_loop()
+    pool = _default_pool_map.get(loop)
+    if pool is None:
+        pool = _default_pool_map[loop] = MMAsyncPool()
+    return pool
+
+class _AsyncMMBase:
+    pool: MMAsyncPool
+
+    def __init__(self, mm_obj, pool: MMAsyncPool = None):
+        self._mm_obj = mm_obj
+        self.pool = pool or get_default_pool()
+
+    @property
+    def sync(self):
+        """The MMDir or MMZip wrapped, for calls made from a worker thread."""
+        return self._mm_obj
+
+    async def get_entry_set_num_list(self) -> list:
+        return await self.pool.run(self._mm_obj.get_entry_set_num_list)
+
+    async def get_entry_set(self, entry_set_num: int) -> dict:
+        return await self.pool.run(self._mm_obj.get_entry_set, entry_set_num)
+
+    async def get_entry(self, entry_set_num: int, file_name: str) -> dict:
+        return await self.pool.run(self._mm_obj.get_entry, entry_set_num, file_name)
+
+    async def iter_chunks(self, entry_set_num: int, file_name: str, chunk_size: int = mm_const.COPY_CHUNK_SIZE):
+        """Async iterator over the content of a file of entry set N, chunk_size bytes at a time.
+
+        A chunk is read only when the previous one has been consumed.
+        """
+        f = await self.pool.run(self._mm_obj.open, entry_set_num, file_name)
+        # a cancelled read may still be running, the file is closed after it
+        lock = threading.Lock()
+
+        def _read() -> bytes:
+            with lock:
+                return f.read(chunk_size)
+
+        def _close() -> None:
+            with lock:
+                f.close()
+        try:
+            while True:
+                chunk = await self.pool.run(_read)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.pool.run_detached(_close)
+
+    async def read(self, entry_set_num: int, file_name: str) -> bytes:
+        chunk_list = []
+        async for chunk in self.iter_chunks(entry_set_num, file_name):
+            chunk_list.append(chunk)
+        return b"".join(chunk_list)
+
+    async def extract(self, entry_set_num: int, extract_to: str, **kwargs) -> None:
+        """Extract entry set N like the blocking extract, cancelling it stops before the next file."""
+        cancel_event = threading.Event()
+        extract = functools.partial(self._mm_obj.extract, entry_set_num, extract_to, cancel_event=cancel_event, **kwargs)
+        await self.pool.run(extract, long=True, cancel_event=cancel_event)
+
+    async def add_archive(self, file_path: str, dedup: bool = True, chunk: bool = False) -> int:
+        return await self.pool.run(self._mm_obj.add_archive, file_path, dedup, chunk, long=True)
+
+    async def verify(self, workers: int = 1) -> dict:
+        return await self.pool.run(self._mm_obj.verify, workers, long=True)
+
+class AsyncMMDir(_AsyncMMBase):
+    """Async access to an MMDir, created with await AsyncMMDir.open(path)."""
+
+    @classmethod
+    async def open(cls, path: str, pool: MMAsyncPool = None) -> "AsyncMMDir":
+        pool = pool or get_default_pool()
+        mm_dir = await pool.run(MMDir, path)
+        if not await pool.run(mm_dir.base_dir_path.is_dir):
+            raise Exception("MMDir not found: {}".format(path))
+        return cls(mm_dir, pool)
+
+    async def to_mmzip(self, output_path: str, **kwargs) -> None:
+        await self.pool.run(self._mm_obj.to_mmzip, output_path, long=True, **kwargs)
+
+class AsyncMMZip(_AsyncMMBase):
+    """Async access to an MMZip, created with await AsyncMMZip.open(path) and closed with await close()."""
+
+    @classmethod
+    async def open(cls, path: str, pool: MMAsyncPool = None) -> "AsyncMMZip":
+        pool = pool or get_default_pool()
+        mm_zip = await pool.run(MMZip, path)
+        return cls(mm_zip, pool)
+
+    async def to_mmdir(self, output_path: str) -> None:
+        await self.pool.run(self._mm_obj.to_mmdir, output_path, long=True)
+
+    async def close(self) -> None:
+        await self.pool.run(self._mm_obj.close)
+
+    async def __aenter__(self) -> "AsyncMMZip":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+async def async_zip_to_mmdir(file_path: str, extract_to: str, dedup: bool = False, chunk: bool = False, pool: MMAsyncPool = None) -> None:
+    await (pool or get_default_pool()).run(zip_to_mmdir, file_path, extract_to, dedup, chunk, long=True)
+
+async def async_rar_to_mmdir(file_path: str, extract_to: str, dedup: bool = False, chunk: bool = False, pool: MMAsyncPool = None) -> None:
+    await (pool or get_default_pool()).run(rar_to_mmdir, file_path, extract_to, dedup, chunk, long=True)
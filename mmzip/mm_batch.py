@@ -0,0 +1,200 @@
+import os
+import json
+import shutil
+import pathlib
+import logging
+import collections
+import concurrent.futures
+import mmzip.mm_const as mm_const
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_data_writer as mm_data_writer
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_observer as mm_observer
+import mmzip.mm_archive as mm_archive
+from mmzip.mmdir import MMDir
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Worker processes decompress and hash each archive into its own stage
+# directory under mm_batch/, deduplicating within the archive. The parent
+# process alone writes to the MMDir: it links the staged data not stored yet
+# into data/, saves one entry set per archive in input order and records
+# the outcome in mm_batch/journal.jsonl, which a restarted run skips by.
+
+def _ingest_archive(file_path: str, stage_dir: str, chunk: bool) -> tuple:
+    stage_dir_path = pathlib.Path(stage_dir)
+    (stage_dir_path / mm_const.DIR_PATH_DATA).mkdir(parents=True)
+    data_writer = mm_data_writer.MMDataWriter(stage_dir_path, mm_data_index.MMDataIndex(), dedup=True, chunk=chunk)
+    entry_set = mm_archive.read_archive(file_path, data_writer)
+    return entry_set, data_writer.data_index.dumps()
+
+def _load_journal(journal_path: pathlib.Path) -> dict:
+    """Last record of every archive in the journal, a torn last line is ignored.
+
+    An archive whose last record is a dropped one has no record.
+    """
+    record_map = {}
+    if not journal_path.exists():
+        return record_map
+    with journal_path.open("r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            _set_record(record_map, record)
+    return record_map
+
+def _set_record(record_map: dict, record: dict) -> None:
+    if record[mm_const.BATCH_STATE] == mm_const.BATCH_STATE_DROPPED:
+        record_map.pop(record[mm_const.BATCH_ARCHIVE], None)
+    else:
+        record_map[record[mm_const.BATCH_ARCHIVE]] = record
+
+class _Journal:
+    journal_path: pathlib.Path
+    record_map: dict
+
+    def __init__(self, journal_path: pathlib.Path):
+        self.journal_path = journal_path
+        self.record_map = _load_journal(journal_path)
+
+    def write(self, archive: str, state: str, entry_set_num: int = None, error: str = None) -> None:
+        record = {mm_const.BATCH_ARCHIVE: archive, mm_const.BATCH_STATE: state}
+        if entry_set_num is not None:
+            record[mm_const.BATCH_ENTRY_SET_NUM] = entry_set_num
+        if error is not None:
+            record[mm_const.BATCH_ERROR] = error
+        with self.journal_path.open("a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _set_record(self.record_map, record)
+
+def mmdir_batch_ingest(file_path_list: list, mm_dir_path: str, workers: int = None, chunk: bool = False, retry_failed: bool = False) -> dict:
+    """Add many zip or rar files to one MMDir, an entry set each, deduplicated across all of them.
+
+    Archives are decompressed by a pool of workers processes. An archive
+    that fails is recorded and skipped, the others go on. Running it again
+    with the same MMDir skips the archives already added, and the failed
+    ones too unless retry_failed. Returns {"done": {archive: entry set
+    num}, "failed": {archive: error}} for the archives of file_path_list.
+    """
+    mm_dir = MMDir(mm_dir_path)
+    if not mm_dir.base_dir_path.exists():
+        mm_dir.create()
+    batch_dir_path = mm_dir.base_dir_path / mm_const.DIR_PATH_BATCH
+    batch_dir_path.mkdir(exist_ok=True)
+    journal = _Journal(mm_dir.base_dir_path / mm_const.FILE_PATH_BATCH_JOURNAL)
+    resumed = bool(journal.record_map)
+    _recover_pending(mm_dir, journal)
+    for stage_dir_path in batch_dir_path.glob("stage*"):
+        shutil.rmtree(stage_dir_path)
+
+    if resumed:
+        # an interrupted run may have left data files the index does not know
+        data_index = mm_dir.update_data_index(save=False)
+    elif mm_dir.data_index_file_path.exists():
+        data_index = mm_dir.get_data_index()
+    else:
+        data_index = mm_dir.update_data_index(save=False)
+    data_writer = mm_data_writer.MMDataWriter(mm_dir.base_dir_path, data_index, next_data_num=data_index.get_max_data_num() + 1)
+    next_entry_set_num = mm_dir.get_next_entry_set_num()
+
+    archive_list = []
+    for file_path in file_path_list:
+        archive = str(pathlib.Path(file_path).resolve())
+        record = journal.record_map.get(archive)
+        if record is not None and record[mm_const.BATCH_STATE] == mm_const.BATCH_STATE_DONE:
+            continue
+        if record is not None and record[mm_const.BATCH_STATE] == mm_const.BATCH_STATE_FAILED and not retry_failed:
+            continue
+        if archive not in archive_list:
+            archive_list.append(archive)
+    logger.info("Adding %d archives to %s", len(archive_list), mm_dir.base_dir_path)
+
+    max_workers = workers or os.cpu_count() or 1
+    max_pending = max_workers * 2
+    with mm_observer.phase("batch_ingest", len(archive_list)), mm_dir.ref_count_batch():
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = collections.deque()
+            for job_num, archive in enumerate(archive_list):
+                stage_dir_path = mm_dir.base_dir_path / mm_const.DIR_PATH_FORMAT_BATCH_STAGE.format(job_num)
+                pending.append((archive, stage_dir_path, executor.submit(_ingest_archive, archive, str(stage_dir_path), chunk)))
+                if len(pending) > max_pending:
+                    next_entry_set_num = _commit(mm_dir, data_writer, journal, next_entry_set_num, *pending.popleft())
+            while pending:
+                next_entry_set_num = _commit(mm_dir, data_writer, journal, next_entry_set_num, *pending.popleft())
+    mm_dir.save_data_index(data_index)
+
+    result = {"done": {}, "failed": {}}
+    for file_path in file_path_list:
+        record = journal.record_map.get(str(pathlib.Path(file_path).resolve()))
+        if record is None:
+            continue
+        if record[mm_const.BATCH_STATE] == mm_const.BATCH_STATE_DONE:
+            result["done"][file_path] = record[mm_const.BATCH_ENTRY_SET_NUM]
+        elif record[mm_const.BATCH_STATE] == mm_const.BATCH_STATE_FAILED:
+            result["failed"][file_path] = record[mm_const.BATCH_ERROR]
+    logger.info("Batch into %s completed: %d added, %d failed", mm_dir.base_dir_path, len(result["done"]), len(result["failed"]))
+    return result
+
+def _recover_pending(mm_dir: MMDir, journal: _Journal) -> None:
+    """Settle archives whose commit was interrupted, by whether their entry set got saved whole."""
+    for archive, record in list(journal.record_map.items()):
+        if record[mm_const.BATCH_STATE] != mm_const.BATCH_STATE_PENDING:
+            continue
+        entry_set_num = record[mm_const.BATCH_ENTRY_SET_NUM]
+        if _is_entry_set_saved(mm_dir, entry_set_num):
+            journal.write(archive, mm_const.BATCH_STATE_DONE, entry_set_num)
+        else:
+            journal.write(archive, mm_const.BATCH_STATE_DROPPED, entry_set_num)
+
+def _is_entry_set_saved(mm_dir: MMDir, entry_set_num: int) -> bool:
+    """Whether entry set N exists and parses, a torn one is removed."""
+    if entry_set_num not in mm_dir.get_entry_set_num_list():
+        return False
+    try:
+        mm_dir.load_entry_set(entry_set_num)
+        return True
+    except Exception as e:
+        logger.error("Removing torn entry set %d: %s", entry_set_num, e)
+    for file_path_format in (mm_const.FILE_PATH_FORMAT_ENTRY_SET_BIN, mm_const.FILE_PATH_FORMAT_ENTRY_SET, mm_const.FILE_PATH_FORMAT_ENTORY_SET):
+        (mm_dir.base_dir_path / file_path_format.format(entry_set_num)).unlink(missing_ok=True)
+    mm_dir._reset_entry_set_cache()
+    return False
+
+def _commit(mm_dir: MMDir, data_writer: mm_data_writer.MMDataWriter, journal: _Journal, entry_set_num: int, archive: str, stage_dir_path: pathlib.Path, future: concurrent.futures.Future) -> int:
+    """Move one staged archive into the MMDir and return the next free entry set number."""
+    try:
+        entry_set, stage_data_index_data = future.result()
+    except Exception as e:
+        logger.error("Failed to add %s: %s", archive, e)
+        journal.write(archive, mm_const.BATCH_STATE_FAILED, error="{}: {}".format(type(e).__name__, e))
+        shutil.rmtree(stage_dir_path, ignore_errors=True)
+        mm_observer.file_done(0)
+        return entry_set_num
+
+    stage_data_index = mm_data_index.MMDataIndex.loads(stage_data_index_data)
+    first_data_num = data_writer.next_data_num
+    conv_map = {}
+    total_size = 0
+    for stage_entry_name in stage_data_index.get_entry_name_list():
+        data_info = stage_data_index.get(stage_entry_name)
+        conv_map[stage_entry_name] = data_writer.add_file(stage_dir_path / stage_entry_name, data_info[mm_const.DATA_SIZE], data_info[mm_const.DATA_DIGEST])
+        total_size += data_info[mm_const.DATA_SIZE]
+    for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
+        mm_entry_set.conv_entry_data(entry, conv_map)
+
+    # the data added is indexed before the entry set refers to it
+    data_index = data_writer.data_index
+    new_entry_name_list = [mm_const.FILE_PATH_FORMAT_DATA.format(data_num) for data_num in range(first_data_num, data_writer.next_data_num)]
+    (mm_dir.base_dir_path / mm_const.FILE_PATH_FORMAT_DATA_INDEX_APPEND.format(entry_set_num)).write_text(data_index.dumps(new_entry_name_list))
+    journal.write(archive, mm_const.BATCH_STATE_PENDING, entry_set_num)
+    mm_dir.save_entry_set(entry_set_num, entry_set)
+    journal.write(archive, mm_const.BATCH_STATE_DONE, entry_set_num)
+    shutil.rmtree(stage_dir_path, ignore_errors=True)
+    logger.info("Added %s as entry set %d", archive, entry_set_num)
+    mm_observer.file_done(total_size)
+    return entry_set_num + 1
@@ -0,0 +1,85 @@
+import hashlib
+import mmzip.mm_const as mm_const
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Gear rolling hash (as in FastCDC): a cut point is a position where the high
+# CHUNK_AVG_BITS bits of the hash are zero. The hash only depends on the last
+# 64 bytes, so an edit only moves the cut points next to it and the other
+# chunks of a new version of a file stay identical.
+_MASK_64 = (1 << 64) - 1
+_GEAR_TABLE = [int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "little") for i in range(256)]
+_CUT_MASK = ((1 << mm_const.CHUNK_AVG_BITS) - 1) << (64 - mm_const.CHUNK_AVG_BITS)
+# bytes before the one hashed that still count in the hash
+_WINDOW = 63
+# positions hashed at a time with numpy, a cut is expected every 64 KiB
+_BLOCK_SIZE = 64 * 1024
+
+if numpy is not None:
+    _GEAR_ARRAY = numpy.array(_GEAR_TABLE, dtype=numpy.uint64)
+    _CUT_MASK_ARRAY = numpy.uint64(_CUT_MASK)
+
+def find_cut_point(buf, min_size: int = mm_const.CHUNK_MIN_SIZE, max_size: int = mm_const.CHUNK_MAX_SIZE) -> int:
+    """Length of the first chunk of buf, buf must hold max_size bytes unless it is the end of the data.
+
+    The first min_size bytes are never a cut point and are not hashed.
+    With numpy installed the hash is computed a block at a time.
+    """
+    size = len(buf)
+    if size <= min_size:
+        return size
+    end = min(size, max_size)
+    if numpy is not None:
+        return _find_cut_point_numpy(buf, min_size, end)
+    gear_table = _GEAR_TABLE
+    cut_mask = _CUT_MASK
+    data = bytes(buf[min_size:end])
+    h = 0
+    # bits above 64 never reach the cut mask bits, so they are masked off once per window
+    for window_start in range(0, len(data), _WINDOW + 1):
+        i = min_size + window_start
+        for b in data[window_start:window_start + _WINDOW + 1]:
+            h = (h << 1) + gear_table[b]
+            i += 1
+            if not h & cut_mask:
+                return i
+        h &= _MASK_64
+    return end
+
+def _find_cut_point_numpy(buf, min_size: int, end: int) -> int:
+    # The hash at j is the sum of gear[b[j - k]] << k for k < 64, hashing
+    # from min_size. It is built in 6 doubling steps over a block, the block
+    # starting with the 63 bytes before it.
+    for block_start in range(min_size, end, _BLOCK_SIZE):
+        block_end = min(end, block_start + _BLOCK_SIZE)
+        context_start = max(min_size, block_start - _WINDOW)
+        h = _GEAR_ARRAY[numpy.frombuffer(bytes(buf[context_start:block_end]), dtype=numpy.uint8)]
+        shift = 1
+        while shift < 64:
+            h[shift:] += h[:-shift] << numpy.uint64(shift)
+            shift *= 2
+        hit = (h[block_start - context_start:] & _CUT_MASK_ARRAY) == 0
+        i = int(hit.argmax())
+        if hit[i]:
+            return block_start + i + 1
+    return end
+
+def iter_chunks(f):
+    """Split a binary stream into content-defined chunks."""
+    buf = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buf) < mm_const.CHUNK_MAX_SIZE:
+            data = f.read(mm_const.COPY_CHUNK_SIZE)
+            if not data:
+                eof = True
+            else:
+                buf += data
+        if not buf:
+            return
+        cut = find_cut_point(buf)
+        yield bytes(buf[:cut])
+        del buf[:cut]
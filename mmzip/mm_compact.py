@@ -0,0 +1,202 @@
+import os
+import json
+import re
+import shutil
+import pathlib
+import logging
+import zipfile
+import mmzip.mm_const as mm_const
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_ref_count as mm_ref_count
+import mmzip.mm_zip_writer as mm_zip_writer
+import mmzip.mm_observer as mm_observer
+import mmzip.mm_member_index as mm_member_index
+import mmzip.mm_file_util as mm_file_util
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# compaction layout of an MMDir, everything is built under mm_compact/ and
+# swapped in at the end:
+#   mm_compact/plan.json  old -> new names, written once, marks a started run
+#   mm_compact/mm_info/   renumbered entry sets, data index and ref counts
+#   mm_compact/data/      data files moved here under their new names
+#   mm_compact/old/       mm_info/ and data/ as they were, removed at the end
+
+def _data_sort_key(entry_name: str) -> tuple:
+    name = entry_name[len(mm_const.DIR_PATH_DATA):]
+    if name.isdigit():
+        return (0, int(name), name)
+    return (1, 0, name)
+
+def create_data_map(entry_name_list: list, renumber: bool = True) -> dict:
+    """New name of every data file kept, numbered densely from 1 in the old order."""
+    entry_name_list = sorted(entry_name_list, key=_data_sort_key)
+    if not renumber:
+        return {entry_name: entry_name for entry_name in entry_name_list}
+    return {entry_name: mm_const.FILE_PATH_FORMAT_DATA.format(data_num) for data_num, entry_name in enumerate(entry_name_list, 1)}
+
+def create_entry_set_map(entry_set_num_list: list, renumber: bool = True) -> dict:
+    """New number of every entry set kept, numbered densely from 0 in the old order."""
+    entry_set_num_list = sorted(entry_set_num_list)
+    if not renumber:
+        return {entry_set_num: entry_set_num for entry_set_num in entry_set_num_list}
+    return {entry_set_num: new_num for new_num, entry_set_num in enumerate(entry_set_num_list)}
+
+def conv_data_index(data_index: mm_data_index.MMDataIndex, data_map: dict, size_func) -> mm_data_index.MMDataIndex:
+    new_data_index = mm_data_index.MMDataIndex()
+    for entry_name, new_entry_name in data_map.items():
+        data_info = data_index.get(entry_name)
+        if data_info is None:
+            new_data_index.add(new_entry_name, size_func(entry_name))
+        else:
+            new_data_index.add(new_entry_name, data_info[mm_const.DATA_SIZE], data_info[mm_const.DATA_DIGEST])
+    return new_data_index
+
+def conv_ref_count(ref_count: mm_ref_count.MMRefCount, data_map: dict, entry_set_map: dict) -> mm_ref_count.MMRefCount:
+    new_ref_count = mm_ref_count.MMRefCount()
+    new_ref_count.ref_map = {data_map[entry_name]: count for entry_name, count in ref_count.ref_map.items()}
+    new_ref_count.entry_set_num_list = sorted(entry_set_map[entry_set_num] for entry_set_num in ref_count.entry_set_num_list)
+    return new_ref_count
+
+def _is_rebuilt_info(file_name: str) -> bool:
+    """mm_info files compaction writes itself instead of copying."""
+    if re.search(mm_const.FILE_PATH_REGEX_ENTRY_SET_NUM, file_name):
+        return True
+    if re.fullmatch(mm_const.FILE_PATH_REGEX_DATA_INDEX_APPEND, file_name):
+        return True
+    return file_name in (mm_const.FILE_PATH_DATA_INDEX, mm_const.FILE_PATH_REF_COUNT, mm_const.FILE_PATH_MEMBER_INDEX)
+
+def compact_mmdir(mm_dir) -> None:
+    """Drop unreferenced data files and renumber data files and entry sets densely.
+
+    Every step skips what an interrupted run already did, so calling it
+    again finishes the same compaction.
+    """
+    base_dir_path = mm_dir.base_dir_path
+    compact_dir_path = base_dir_path / mm_const.DIR_PATH_COMPACT
+    plan_path = base_dir_path / mm_const.FILE_PATH_COMPACT_PLAN
+    if plan_path.exists():
+        logger.info("Resuming compaction of %s", base_dir_path)
+        plan = json.loads(plan_path.read_text())
+    else:
+        logger.info("Compacting %s", base_dir_path)
+        plan = _create_plan(mm_dir, compact_dir_path, plan_path)
+    data_map = plan[mm_const.COMPACT_PLAN_DATA_MAP]
+    entry_set_map = {int(entry_set_num): new_num for entry_set_num, new_num in plan[mm_const.COMPACT_PLAN_ENTRY_SET_MAP].items()}
+
+    if plan[mm_const.COMPACT_PLAN_PHASE] == mm_const.COMPACT_PHASE_COPY:
+        with mm_observer.phase("compact_entry_set", len(entry_set_map)):
+            _copy_entry_sets(mm_dir, compact_dir_path, entry_set_map, data_map)
+        _copy_info_files(mm_dir, compact_dir_path)
+        moved = 0
+        with mm_observer.phase("compact_data", len(data_map)):
+            for entry_name, new_entry_name in data_map.items():
+                src_path = base_dir_path / entry_name
+                if src_path.exists():
+                    os.rename(src_path, compact_dir_path / new_entry_name)
+                    moved += 1
+                mm_observer.file_done(0)
+        logger.debug("Moved %d data files", moved)
+        plan[mm_const.COMPACT_PLAN_PHASE] = mm_const.COMPACT_PHASE_SWAP
+        mm_file_util.write_atomic(plan_path, json.dumps(plan))
+
+    old_dir_path = compact_dir_path / "old"
+    old_dir_path.mkdir(exist_ok=True)
+    for dir_name in (mm_const.DIR_PATH_MM_INFO, mm_const.DIR_PATH_DATA):
+        new_path = compact_dir_path / dir_name
+        if not new_path.exists():
+            continue
+        cur_path = base_dir_path / dir_name
+        if cur_path.exists():
+            os.rename(cur_path, old_dir_path / dir_name)
+        os.rename(new_path, cur_path)
+    shutil.rmtree(compact_dir_path)
+    mm_dir._reset_entry_set_cache()
+    logger.info("Compaction of %s completed: %d entry sets, %d data files", base_dir_path, len(entry_set_map), len(data_map))
+
+def _create_plan(mm_dir, compact_dir_path: pathlib.Path, plan_path: pathlib.Path) -> dict:
+    # a run that never got to write its plan left nothing worth keeping
+    if compact_dir_path.exists():
+        shutil.rmtree(compact_dir_path)
+    ref_count = mm_dir.get_ref_count()
+    data_map = create_data_map(ref_count.get_entry_name_list())
+    entry_set_map = create_entry_set_map(mm_dir.get_entry_set_num_list())
+    data_index = conv_data_index(mm_dir.get_data_index(), data_map, lambda entry_name: (mm_dir.base_dir_path / entry_name).stat().st_size)
+    new_ref_count = conv_ref_count(ref_count, data_map, entry_set_map)
+
+    (compact_dir_path / mm_const.DIR_PATH_MM_INFO).mkdir(parents=True)
+    (compact_dir_path / mm_const.DIR_PATH_DATA).mkdir()
+    mm_file_util.write_atomic(compact_dir_path / mm_const.FILE_PATH_DATA_INDEX, data_index.dumps())
+    mm_file_util.write_atomic(compact_dir_path / mm_const.FILE_PATH_REF_COUNT, new_ref_count.dumps())
+    plan = {
+        mm_const.COMPACT_PLAN_PHASE: mm_const.COMPACT_PHASE_COPY,
+        mm_const.COMPACT_PLAN_DATA_MAP: data_map,
+        mm_const.COMPACT_PLAN_ENTRY_SET_MAP: {str(entry_set_num): new_num for entry_set_num, new_num in entry_set_map.items()}
+    }
+    mm_file_util.write_atomic(plan_path, json.dumps(plan))
+    return plan
+
+def _copy_entry_sets(mm_dir, compact_dir_path: pathlib.Path, entry_set_map: dict, data_map: dict) -> None:
+    path_map = mm_dir._scan_entry_set_path_map()
+    for entry_set_num, new_num in entry_set_map.items():
+        entry_set_format = mm_entry_set.get_entry_set_format(path_map[entry_set_num].name)
+        new_path = compact_dir_path / mm_entry_set.get_entry_set_file_path(new_num, entry_set_format)
+        if new_path.exists():
+            continue
+        entry_set = mm_entry_set.loads_dict(path_map[entry_set_num].read_bytes())
+        for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
+            mm_entry_set.conv_entry_data(entry, data_map)
+        mm_file_util.write_atomic(new_path, mm_entry_set.dumps(entry_set, entry_set_format))
+        mm_observer.file_done(0)
+
+def _copy_info_files(mm_dir, compact_dir_path: pathlib.Path) -> None:
+    for file in mm_dir.info_dir_path.iterdir():
+        file_name = mm_const.DIR_PATH_MM_INFO + file.name
+        new_path = compact_dir_path / file_name
+        if not file.is_file() or _is_rebuilt_info(file_name) or new_path.exists():
+            continue
+        shutil.copy2(file, new_path)
+
+def rewrite_mmzip(mm_zip, remove_entry_set_num_list: list = (), renumber: bool = True) -> None:
+    """Rewrite an MMZip without some entry sets and the data only they referred to.
+
+    Members are copied without recompressing them. The new zip is written
+    next to the old one and replaces it in one rename, so an interrupted
+    run leaves the MMZip as it was and can simply be run again.
+    """
+    entry_set_num_list = [entry_set_num for entry_set_num in mm_zip.get_entry_set_num_list() if entry_set_num not in remove_entry_set_num_list]
+    ref_count = mm_ref_count.create_ref_count((entry_set_num, mm_zip.get_entry_set(entry_set_num)) for entry_set_num in entry_set_num_list)
+    data_map = create_data_map(ref_count.get_entry_name_list(), renumber)
+    entry_set_map = create_entry_set_map(entry_set_num_list, renumber)
+    zip_obj = mm_zip.zip_obj
+    data_index = conv_data_index(mm_zip.get_data_index(), data_map, lambda entry_name: zip_obj.NameToInfo[entry_name].file_size)
+    mapping = mm_zip._get_mmap()
+    tmp_path = str(mm_zip.path) + ".compact"
+    logger.info("Rewriting %s with %d entry sets and %d data files", mm_zip.path, len(entry_set_map), len(data_map))
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.comment = zip_obj.comment
+            for zip_info in zip_obj.filelist:
+                if zip_info.filename.startswith(mm_const.DIR_PATH_MM_INFO) and not _is_rebuilt_info(zip_info.filename):
+                    mm_zip_writer.copy_member_raw(zf, mapping, zip_info, zip_info.filename)
+            for entry_set_num, new_num in entry_set_map.items():
+                entry_set_format = mm_entry_set.get_entry_set_format(mm_zip._entry_set_zipinfo_map[entry_set_num].filename)
+                entry_set = mm_zip.load_entry_set(entry_set_num)
+                for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
+                    mm_entry_set.conv_entry_data(entry, data_map)
+                zf.writestr(mm_entry_set.get_entry_set_file_path(new_num, entry_set_format), mm_entry_set.dumps(entry_set, entry_set_format))
+            zf.writestr(mm_const.FILE_PATH_DATA_INDEX, data_index.dumps())
+            with mm_observer.phase("rewrite_mmzip", len(data_map)):
+                for entry_name, new_entry_name in data_map.items():
+                    mm_zip_writer.copy_member_raw(zf, mapping, zip_obj.NameToInfo[entry_name], new_entry_name)
+                    mm_observer.file_done(zip_obj.NameToInfo[entry_name].file_size)
+            mm_member_index.write_member_index(zf)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    mm_zip.close()
+    os.replace(tmp_path, mm_zip.path)
+    mm_zip._open()
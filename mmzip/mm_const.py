@@ -4,8 +4,22 @@ FILE_PATH_REGEX_ENTORY_SET="mm_info/entory_set\\d+.json"
 FILE_PATH_GLOB_FORMAT_ENTORY_SET = "entory_set*.json"
 FILE_PATH_FORMAT_ENTRY_SET = "mm_info/entry_set{}.json"
 FILE_PATH_REGEX_ENTRY_SET = "mm_info/entry_set\\d+.json"
+FILE_PATH_REGEX_ENTRY_SET_NUM = "(?:entry|entory)_set(\\d+)\\.(?:json|bin)$"
+FILE_PATH_FORMAT_ENTRY_SET_BIN = "mm_info/entry_set{}.bin"
+FILE_PATH_REGEX_ENTRY_SET_BIN = "mm_info/entry_set\\d+\\.bin$"
+FILE_PATH_GLOB_FORMAT_ENTRY_SET_BIN = "entry_set*.bin"
 FILE_PATH_GLOB_FORMAT_ENTRY_SET = "entry_set*.json"
 FILE_PATH_INFO_JSON = "mm_info/info.json"
+FILE_PATH_DATA_INDEX = "mm_info/data_index.json"
+FILE_PATH_FORMAT_DATA_INDEX_APPEND = "mm_info/data_index{}.json"
+FILE_PATH_REGEX_DATA_INDEX_APPEND = "mm_info/data_index(\\d+).json"
+FILE_PATH_REF_COUNT = "mm_info/ref_count.json"
+FILE_PATH_MEMBER_INDEX = "mm_info/member_index.bin"
+DIR_PATH_COMPACT = "mm_compact/"
+FILE_PATH_COMPACT_PLAN = "mm_compact/plan.json"
+DIR_PATH_BATCH = "mm_batch/"
+FILE_PATH_BATCH_JOURNAL = "mm_batch/journal.jsonl"
+DIR_PATH_FORMAT_BATCH_STAGE = "mm_batch/stage{}/"
 DIR_PATH_MM_INFO = "mm_info/"
 DIR_PATH_DATA = "data/"
 FILE_PATH_FORMAT_DATA = "data/{:05}"
@@ -21,9 +35,69 @@ ENTRY_DATE_TIME = "date_time"
 ENTRY_IS_DIR = "is_dir"
 ENTRY_ENTRY_NAME = "entry_name"
 ENTRY_COMMENT = "comment"
+ENTRY_CHUNK_LIST = "chunk_list"
+ENTRY_CRC = "crc"
+
+# data index dict keys
+DATA_INDEX_DATA = "data"
+DATA_INDEX_DIGEST = "digest"
+
+# data index data dict keys
+DATA_SIZE = "size"
+DATA_DIGEST = "digest"
+
+# ref count dict keys
+REF_COUNT_ENTRY_SET_NUM_LIST = "entry_set_num_list"
+REF_COUNT_DATA = "data"
+
+# compact plan dict keys
+COMPACT_PLAN_DATA_MAP = "data_map"
+COMPACT_PLAN_ENTRY_SET_MAP = "entry_set_map"
+COMPACT_PLAN_PHASE = "phase"
+
+# compact plan phases
+COMPACT_PHASE_COPY = "copy"
+COMPACT_PHASE_SWAP = "swap"
+
+# batch journal record keys
+BATCH_ARCHIVE = "archive"
+BATCH_STATE = "state"
+BATCH_ENTRY_SET_NUM = "entry_set_num"
+BATCH_ERROR = "error"
+
+# batch journal states
+BATCH_STATE_PENDING = "pending"
+BATCH_STATE_DONE = "done"
+BATCH_STATE_FAILED = "failed"
+# an interrupted commit whose entry set was never saved, it clears the pending record before it
+BATCH_STATE_DROPPED = "dropped"
 
 # info dict keys
 INFO_DICT_TYPE = "type"
+INFO_DICT_ENTRY_SET_FORMAT = "entry_set_format"
 
 # info dict values
-INFO_DICT_TYPE_MMZIP = "mmzip"
\ No newline at end of file
+INFO_DICT_TYPE_MMZIP = "mmzip"
+ENTRY_SET_FORMAT_JSON = "json"
+ENTRY_SET_FORMAT_BINARY = "binary"
+
+# data digest
+DIGEST_CHUNK_SIZE = 1024 * 1024
+DIGEST_PARTIAL_BLOCK_SIZE = 4096
+DIGEST_SIZE = 32
+
+# file copy
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# entry set cache
+ENTRY_SET_CACHE_SIZE = 16
+
+# zip compression
+COMPRESS_SAMPLE_BLOCK_SIZE = 16 * 1024
+COMPRESS_SAMPLE_STORED_RATIO = 0.95
+COMPRESS_SPOOL_SIZE = 4 * 1024 * 1024
+
+# content-defined chunking
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_AVG_BITS = 16
+CHUNK_MAX_SIZE = 256 * 1024
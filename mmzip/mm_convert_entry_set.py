@@ -0,0 +1,56 @@
+import json
+import logging
+import zipfile
+import mmzip.mm_const as mm_const
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_member_index as mm_member_index
+import mmzip.mm_zip_writer as mm_zip_writer
+import mmzip.mmdir as mmdir
+import mmzip.mmzip as mmzip_module
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def mmdir_convert_entry_set(mm_dir_path: str, entry_set_format: str = mm_const.ENTRY_SET_FORMAT_BINARY) -> None:
+    """Rewrite every entry set of an MMDir in entry_set_format, in place.
+
+    Later entry sets are written in the same format.
+    """
+    mm_dir = mmdir.MMDir(mm_dir_path)
+    if not mm_dir.have_info():
+        raise Exception("The directory does not have an info file")
+    logger.info("Converting entry sets of %s to %s", mm_dir_path, entry_set_format)
+    with mm_dir.ref_count_batch():
+        for entry_set_num in mm_dir.get_entry_set_num_list():
+            mm_dir.save_entry_set(entry_set_num, mm_dir.load_entry_set(entry_set_num), entry_set_format)
+    mm_dir.set_entry_set_format(entry_set_format)
+
+def mmzip_convert_entry_set(mm_zip_path: str, output_path: str, entry_set_format: str = mm_const.ENTRY_SET_FORMAT_BINARY) -> None:
+    """Copy an MMZip to output_path with every entry set in entry_set_format.
+
+    The other members are copied without recompressing them.
+    """
+    mm_zip = mmzip_module.MMZip(mm_zip_path)
+    try:
+        if not mm_zip.have_info():
+            raise Exception("The zip does not have an info file")
+        logger.info("Converting entry sets of %s to %s at %s", mm_zip_path, entry_set_format, output_path)
+        # the ZipInfo objects may come from the member index, not from zip_obj.filelist
+        entry_set_name_set = set(file.filename for file in mm_zip._get_entry_set_zipinfo_list())
+        mapping = mm_zip._get_mmap()
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+            for file in mm_zip.zip_obj.filelist:
+                if file.filename in entry_set_name_set or file.filename == mm_const.FILE_PATH_MEMBER_INDEX:
+                    continue
+                if file.filename == mm_const.FILE_PATH_INFO_JSON:
+                    info = json.loads(mm_zip.zip_obj.read(file))
+                    info[mm_const.INFO_DICT_ENTRY_SET_FORMAT] = entry_set_format
+                    zipf.writestr(file.filename, json.dumps(info))
+                    for entry_set_num in mm_zip.get_entry_set_num_list():
+                        entry_set = mm_zip.get_entry_set(entry_set_num)
+                        zipf.writestr(mm_entry_set.get_entry_set_file_path(entry_set_num, entry_set_format), mm_entry_set.dumps(entry_set, entry_set_format))
+                    continue
+                mm_zip_writer.copy_member_raw(zipf, mapping, file, file.filename)
+            mm_member_index.write_member_index(zipf)
+    finally:
+        mm_zip.close()
@@ -0,0 +1,130 @@
+import json
+import logging
+import mmzip.mm_const as mm_const
+import mmzip.mm_digest as mm_digest
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class MMDataIndex:
+    """Size and digest of every data file, stored as mm_info/data_index.json.
+
+    Digests are filled lazily: a data file whose size is unique never has to
+    be read, and its digest is only computed once another data file of the
+    same size shows up.
+    """
+    data_map: dict
+    digest_map: dict
+    size_map: dict
+
+    def __init__(self):
+        self.data_map = {}
+        self.digest_map = {}
+        self.size_map = {}
+
+    @classmethod
+    def loads(cls, data) -> "MMDataIndex":
+        index = cls()
+        index.update(data)
+        return index
+
+    def update(self, data) -> None:
+        """Merge a dumped index, later entries win."""
+        index_dict = json.loads(data)
+        for entry_name, data_info in index_dict[mm_const.DATA_INDEX_DATA].items():
+            self.add(entry_name, data_info[mm_const.DATA_SIZE], data_info[mm_const.DATA_DIGEST])
+        # keep the stored reverse map so the canonical entry of a digest is stable
+        for digest, entry_name in index_dict[mm_const.DATA_INDEX_DIGEST].items():
+            if entry_name in self.data_map:
+                self.digest_map[digest] = entry_name
+
+    def dumps(self, entry_name_list: list = None) -> str:
+        if entry_name_list is None:
+            return json.dumps({
+                mm_const.DATA_INDEX_DATA: self.data_map,
+                mm_const.DATA_INDEX_DIGEST: self.digest_map
+            })
+        data_map = {}
+        digest_map = {}
+        for entry_name in entry_name_list:
+            data_info = self.data_map[entry_name]
+            data_map[entry_name] = data_info
+            digest = data_info[mm_const.DATA_DIGEST]
+            if digest is not None and self.digest_map.get(digest) == entry_name:
+                digest_map[digest] = entry_name
+        return json.dumps({
+            mm_const.DATA_INDEX_DATA: data_map,
+            mm_const.DATA_INDEX_DIGEST: digest_map
+        })
+
+    def snapshot(self) -> dict:
+        return {entry_name: data_info[mm_const.DATA_DIGEST] for entry_name, data_info in self.data_map.items()}
+
+    def get_changed_entry_name_list(self, snapshot: dict) -> list:
+        """Entry names added or given a digest since snapshot() was taken."""
+        changed = []
+        for entry_name, data_info in self.data_map.items():
+            if entry_name not in snapshot or snapshot[entry_name] != data_info[mm_const.DATA_DIGEST]:
+                changed.append(entry_name)
+        return changed
+
+    def get_max_data_num(self) -> int:
+        max_data_num = -1
+        for entry_name in self.data_map:
+            name = entry_name[len(mm_const.DIR_PATH_DATA):]
+            if name.isdigit():
+                max_data_num = max(max_data_num, int(name))
+        return max_data_num
+
+    def add(self, entry_name: str, size: int, digest: str = None) -> None:
+        self.remove(entry_name)
+        self.data_map[entry_name] = {
+            mm_const.DATA_SIZE: size,
+            mm_const.DATA_DIGEST: digest
+        }
+        self.size_map.setdefault(size, []).append(entry_name)
+        if digest is not None:
+            self.digest_map.setdefault(digest, entry_name)
+
+    def remove(self, entry_name: str) -> None:
+        data_info = self.data_map.pop(entry_name, None)
+        if data_info is None:
+            return
+        size_entry_names = self.size_map[data_info[mm_const.DATA_SIZE]]
+        size_entry_names.remove(entry_name)
+        if not size_entry_names:
+            del self.size_map[data_info[mm_const.DATA_SIZE]]
+        digest = data_info[mm_const.DATA_DIGEST]
+        if digest is not None and self.digest_map.get(digest) == entry_name:
+            del self.digest_map[digest]
+            for other_entry_name in size_entry_names:
+                if self.data_map[other_entry_name][mm_const.DATA_DIGEST] == digest:
+                    self.digest_map[digest] = other_entry_name
+                    break
+
+    def set_digest(self, entry_name: str, digest: str) -> None:
+        self.data_map[entry_name][mm_const.DATA_DIGEST] = digest
+        self.digest_map.setdefault(digest, entry_name)
+
+    def get(self, entry_name: str) -> dict:
+        return self.data_map.get(entry_name)
+
+    def get_entry_name_list(self) -> list:
+        return list(self.data_map.keys())
+
+    def have_size(self, size: int) -> bool:
+        return size in self.size_map
+
+    def find_digest(self, digest: str) -> str:
+        return self.digest_map.get(digest)
+
+    def resolve_digests(self, size: int, open_func) -> None:
+        """Compute missing digests of the data files of a size.
+
+        open_func(entry_name) must return a readable binary stream.
+        """
+        for entry_name in self.size_map.get(size, []):
+            if self.data_map[entry_name][mm_const.DATA_DIGEST] is None:
+                logger.debug("Hashing %s", entry_name)
+                with open_func(entry_name) as f:
+                    self.set_digest(entry_name, mm_digest.stream_digest(f))
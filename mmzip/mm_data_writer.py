@@ -0,0 +1,165 @@
+import pathlib
+import functools
+import logging
+import zipfile
+import mmzip.mm_const as mm_const
+import mmzip.mm_digest as mm_digest
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_file_util as mm_file_util
+import mmzip.mm_chunker as mm_chunker
+import mmzip.mm_observer as mm_observer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class MMDataWriter:
+    """Write data files into data/, optionally skipping content already stored.
+
+    open_func passed to add() must return a new readable stream of the member
+    each time it is called. With dedup enabled a member whose size matches a
+    stored data file is hashed while it is written, and the new file is
+    removed again if its digest is stored already, so the member is read and
+    decompressed once. Every data file kept is recorded in data_index.
+
+    With chunk enabled, members larger than one chunk are meant to be stored
+    through add_chunks(), which splits them into content-defined chunks and
+    stores every distinct chunk once as its own data file.
+    """
+    base_dir_path: pathlib.Path
+    data_index: mm_data_index.MMDataIndex
+    dedup: bool
+    chunk: bool
+    next_data_num: int
+
+    def __init__(self, base_dir_path: pathlib.Path, data_index: mm_data_index.MMDataIndex = None, dedup: bool = True, next_data_num: int = 1, chunk: bool = False):
+        self.base_dir_path = base_dir_path
+        self.data_index = data_index if data_index is not None else mm_data_index.MMDataIndex()
+        self.dedup = dedup
+        self.chunk = chunk
+        self.next_data_num = next_data_num
+
+    def is_chunk_target(self, size: int) -> bool:
+        return self.chunk and size > mm_const.CHUNK_MAX_SIZE
+
+    def add_chunks(self, open_func) -> list:
+        entry_name_list = []
+        with open_func() as f:
+            for chunk in mm_chunker.iter_chunks(f):
+                entry_name_list.append(self.add_bytes(chunk))
+        return entry_name_list
+
+    def add_bytes(self, data: bytes) -> str:
+        """Store data held in memory, always deduplicated."""
+        size = len(data)
+        digest = mm_digest.new_digest()
+        digest.update(data)
+        digest = digest.hexdigest()
+        if self.data_index.have_size(size):
+            self.data_index.resolve_digests(size, self._open_data)
+            same_entry_name = self.data_index.find_digest(digest)
+            if same_entry_name is not None:
+                mm_observer.dedup_hit(size)
+                return same_entry_name
+        entry_name = self._new_entry_name()
+        with self._open_write(entry_name, size) as f:
+            f.write(data)
+        self.data_index.add(entry_name, size, digest)
+        return entry_name
+
+    def add(self, open_func, size: int) -> str:
+        if self.dedup and self.data_index.have_size(size):
+            self.data_index.resolve_digests(size, self._open_data)
+            return self._add_dedup(open_func, size)
+        entry_name = self._new_entry_name()
+        with open_func() as f:
+            digest = self._write(f, entry_name, size)
+        self.data_index.add(entry_name, size, digest)
+        return entry_name
+
+    def _add_dedup(self, open_func, size: int) -> str:
+        # the number is only taken when the file is kept
+        entry_name = mm_const.FILE_PATH_FORMAT_DATA.format(self.next_data_num)
+        with open_func() as f:
+            digest = self._write(f, entry_name, size)
+        same_entry_name = self.data_index.find_digest(digest)
+        if same_entry_name is not None:
+            logger.debug("Found same data: %s", same_entry_name)
+            (self.base_dir_path / entry_name).unlink()
+            mm_observer.dedup_hit(size)
+            return same_entry_name
+        self._new_entry_name()
+        self.data_index.add(entry_name, size, digest)
+        return entry_name
+
+    def add_file(self, src_path: pathlib.Path, size: int, digest: str = None) -> str:
+        """Add a data file of another store by hard link, reflink or copy."""
+        if self.dedup and self.data_index.have_size(size):
+            self.data_index.resolve_digests(size, self._open_data)
+            if digest is None:
+                digest = mm_digest.file_digest(src_path)
+            same_entry_name = self.data_index.find_digest(digest)
+            if same_entry_name is not None:
+                logger.debug("Found same data: %s", same_entry_name)
+                mm_observer.dedup_hit(size)
+                return same_entry_name
+        entry_name = self._new_entry_name()
+        mm_file_util.link_or_copy(src_path, self.base_dir_path / entry_name)
+        self.data_index.add(entry_name, size, digest)
+        return entry_name
+
+    def _new_entry_name(self) -> str:
+        entry_name = mm_const.FILE_PATH_FORMAT_DATA.format(self.next_data_num)
+        self.next_data_num += 1
+        return entry_name
+
+    def _open_data(self, entry_name: str):
+        return (self.base_dir_path / entry_name).open("rb")
+
+    def _open_write(self, entry_name: str, size: int):
+        return (self.base_dir_path / entry_name).open("wb")
+
+    def _write(self, f, entry_name: str, size: int) -> str:
+        digest = mm_digest.new_digest()
+        with self._open_write(entry_name, size) as f2:
+            while True:
+                chunk = f.read(mm_const.DIGEST_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f2.write(chunk)
+        return digest.hexdigest()
+
+class MMZipDataWriter(MMDataWriter):
+    """MMDataWriter storing data members in a zip opened for append.
+
+    A member appended can not be taken back, so with dedup a member whose
+    size matches a stored one is hashed first and read again to write it.
+    """
+    zip_obj: zipfile.ZipFile
+
+    def __init__(self, zip_obj: zipfile.ZipFile, data_index: mm_data_index.MMDataIndex = None, dedup: bool = True, next_data_num: int = 1, chunk: bool = False):
+        super().__init__(None, data_index, dedup, next_data_num, chunk)
+        self.zip_obj = zip_obj
+
+    def add_file(self, src_path: pathlib.Path, size: int, digest: str = None) -> str:
+        return self.add(functools.partial(src_path.open, "rb"), size)
+
+    def _add_dedup(self, open_func, size: int) -> str:
+        with open_func() as f:
+            digest = mm_digest.stream_digest(f)
+        same_entry_name = self.data_index.find_digest(digest)
+        if same_entry_name is not None:
+            logger.debug("Found same data: %s", same_entry_name)
+            mm_observer.dedup_hit(size)
+            return same_entry_name
+        entry_name = self._new_entry_name()
+        with open_func() as f:
+            self._write(f, entry_name, size)
+        self.data_index.add(entry_name, size, digest)
+        return entry_name
+
+    def _open_data(self, entry_name: str):
+        return self.zip_obj.open(entry_name, "r")
+
+    def _open_write(self, entry_name: str, size: int):
+        return self.zip_obj.open(entry_name, "w", force_zip64=size > zipfile.ZIP64_LIMIT)
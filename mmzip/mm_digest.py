@@ -0,0 +1,144 @@
+import zlib
+import hashlib
+import pathlib
+import logging
+import mmzip.mm_const as mm_const
+import mmzip.mm_observer as mm_observer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def new_digest():
+    return hashlib.blake2b(digest_size=mm_const.DIGEST_SIZE)
+
+def stream_digest(f, size: int = -1) -> str:
+    digest = new_digest()
+    remain = size
+    while remain != 0:
+        read_size = mm_const.DIGEST_CHUNK_SIZE if remain < 0 else min(remain, mm_const.DIGEST_CHUNK_SIZE)
+        chunk = f.read(read_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        if remain > 0:
+            remain -= len(chunk)
+    return digest.hexdigest()
+
+def stream_digest_crc(f) -> tuple:
+    """(size, digest, CRC-32) of a stream read once to its end."""
+    digest = new_digest()
+    crc = 0
+    size = 0
+    buffer = bytearray(mm_const.DIGEST_CHUNK_SIZE)
+    view = memoryview(buffer)
+    while True:
+        read_size = f.readinto(buffer)
+        if not read_size:
+            break
+        chunk = view[:read_size]
+        digest.update(chunk)
+        crc = zlib.crc32(chunk, crc)
+        size += read_size
+    return size, digest.hexdigest(), crc
+
+def _gf2_matrix_times(matrix: list, vector: int) -> int:
+    result = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return result
+
+def _gf2_matrix_square(matrix: list) -> list:
+    return [_gf2_matrix_times(matrix, row) for row in matrix]
+
+def crc32_combine(crc1: int, crc2: int, size2: int) -> int:
+    """CRC-32 of two blocks joined, from their CRCs and the size of the second, as zlib's crc32_combine."""
+    if size2 <= 0:
+        return crc1
+    # operator for one zero bit, then squared into operators for 2, 4, 8... zero bits
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+    while True:
+        even = _gf2_matrix_square(odd)
+        if size2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        size2 >>= 1
+        if not size2:
+            break
+        odd = _gf2_matrix_square(even)
+        if size2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        size2 >>= 1
+        if not size2:
+            break
+    return crc1 ^ crc2
+
+def file_digest(path: pathlib.Path) -> str:
+    with path.open("rb") as f:
+        return stream_digest(f)
+
+def partial_digest(path: pathlib.Path, size: int) -> str:
+    # first and last block only, cheap filter before the full digest
+    block_size = mm_const.DIGEST_PARTIAL_BLOCK_SIZE
+    digest = new_digest()
+    with path.open("rb") as f:
+        digest.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+def is_partial_digest_full(size: int) -> bool:
+    return size <= mm_const.DIGEST_PARTIAL_BLOCK_SIZE * 2
+
+def find_same_files(data_list: list) -> None:
+    """Set "same_entry_name" on every data that duplicates an earlier one.
+
+    data_list items need "path", "entry_name" and "size", and may carry an
+    already known "digest". The full digest is stored in "digest" for every
+    data that needed one.
+    """
+    for size_group in _group_by(data_list, lambda data: data["size"]):
+        _find_same_in_size_group(size_group)
+        if mm_observer.is_enabled():
+            for data in size_group:
+                mm_observer.file_done(data["size"])
+
+def _find_same_in_size_group(size_group: list) -> None:
+    if len(size_group) < 2:
+        return
+    size = size_group[0]["size"]
+    if any(data.get("digest") is not None for data in size_group):
+        # a known digest has to be matched by full digest anyway
+        for digest_group in _group_by(size_group, _get_digest):
+            _mark_same_files(digest_group)
+        return
+    for partial_group in _group_by(size_group, lambda data: partial_digest(data["path"], size)):
+        if len(partial_group) < 2:
+            continue
+        if is_partial_digest_full(size):
+            _mark_same_files(partial_group)
+            continue
+        for digest_group in _group_by(partial_group, _get_digest):
+            _mark_same_files(digest_group)
+
+def _get_digest(data: dict) -> str:
+    if data.get("digest") is None:
+        data["digest"] = file_digest(data["path"])
+    return data["digest"]
+
+def _group_by(data_list: list, key_func) -> list:
+    groups = {}
+    for data in data_list:
+        groups.setdefault(key_func(data), []).append(data)
+    return list(groups.values())
+
+def _mark_same_files(group: list) -> None:
+    origin = group[0]
+    for data in group[1:]:
+        logger.info("Found same file: %s, %s", origin["entry_name"], data["entry_name"])
+        data["same_entry_name"] = origin["entry_name"]
@@ -0,0 +1,199 @@
+import re
+import bisect
+import fnmatch
+import json
+import threading
+import collections
+import mmzip.mm_const as mm_const
+import mmzip.mm_entry_set_binary as mm_entry_set_binary
+
+_entry_set_num_pt = re.compile(mm_const.FILE_PATH_REGEX_ENTRY_SET_NUM)
+
+def get_entry_set_num(file_name: str) -> int:
+    """Number N of an entry_setN.json / entory_setN.json name, or None."""
+    m = _entry_set_num_pt.search(file_name)
+    if m is None:
+        return None
+    return int(m.group(1))
+
+def get_entry_set_format(file_name: str) -> str:
+    if file_name.endswith(".bin"):
+        return mm_const.ENTRY_SET_FORMAT_BINARY
+    return mm_const.ENTRY_SET_FORMAT_JSON
+
+def _entry_set_name_rank(name: str) -> int:
+    # a binary set is written before the json one it replaces is removed
+    if name.endswith(".bin"):
+        return 2
+    if "entory_set" in name:
+        return 0
+    return 1
+
+def create_entry_set_map(name_list: list, get_name=lambda name: name) -> dict:
+    """Map entry set number to its item.
+
+    When one number has several files, entry_setN.bin wins over
+    entry_setN.json, which wins over the old entory_setN.json name.
+    """
+    entry_set_map = {}
+    for item in name_list:
+        name = get_name(item)
+        num = get_entry_set_num(name)
+        if num is None:
+            continue
+        if num in entry_set_map and _entry_set_name_rank(get_name(entry_set_map[num])) >= _entry_set_name_rank(name):
+            continue
+        entry_set_map[num] = item
+    return dict(sorted(entry_set_map.items()))
+
+def loads(data):
+    """Parse an entry set file of either format.
+
+    A binary entry set loads as a read-only MMCompactEntrySet.
+    """
+    if mm_entry_set_binary.is_binary(data):
+        return mm_entry_set_binary.loads(data)
+    return json.loads(data)
+
+def loads_dict(data) -> dict:
+    """Parse an entry set file of either format into plain, modifiable dicts."""
+    entry_set = loads(data)
+    if isinstance(entry_set, mm_entry_set_binary.MMCompactEntrySet):
+        return entry_set.to_dict()
+    return entry_set
+
+def dumps(entry_set: dict, entry_set_format: str = mm_const.ENTRY_SET_FORMAT_JSON) -> bytes:
+    if entry_set_format == mm_const.ENTRY_SET_FORMAT_BINARY:
+        return mm_entry_set_binary.dumps(entry_set)
+    if entry_set_format != mm_const.ENTRY_SET_FORMAT_JSON:
+        raise Exception("unknown entry set format")
+    if isinstance(entry_set, mm_entry_set_binary.MMCompactEntrySet):
+        entry_set = entry_set.to_dict()
+    return json.dumps(entry_set).encode("utf-8")
+
+def get_entry_set_file_path(entry_set_num: int, entry_set_format: str) -> str:
+    if entry_set_format == mm_const.ENTRY_SET_FORMAT_BINARY:
+        return mm_const.FILE_PATH_FORMAT_ENTRY_SET_BIN.format(entry_set_num)
+    return mm_const.FILE_PATH_FORMAT_ENTRY_SET.format(entry_set_num)
+
+def get_data_entry_name_list(entry: dict) -> list:
+    """Data files holding the content of a file entry, in order.
+
+    A chunked entry lists its chunks, any other file entry has one data file.
+    """
+    chunk_list = entry.get(mm_const.ENTRY_CHUNK_LIST)
+    if chunk_list is not None:
+        return chunk_list
+    entry_name = entry.get(mm_const.ENTRY_ENTRY_NAME)
+    if entry_name is None:
+        return []
+    return [entry_name]
+
+def conv_entry_data(entry: dict, conv_map: dict) -> None:
+    """Rename the data files an entry refers to, names missing from conv_map are kept."""
+    entry_name = entry.get(mm_const.ENTRY_ENTRY_NAME)
+    if entry_name is not None:
+        entry[mm_const.ENTRY_ENTRY_NAME] = conv_map.get(entry_name, entry_name)
+    chunk_list = entry.get(mm_const.ENTRY_CHUNK_LIST)
+    if chunk_list is not None:
+        entry[mm_const.ENTRY_CHUNK_LIST] = [conv_map.get(chunk, chunk) for chunk in chunk_list]
+
+def create_name_index(entry_set) -> "MMNameIndex":
+    name_map = {}
+    for i, entry in enumerate(entry_set[mm_const.ENTRY_SET_ENTRY_LIST]):
+        name_map[entry[mm_const.ENTRY_FILE_NAME]] = i
+    return MMNameIndex(name_map)
+
+def _glob_literal_prefix(pattern: str) -> str:
+    for i, c in enumerate(pattern):
+        if c in "*?[":
+            return pattern[:i]
+    return pattern
+
+class MMNameIndex:
+    """file_name to entry position of one entry set, with sorted prefix lookups."""
+    __slots__ = ("name_map", "_sorted_name_list")
+
+    def __init__(self, name_map: dict):
+        self.name_map = name_map
+        self._sorted_name_list = None
+
+    def get(self, file_name: str) -> int:
+        return self.name_map.get(file_name)
+
+    def get_sorted_name_list(self) -> list:
+        if self._sorted_name_list is None:
+            self._sorted_name_list = sorted(self.name_map)
+        return self._sorted_name_list
+
+    def find_prefix(self, prefix: str) -> list:
+        """Names starting with prefix, found by bisecting the sorted names."""
+        sorted_name_list = self.get_sorted_name_list()
+        start = bisect.bisect_left(sorted_name_list, prefix)
+        end = start
+        while end < len(sorted_name_list) and sorted_name_list[end].startswith(prefix):
+            end += 1
+        return sorted_name_list[start:end]
+
+    def select(self, include: list = None, exclude: list = None, prefix: str = None) -> list:
+        """Entry positions, in entry list order, of the names under prefix
+        matching any include glob and no exclude glob."""
+        prefix = prefix or ""
+        if include:
+            name_set = set()
+            for pattern in include:
+                literal_prefix = _glob_literal_prefix(pattern)
+                if literal_prefix.startswith(prefix):
+                    search_prefix = literal_prefix
+                elif prefix.startswith(literal_prefix):
+                    search_prefix = prefix
+                else:
+                    continue
+                for name in self.find_prefix(search_prefix):
+                    if name.startswith(prefix) and fnmatch.fnmatchcase(name, pattern):
+                        name_set.add(name)
+        else:
+            name_set = self.find_prefix(prefix)
+        position_list = []
+        for name in name_set:
+            if exclude and any(fnmatch.fnmatchcase(name, pattern) for pattern in exclude):
+                continue
+            position_list.append(self.name_map[name])
+        position_list.sort()
+        return position_list
+
+class MMEntrySetCache:
+    """Bounded LRU cache of parsed entry sets keyed by entry set number.
+
+    The cached dicts are shared, callers must not modify them.
+    """
+    load_func: object
+    max_size: int
+    cache: collections.OrderedDict
+
+    def __init__(self, load_func, max_size: int = mm_const.ENTRY_SET_CACHE_SIZE):
+        self.load_func = load_func
+        self.max_size = max_size
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, entry_set_num: int) -> dict:
+        with self.lock:
+            entry_set = self.cache.get(entry_set_num)
+            if entry_set is not None:
+                self.cache.move_to_end(entry_set_num)
+                return entry_set
+        entry_set = self.load_func(entry_set_num)
+        with self.lock:
+            self.cache[entry_set_num] = entry_set
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return entry_set
+
+    def discard(self, entry_set_num: int) -> None:
+        with self.lock:
+            self.cache.pop(entry_set_num, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.cache.clear()
@@ -0,0 +1,295 @@
+import sys
+import json
+import array
+import struct
+import collections.abc
+import mmzip.mm_const as mm_const
+
+# entry_setN.bin layout:
+#   MAGIC, uint32 header size, header json, string table json, column payloads
+# Every column of the entry list is stored on its own. Paths are split into
+# an interned directory and an interned base name, data entry names become
+# their data number, date_time is packed into one int64, a CRC-32 or None
+# is an int64 with -1 for None.
+MAGIC = b"MMES\x01"
+
+_COLUMN_PATH = "path"
+_COLUMN_DATA = "data"
+_COLUMN_DATE_TIME = "date_time"
+_COLUMN_BOOL = "bool"
+_COLUMN_STR = "str"
+_COLUMN_CRC = "crc"
+_COLUMN_JSON = "json"
+
+_KEY_COLUMN_TYPE = {
+    mm_const.ENTRY_FILE_NAME: _COLUMN_PATH,
+    mm_const.ENTRY_ENTRY_NAME: _COLUMN_DATA,
+    mm_const.ENTRY_DATE_TIME: _COLUMN_DATE_TIME,
+    mm_const.ENTRY_IS_DIR: _COLUMN_BOOL,
+    mm_const.ENTRY_COMMENT: _COLUMN_STR,
+    mm_const.ENTRY_CRC: _COLUMN_CRC,
+}
+
+_HEADER_FILE_NAME = "file_name"
+_HEADER_COMMENT = "comment"
+_HEADER_EXTRA = "extra"
+_HEADER_COUNT = "count"
+_HEADER_STRINGS_SIZE = "strings_size"
+_HEADER_COLUMNS = "columns"
+_COLUMN_KEY = "key"
+_COLUMN_TYPE = "type"
+_COLUMN_SIZE = "size"
+
+_MISSING = object()
+_NONE_ID = -1
+
+def is_binary(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+def dumps(entry_set: dict) -> bytes:
+    entry_list = entry_set[mm_const.ENTRY_SET_ENTRY_LIST]
+    key_list = []
+    for entry in entry_list:
+        for key in entry:
+            if key not in key_list:
+                key_list.append(key)
+
+    strings = _StringTable()
+    column_list = []
+    payload_list = []
+    for key in key_list:
+        values = [entry.get(key, _MISSING) for entry in entry_list]
+        column_type, payload = _encode_column(key, values, strings)
+        column_list.append({
+            _COLUMN_KEY: key,
+            _COLUMN_TYPE: column_type,
+            _COLUMN_SIZE: len(payload)
+        })
+        payload_list.append(payload)
+
+    strings_data = json.dumps(strings.string_list).encode("utf-8")
+    header = {
+        _HEADER_FILE_NAME: entry_set.get(mm_const.ENTRY_SET_FILE_NAME),
+        _HEADER_COMMENT: entry_set.get(mm_const.ENTRY_SET_COMMENT),
+        _HEADER_EXTRA: {key: value for key, value in entry_set.items() if key not in (mm_const.ENTRY_SET_FILE_NAME, mm_const.ENTRY_SET_ENTRY_LIST, mm_const.ENTRY_SET_COMMENT)},
+        _HEADER_COUNT: len(entry_list),
+        _HEADER_STRINGS_SIZE: len(strings_data),
+        _HEADER_COLUMNS: column_list
+    }
+    header_data = json.dumps(header).encode("utf-8")
+    return b"".join([MAGIC, struct.pack("<I", len(header_data)), header_data, strings_data] + payload_list)
+
+def loads(data: bytes) -> "MMCompactEntrySet":
+    if not is_binary(data):
+        raise Exception("not a binary entry set")
+    view = memoryview(data)
+    pos = len(MAGIC)
+    header_size, = struct.unpack_from("<I", view, pos)
+    pos += 4
+    header = json.loads(bytes(view[pos:pos + header_size]))
+    pos += header_size
+    string_list = json.loads(bytes(view[pos:pos + header[_HEADER_STRINGS_SIZE]]))
+    pos += header[_HEADER_STRINGS_SIZE]
+    count = header[_HEADER_COUNT]
+    column_list = []
+    for column in header[_HEADER_COLUMNS]:
+        payload = view[pos:pos + column[_COLUMN_SIZE]]
+        pos += column[_COLUMN_SIZE]
+        column_list.append((column[_COLUMN_KEY], column[_COLUMN_TYPE], _decode_column(column[_COLUMN_TYPE], payload, count)))
+    entry_list = MMCompactEntryList(count, string_list, column_list)
+    return MMCompactEntrySet(header[_HEADER_FILE_NAME], header[_HEADER_COMMENT], entry_list, header[_HEADER_EXTRA])
+
+class MMCompactEntryList(collections.abc.Sequence):
+    """Read-only entry list backed by column arrays, entry dicts are built on access."""
+    __slots__ = ("count", "string_list", "column_list")
+
+    def __init__(self, count: int, string_list: list, column_list: list):
+        self.count = count
+        self.string_list = string_list
+        self.column_list = column_list
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("entry index out of range")
+        entry = {}
+        string_list = self.string_list
+        for key, column_type, column in self.column_list:
+            if column_type == _COLUMN_PATH:
+                entry[key] = string_list[column[0][index]] + string_list[column[1][index]]
+            elif column_type == _COLUMN_DATA:
+                data_num = column[index]
+                entry[key] = None if data_num == _NONE_ID else mm_const.FILE_PATH_FORMAT_DATA.format(data_num)
+            elif column_type == _COLUMN_DATE_TIME:
+                entry[key] = _unpack_date_time(column[index])
+            elif column_type == _COLUMN_BOOL:
+                entry[key] = bool(column[index])
+            elif column_type == _COLUMN_CRC:
+                crc = column[index]
+                entry[key] = None if crc == _NONE_ID else crc
+            elif column_type == _COLUMN_STR:
+                string_id = column[index]
+                entry[key] = None if string_id == _NONE_ID else string_list[string_id]
+            else:
+                value = column.get(str(index), _MISSING)
+                if value is not _MISSING:
+                    entry[key] = value
+        return entry
+
+class MMCompactEntrySet(collections.abc.Mapping):
+    """Read-only entry set loaded from the binary format, see to_dict() for a mutable copy."""
+    __slots__ = ("file_name", "comment", "entry_list", "extra")
+
+    def __init__(self, file_name: str, comment: str, entry_list: MMCompactEntryList, extra: dict):
+        self.file_name = file_name
+        self.comment = comment
+        self.entry_list = entry_list
+        self.extra = extra
+
+    def __getitem__(self, key):
+        if key == mm_const.ENTRY_SET_FILE_NAME:
+            return self.file_name
+        if key == mm_const.ENTRY_SET_ENTRY_LIST:
+            return self.entry_list
+        if key == mm_const.ENTRY_SET_COMMENT:
+            return self.comment
+        return self.extra[key]
+
+    def __iter__(self):
+        yield mm_const.ENTRY_SET_FILE_NAME
+        yield mm_const.ENTRY_SET_ENTRY_LIST
+        yield mm_const.ENTRY_SET_COMMENT
+        yield from self.extra
+
+    def __len__(self) -> int:
+        return 3 + len(self.extra)
+
+    def to_dict(self) -> dict:
+        entry_set = dict(self)
+        entry_set[mm_const.ENTRY_SET_ENTRY_LIST] = list(self.entry_list)
+        return entry_set
+
+class _StringTable:
+    def __init__(self):
+        self.string_list = []
+        self.string_id_map = {}
+
+    def get_id(self, value: str) -> int:
+        string_id = self.string_id_map.get(value)
+        if string_id is None:
+            string_id = len(self.string_list)
+            self.string_list.append(value)
+            self.string_id_map[value] = string_id
+        return string_id
+
+def _encode_column(key: str, values: list, strings: _StringTable) -> tuple:
+    column_type = _KEY_COLUMN_TYPE.get(key, _COLUMN_JSON)
+    if column_type != _COLUMN_JSON and _MISSING not in values:
+        try:
+            return column_type, _encode_typed_column(column_type, values, strings)
+        except (TypeError, ValueError):
+            pass
+    column = {str(index): value for index, value in enumerate(values) if value is not _MISSING}
+    return _COLUMN_JSON, json.dumps(column).encode("utf-8")
+
+def _encode_typed_column(column_type: str, values: list, strings: _StringTable) -> bytes:
+    if column_type == _COLUMN_PATH:
+        dir_ids = array.array("I")
+        name_ids = array.array("I")
+        for value in values:
+            if not isinstance(value, str):
+                raise TypeError("path must be str")
+            sep = value.rfind("/", 0, len(value) - 1)
+            dir_ids.append(strings.get_id(value[:sep + 1]))
+            name_ids.append(strings.get_id(value[sep + 1:]))
+        return array_bytes(dir_ids) + array_bytes(name_ids)
+    if column_type == _COLUMN_DATA:
+        data_nums = array.array("q")
+        prefix = mm_const.DIR_PATH_DATA
+        for value in values:
+            if value is None:
+                data_nums.append(_NONE_ID)
+                continue
+            if not isinstance(value, str) or not value.startswith(prefix) or not value[len(prefix):].isdigit():
+                raise ValueError("not a data entry name")
+            data_num = int(value[len(prefix):])
+            if mm_const.FILE_PATH_FORMAT_DATA.format(data_num) != value:
+                raise ValueError("data entry name does not round trip")
+            data_nums.append(data_num)
+        return array_bytes(data_nums)
+    if column_type == _COLUMN_DATE_TIME:
+        packed = array.array("q")
+        for value in values:
+            packed.append(_pack_date_time(value))
+        return array_bytes(packed)
+    if column_type == _COLUMN_BOOL:
+        for value in values:
+            if not isinstance(value, bool):
+                raise TypeError("not a bool")
+        return bytes(values)
+    if column_type == _COLUMN_CRC:
+        crcs = array.array("q")
+        for value in values:
+            if value is None:
+                crcs.append(_NONE_ID)
+            elif isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 0xFFFFFFFF:
+                crcs.append(value)
+            else:
+                raise ValueError("not a CRC-32")
+        return array_bytes(crcs)
+    # _COLUMN_STR
+    string_ids = array.array("i")
+    for value in values:
+        if value is None:
+            string_ids.append(_NONE_ID)
+        elif isinstance(value, str):
+            string_ids.append(strings.get_id(value))
+        else:
+            raise TypeError("not a str")
+    return array_bytes(string_ids)
+
+def _decode_column(column_type: str, payload: memoryview, count: int):
+    if column_type == _COLUMN_PATH:
+        dir_ids = array_from_bytes("I", payload[:count * 4])
+        name_ids = array_from_bytes("I", payload[count * 4:])
+        return (dir_ids, name_ids)
+    if column_type in (_COLUMN_DATA, _COLUMN_DATE_TIME, _COLUMN_CRC):
+        return array_from_bytes("q", payload)
+    if column_type == _COLUMN_BOOL:
+        return bytes(payload)
+    if column_type == _COLUMN_STR:
+        return array_from_bytes("i", payload)
+    return json.loads(bytes(payload))
+
+def _pack_date_time(value) -> int:
+    if not isinstance(value, (list, tuple)) or len(value) != 6:
+        raise ValueError("date_time must have 6 fields")
+    year, month, day, hour, minute, second = value
+    for field, limit in ((year, 1 << 30), (month, 16), (day, 32), (hour, 32), (minute, 64), (second, 64)):
+        if not isinstance(field, int) or isinstance(field, bool) or field < 0 or field >= limit:
+            raise ValueError("date_time field out of range")
+    return (year << 26) | (month << 22) | (day << 17) | (hour << 12) | (minute << 6) | second
+
+def _unpack_date_time(packed: int) -> list:
+    return [packed >> 26, (packed >> 22) & 0xF, (packed >> 17) & 0x1F, (packed >> 12) & 0x1F, (packed >> 6) & 0x3F, packed & 0x3F]
+
+def array_bytes(values: array.array) -> bytes:
+    """Little-endian bytes of an array, whatever the platform byte order."""
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def array_from_bytes(typecode: str, payload) -> array.array:
+    """Array of typecode read from little-endian bytes written by array_bytes()."""
+    values = array.array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
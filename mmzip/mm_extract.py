@@ -0,0 +1,149 @@
+import datetime
+import os
+import pathlib
+import logging
+import threading
+import concurrent.futures
+import mmzip.mm_const as mm_const
+import mmzip.mm_file_util as mm_file_util
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_observer as mm_observer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def entry_timestamp(entry: dict) -> float:
+    date_time = entry[mm_const.ENTRY_DATE_TIME]
+    atime = datetime.datetime(year=date_time[0], month=date_time[1], day=date_time[2], hour=date_time[3], minute=date_time[4], second=date_time[5], microsecond=0, tzinfo=datetime.timezone.utc)
+    return atime.timestamp()
+
+def prepare_extract_path(extract_to: str, exist_ok: bool = False) -> pathlib.Path:
+    extract_path = pathlib.Path(extract_to)
+    if extract_path.exists():
+        if not exist_ok:
+            raise Exception("Destination directory already exists")
+    else:
+        extract_path.mkdir()
+    return extract_path
+
+def select_entry_list(entry_set, name_index_func, include=None, exclude=None, prefix: str = None) -> list:
+    """Entries of entry_set under prefix, matching an include glob and no exclude glob.
+
+    include and exclude take a glob or a list of globs matched against the
+    whole file_name with fnmatchcase, so * also matches across /.
+    name_index_func() is only called when there is something to select.
+    """
+    entry_list = entry_set[mm_const.ENTRY_SET_ENTRY_LIST]
+    if isinstance(include, str):
+        include = [include]
+    if isinstance(exclude, str):
+        exclude = [exclude]
+    if not include and not exclude and not prefix:
+        return entry_list
+    name_index = name_index_func()
+    return [entry_list[position] for position in name_index.select(include, exclude, prefix)]
+
+def is_up_to_date(entry: dict, output_path: pathlib.Path, size: int) -> bool:
+    try:
+        stat = output_path.stat()
+    except FileNotFoundError:
+        return False
+    return stat.st_size == size and abs(stat.st_mtime - entry_timestamp(entry)) < 1
+
+def extract_entry_list(entry_list: list, extract_path: pathlib.Path, write_func, workers: int = 1, size_func=None, link_duplicates: bool = False, cancel_event: threading.Event = None) -> None:
+    """Write the entries of an entry set below extract_path.
+
+    write_func(entry, output_path) writes one file entry. Directories are
+    created before any file is written and get their timestamps after all
+    files are written, deepest first, so writing into them does not change
+    their mtime afterwards. With size_func(entry) given, files already
+    present with that size and the entry mtime are skipped. With
+    link_duplicates only the first entry of each data file is written, the
+    others are hard linked to it, or reflinked/copied when their mtime
+    differs or the filesystem can not link. Setting cancel_event stops the
+    extraction before the next file.
+    """
+    dir_entry_list = []
+    file_entry_list = []
+    for entry in entry_list:
+        if entry[mm_const.ENTRY_IS_DIR]:
+            dir_entry_list.append(entry)
+        else:
+            file_entry_list.append(entry)
+
+    parent_path_set = set()
+    for entry in dir_entry_list:
+        parent_path_set.add(extract_path / entry[mm_const.ENTRY_FILE_NAME])
+    for entry in file_entry_list:
+        parent_path_set.add((extract_path / entry[mm_const.ENTRY_FILE_NAME]).parent)
+    for parent_path in sorted(parent_path_set):
+        parent_path.mkdir(parents=True, exist_ok=True)
+
+    primary_entry_list = file_entry_list
+    link_entry_list = []
+    if link_duplicates:
+        primary_entry_list = []
+        primary_entry_map = {}
+        for entry in file_entry_list:
+            data_key = tuple(mm_entry_set.get_data_entry_name_list(entry))
+            primary_entry = primary_entry_map.get(data_key)
+            if primary_entry is None:
+                primary_entry_map[data_key] = entry
+                primary_entry_list.append(entry)
+            else:
+                link_entry_list.append((entry, primary_entry))
+
+    def _prepare_output(entry: dict) -> pathlib.Path:
+        if cancel_event is not None and cancel_event.is_set():
+            raise Exception("extraction cancelled")
+        output_path = extract_path / entry[mm_const.ENTRY_FILE_NAME]
+        if size_func is not None and is_up_to_date(entry, output_path, size_func(entry)):
+            logger.debug("Skipping up to date %s", output_path)
+            return None
+        # never write through an old hard link into another file
+        if output_path.is_file():
+            output_path.unlink()
+        return output_path
+
+    def _extract_file(entry: dict) -> None:
+        output_path = _prepare_output(entry)
+        if output_path is None:
+            return
+        write_func(entry, output_path)
+        timestamp = entry_timestamp(entry)
+        os.utime(path=str(output_path), times=(timestamp, timestamp))
+        if mm_observer.is_enabled():
+            mm_observer.file_done(output_path.stat().st_size)
+
+    def _link_file(entry: dict, primary_entry: dict) -> None:
+        output_path = _prepare_output(entry)
+        if output_path is None:
+            return
+        primary_path = extract_path / primary_entry[mm_const.ENTRY_FILE_NAME]
+        timestamp = entry_timestamp(entry)
+        # a hard link shares the mtime of the primary file
+        if timestamp == entry_timestamp(primary_entry):
+            mm_file_util.link_or_copy(primary_path, output_path)
+        else:
+            mm_file_util.copy_file(primary_path, output_path)
+        os.utime(path=str(output_path), times=(timestamp, timestamp))
+        if mm_observer.is_enabled():
+            mm_observer.file_done(output_path.stat().st_size)
+
+    with mm_observer.phase("extract", len(file_entry_list)):
+        if workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in concurrent.futures.as_completed([executor.submit(_extract_file, entry) for entry in primary_entry_list]):
+                    future.result()
+                for future in concurrent.futures.as_completed([executor.submit(_link_file, entry, primary_entry) for entry, primary_entry in link_entry_list]):
+                    future.result()
+        else:
+            for entry in primary_entry_list:
+                _extract_file(entry)
+            for entry, primary_entry in link_entry_list:
+                _link_file(entry, primary_entry)
+
+    dir_entry_list.sort(key=lambda entry: len(pathlib.PurePosixPath(entry[mm_const.ENTRY_FILE_NAME]).parts), reverse=True)
+    for entry in dir_entry_list:
+        timestamp = entry_timestamp(entry)
+        os.utime(path=str(extract_path / entry[mm_const.ENTRY_FILE_NAME]), times=(timestamp, timestamp))
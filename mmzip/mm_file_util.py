@@ -0,0 +1,94 @@
+import os
+import shutil
+import pathlib
+import logging
+import mmzip.mm_const as mm_const
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# linux/fs.h FICLONE
+_FICLONE = 0x40049409
+
+def reflink(src: pathlib.Path, dst: pathlib.Path) -> bool:
+    """Clone src into a new file dst sharing its extents (btrfs, xfs, ...).
+
+    Returns False when the platform or filesystem can not clone.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, "rb") as sf:
+        with open(dst, "wb") as df:
+            try:
+                fcntl.ioctl(df.fileno(), _FICLONE, sf.fileno())
+                return True
+            except OSError:
+                pass
+    os.unlink(dst)
+    return False
+
+def write_atomic(path: pathlib.Path, data) -> None:
+    """Write data to path through a temporary file, a crash leaves the old file or the new one."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with tmp_path.open("wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def link_or_copy(src: pathlib.Path, dst: pathlib.Path) -> None:
+    try:
+        os.link(src, dst)
+        return
+    except OSError as e:
+        logger.debug("Hard link failed %s: %s", dst, e)
+    copy_file(src, dst)
+
+def copy_file(src: pathlib.Path, dst: pathlib.Path) -> None:
+    """Copy src to dst in the kernel where possible, in bounded chunks otherwise."""
+    if reflink(src, dst):
+        return
+    with open(src, "rb") as sf:
+        with open(dst, "wb") as df:
+            size = os.fstat(sf.fileno()).st_size
+            if _copy_file_range(sf, df, size):
+                return
+            if _sendfile(sf, df, size):
+                return
+            shutil.copyfileobj(sf, df, mm_const.COPY_CHUNK_SIZE)
+
+def _copy_file_range(sf, df, size: int) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+    offset = 0
+    while offset < size:
+        try:
+            copied = os.copy_file_range(sf.fileno(), df.fileno(), min(size - offset, mm_const.COPY_CHUNK_SIZE * 64))
+        except OSError as e:
+            if offset == 0:
+                logger.debug("copy_file_range failed %s: %s", df.name, e)
+                return False
+            raise
+        if copied == 0:
+            break
+        offset += copied
+    return True
+
+def _sendfile(sf, df, size: int) -> bool:
+    if not hasattr(os, "sendfile"):
+        return False
+    offset = 0
+    while offset < size:
+        try:
+            sent = os.sendfile(df.fileno(), sf.fileno(), offset, min(size - offset, mm_const.COPY_CHUNK_SIZE * 64))
+        except OSError as e:
+            if offset == 0:
+                logger.debug("sendfile failed %s: %s", df.name, e)
+                return False
+            raise
+        if sent == 0:
+            break
+        offset += sent
+    return True
@@ -0,0 +1,202 @@
+import json
+import array
+import zlib
+import bisect
+import struct
+import logging
+import zipfile
+import mmzip.mm_const as mm_const
+import mmzip.mm_member_reader as mm_member_reader
+import mmzip.mm_entry_set_binary as mm_entry_set_binary
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# mm_info/member_index.bin layout:
+#   MAGIC, uint32 header size, header json, column payloads
+# It is the last member of the zip and the zip comment holds the offset of
+# its local header, so a reader finds it from the end record alone. The
+# header maps every member that is not a numbered data member to its
+# fields. Numbered data members are stored as int64 columns sorted by data
+# number, one per field. An index whose member count or central directory
+# offset do not match the end record is stale and not used.
+MAGIC = b"MMMI\x01"
+COMMENT_PREFIX = b"mmzip member index "
+
+_HEADER_COUNT = "count"
+_HEADER_MEMBERS = "members"
+_HEADER_DATA_COUNT = "data_count"
+
+# fields of a member, in column order
+_FIELD_LIST = ("header_offset", "compress_size", "file_size", "CRC", "compress_type", "flag_bits")
+
+_END_RECORD_STRUCT = struct.Struct("<4s4H2LH")
+_END_RECORD_SIGNATURE = b"PK\005\006"
+_ZIP64_LOCATOR_STRUCT = struct.Struct("<4sLQL")
+_ZIP64_LOCATOR_SIGNATURE = b"PK\006\007"
+_ZIP64_END_RECORD_STRUCT = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_END_RECORD_SIGNATURE = b"PK\006\006"
+
+def _get_data_num(entry_name: str) -> int:
+    name = entry_name[len(mm_const.DIR_PATH_DATA):]
+    if entry_name.startswith(mm_const.DIR_PATH_DATA) and name.isdigit() and mm_const.FILE_PATH_FORMAT_DATA.format(int(name)) == entry_name:
+        return int(name)
+    return None
+
+class MMMemberIndex:
+    """Where every member of an MMZip is, without its central directory.
+
+    get_info() builds the ZipInfo of one member on demand.
+    """
+    count: int
+    member_map: dict
+    data_num_list: list
+
+    def __init__(self, count: int, member_map: dict, data_num_list, column_list: list):
+        self.count = count
+        self.member_map = member_map
+        self.data_num_list = data_num_list
+        self._column_list = column_list
+
+    @classmethod
+    def create(cls, zip_info_list: list) -> "MMMemberIndex":
+        member_map = {}
+        data_list = []
+        for zip_info in zip_info_list:
+            data_num = _get_data_num(zip_info.filename)
+            fields = [getattr(zip_info, field) for field in _FIELD_LIST]
+            if data_num is None:
+                member_map[zip_info.filename] = fields
+            else:
+                data_list.append([data_num] + fields)
+        data_list.sort(key=lambda fields: fields[0])
+        column_list = [array.array("q") for _ in range(len(_FIELD_LIST) + 1)]
+        for fields in data_list:
+            for column, value in zip(column_list, fields):
+                column.append(value)
+        return cls(len(zip_info_list), member_map, column_list[0], column_list[1:])
+
+    @classmethod
+    def loads(cls, data: bytes) -> "MMMemberIndex":
+        if data[:len(MAGIC)] != MAGIC:
+            raise Exception("not a member index")
+        view = memoryview(data)
+        pos = len(MAGIC)
+        header_size, = struct.unpack_from("<I", view, pos)
+        pos += 4
+        header = json.loads(bytes(view[pos:pos + header_size]))
+        pos += header_size
+        column_size = header[_HEADER_DATA_COUNT] * 8
+        column_list = []
+        for _ in range(len(_FIELD_LIST) + 1):
+            column_list.append(mm_entry_set_binary.array_from_bytes("q", view[pos:pos + column_size]))
+            pos += column_size
+        return cls(header[_HEADER_COUNT], header[_HEADER_MEMBERS], column_list[0], column_list[1:])
+
+    def dumps(self) -> bytes:
+        header = {
+            _HEADER_COUNT: self.count,
+            _HEADER_MEMBERS: self.member_map,
+            _HEADER_DATA_COUNT: len(self.data_num_list)
+        }
+        header_data = json.dumps(header).encode("utf-8")
+        payload_list = [mm_entry_set_binary.array_bytes(column) for column in [self.data_num_list] + self._column_list]
+        return b"".join([MAGIC, struct.pack("<I", len(header_data)), header_data] + payload_list)
+
+    def _get_fields(self, entry_name: str) -> list:
+        fields = self.member_map.get(entry_name)
+        if fields is not None:
+            return fields
+        data_num = _get_data_num(entry_name)
+        if data_num is None:
+            return None
+        i = bisect.bisect_left(self.data_num_list, data_num)
+        if i == len(self.data_num_list) or self.data_num_list[i] != data_num:
+            return None
+        return [column[i] for column in self._column_list]
+
+    def __contains__(self, entry_name: str) -> bool:
+        return self._get_fields(entry_name) is not None
+
+    def get_info(self, entry_name: str) -> zipfile.ZipInfo:
+        """ZipInfo of a member, enough to read it. Raises KeyError like ZipFile.getinfo()."""
+        fields = self._get_fields(entry_name)
+        if fields is None:
+            raise KeyError("There is no item named {!r} in the archive".format(entry_name))
+        zip_info = zipfile.ZipInfo(entry_name)
+        for field, value in zip(_FIELD_LIST, fields):
+            setattr(zip_info, field, value)
+        return zip_info
+
+    def get_info_list(self, prefix: str = "") -> list:
+        """ZipInfo of the members other than numbered data members whose name starts with prefix."""
+        return [self.get_info(entry_name) for entry_name in self.member_map if entry_name.startswith(prefix)]
+
+    def get_data_entry_name_list(self) -> list:
+        entry_name_list = [mm_const.FILE_PATH_FORMAT_DATA.format(data_num) for data_num in self.data_num_list]
+        entry_name_list.extend(entry_name for entry_name in self.member_map if entry_name.startswith(mm_const.DIR_PATH_DATA))
+        return entry_name_list
+
+def write_member_index(zipf: zipfile.ZipFile) -> None:
+    """Append the member index of everything written to zipf so far, it must be the last member."""
+    member_index = MMMemberIndex.create(zipf.filelist)
+    # counting itself, as the end record will
+    member_index.count += 1
+    zipf.writestr(mm_const.FILE_PATH_MEMBER_INDEX, member_index.dumps(), compress_type=zipfile.ZIP_DEFLATED)
+    zipf.comment = COMMENT_PREFIX + str(zipf.NameToInfo[mm_const.FILE_PATH_MEMBER_INDEX].header_offset).encode("ascii")
+
+def read_member_index(mapping) -> MMMemberIndex:
+    """Member index of the zip held by mapping, None if it has none or it is stale."""
+    end_record = _read_end_record(mapping)
+    if end_record is None:
+        return None
+    count, cd_offset, comment = end_record
+    if not comment.startswith(COMMENT_PREFIX) or not comment[len(COMMENT_PREFIX):].isdigit():
+        return None
+    zip_info = zipfile.ZipInfo(mm_const.FILE_PATH_MEMBER_INDEX)
+    zip_info.header_offset = int(comment[len(COMMENT_PREFIX):])
+    try:
+        fields = mm_member_reader.read_local_header(mapping, zip_info.header_offset)
+    except (zipfile.BadZipFile, struct.error):
+        return None
+    compress_type, compress_size, file_name = fields
+    if file_name != mm_const.FILE_PATH_MEMBER_INDEX.encode("utf-8"):
+        return None
+    offset = mm_member_reader.get_member_data_offset(mapping, zip_info)
+    # members appended after it moved the central directory
+    if offset + compress_size != cd_offset:
+        return None
+    data = mapping[offset:offset + compress_size]
+    if compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -15)
+    elif compress_type != zipfile.ZIP_STORED:
+        return None
+    member_index = MMMemberIndex.loads(data)
+    if member_index.count != count:
+        return None
+    return member_index
+
+def _read_end_record(mapping) -> tuple:
+    """(member count, central directory offset, comment) from the end of the zip held by mapping."""
+    size = len(mapping)
+    tail_start = max(0, size - _END_RECORD_STRUCT.size - 0xFFFF)
+    pos = mapping.rfind(_END_RECORD_SIGNATURE, tail_start)
+    if pos < 0:
+        return None
+    fields = _END_RECORD_STRUCT.unpack_from(mapping, pos)
+    comment = mapping[pos + _END_RECORD_STRUCT.size:pos + _END_RECORD_STRUCT.size + fields[7]]
+    count = fields[4]
+    cd_offset = fields[6]
+    if count == 0xFFFF or cd_offset == 0xFFFFFFFF:
+        locator_pos = pos - _ZIP64_LOCATOR_STRUCT.size
+        if locator_pos < 0:
+            return None
+        locator = _ZIP64_LOCATOR_STRUCT.unpack_from(mapping, locator_pos)
+        if locator[0] != _ZIP64_LOCATOR_SIGNATURE:
+            return None
+        record = _ZIP64_END_RECORD_STRUCT.unpack_from(mapping, locator[2])
+        if record[0] != _ZIP64_END_RECORD_SIGNATURE:
+            return None
+        count = record[7]
+        cd_offset = record[9]
+    return count, cd_offset, comment
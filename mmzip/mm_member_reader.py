@@ -0,0 +1,159 @@
+import io
+import bisect
+import mmap
+import struct
+import zipfile
+
+# local file header: signature .. extra field length
+_LOCAL_HEADER_STRUCT = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+
+def get_member_data_offset(buffer, zip_info: zipfile.ZipInfo) -> int:
+    """Offset of the member data in buffer, which holds the zip from its start.
+
+    The local header may carry another extra field than the central directory.
+    """
+    fields = _LOCAL_HEADER_STRUCT.unpack_from(buffer, zip_info.header_offset)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile("Bad magic number for file header")
+    return zip_info.header_offset + _LOCAL_HEADER_STRUCT.size + fields[10] + fields[11]
+
+def read_local_header(buffer, header_offset: int) -> tuple:
+    """(compress type, compressed size, file name bytes) from the local header at header_offset."""
+    fields = _LOCAL_HEADER_STRUCT.unpack_from(buffer, header_offset)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile("Bad magic number for file header")
+    name_offset = header_offset + _LOCAL_HEADER_STRUCT.size
+    return fields[4], fields[8], bytes(buffer[name_offset:name_offset + fields[10]])
+
+class MMMapMemberReader(io.RawIOBase):
+    """Seekable reader over a STORED zip member mapped into memory.
+
+    getbuffer() gives the member as a memoryview of the mapping without
+    copying it.
+    """
+
+    def __init__(self, mapping: mmap.mmap, offset: int, size: int):
+        super().__init__()
+        self._view = memoryview(mapping)[offset:offset + size]
+        self._pos = 0
+
+    def getbuffer(self) -> memoryview:
+        return self._view
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError("invalid whence")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b) -> int:
+        data = self._view[self._pos:self._pos + len(b)]
+        size = len(data)
+        memoryview(b).cast("B")[:size] = data
+        self._pos += size
+        return size
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            end = len(self._view)
+        else:
+            end = self._pos + size
+        data = bytes(self._view[self._pos:end])
+        self._pos += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+class MMChunkReader(io.RawIOBase):
+    """Seekable reader over the chunks of a chunked entry.
+
+    open_func(entry_name) opens one chunk; only the chunk being read is open.
+    """
+
+    def __init__(self, open_func, entry_name_list: list, size_list: list):
+        super().__init__()
+        self._open_func = open_func
+        self._entry_name_list = entry_name_list
+        self._offset_list = []
+        offset = 0
+        for size in size_list:
+            self._offset_list.append(offset)
+            offset += size
+        self._size = offset
+        self._pos = 0
+        self._chunk_index = None
+        self._chunk_f = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError("invalid whence")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b) -> int:
+        if self._pos >= self._size:
+            return 0
+        chunk_index = bisect.bisect_right(self._offset_list, self._pos) - 1
+        if chunk_index != self._chunk_index:
+            self._close_chunk()
+            self._chunk_f = self._open_func(self._entry_name_list[chunk_index])
+            self._chunk_index = chunk_index
+        chunk_offset = self._pos - self._offset_list[chunk_index]
+        if self._chunk_f.tell() != chunk_offset:
+            self._chunk_f.seek(chunk_offset)
+        chunk_end = self._offset_list[chunk_index + 1] if chunk_index + 1 < len(self._offset_list) else self._size
+        view = memoryview(b).cast("B")[:chunk_end - self._pos]
+        size = self._chunk_f.readinto(view)
+        self._pos += size
+        return size
+
+    def _close_chunk(self) -> None:
+        if self._chunk_f is not None:
+            self._chunk_f.close()
+            self._chunk_f = None
+            self._chunk_index = None
+
+    def close(self) -> None:
+        self._close_chunk()
+        super().close()
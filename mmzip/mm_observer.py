@@ -0,0 +1,186 @@
+import json
+import time
+import pathlib
+import threading
+import contextlib
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Observers are attached process wide, like logging handlers. The pipelines
+# report through the module functions below, which return at once while no
+# observer is attached.
+
+class MMObserver:
+    """Receives pipeline events, override the ones of interest.
+
+    Phases may nest. file_done and dedup_hit belong to the innermost phase
+    running and may be called from worker threads.
+    """
+
+    def phase_start(self, phase: str, total_files: int, total_bytes: int) -> None:
+        pass
+
+    def phase_end(self, phase: str, seconds: float) -> None:
+        pass
+
+    def file_done(self, size: int) -> None:
+        pass
+
+    def dedup_hit(self, size: int) -> None:
+        """A file or chunk of size bytes was found stored already and not written again."""
+        pass
+
+_observer_list = []
+_NULL_PHASE = contextlib.nullcontext()
+
+def add_observer(observer: MMObserver) -> None:
+    global _observer_list
+    _observer_list = _observer_list + [observer]
+
+def remove_observer(observer: MMObserver) -> None:
+    global _observer_list
+    _observer_list = [o for o in _observer_list if o is not observer]
+
+@contextlib.contextmanager
+def observing(observer: MMObserver):
+    add_observer(observer)
+    try:
+        yield observer
+    finally:
+        remove_observer(observer)
+
+def is_enabled() -> bool:
+    return bool(_observer_list)
+
+def phase(name: str, total_files: int = None, total_bytes: int = None):
+    """Context manager reporting the start, end and duration of a phase."""
+    if not _observer_list:
+        return _NULL_PHASE
+    return _phase(name, total_files, total_bytes)
+
+@contextlib.contextmanager
+def _phase(name: str, total_files: int, total_bytes: int):
+    observer_list = _observer_list
+    for observer in observer_list:
+        observer.phase_start(name, total_files, total_bytes)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        for observer in observer_list:
+            observer.phase_end(name, seconds)
+
+def file_done(size: int) -> None:
+    for observer in _observer_list:
+        observer.file_done(size)
+
+def dedup_hit(size: int) -> None:
+    for observer in _observer_list:
+        observer.dedup_hit(size)
+
+class MMProgressReporter(MMObserver):
+    """Counts files, bytes and dedup hits per phase and derives throughput and ETA.
+
+    snapshot() returns the figures as a dict. Every interval seconds they
+    are logged and, with status_path, written there as JSON for scraping.
+    """
+    interval: float
+    status_path: pathlib.Path
+
+    def __init__(self, interval: float = 10.0, status_path: str = None):
+        self.interval = interval
+        self.status_path = pathlib.Path(status_path) if status_path is not None else None
+        self._lock = threading.Lock()
+        self._phase_stack = []
+        self._phase_seconds = {}
+        self._totals = {"files": 0, "bytes": 0, "dedup_hits": 0, "dedup_bytes": 0}
+        self._last_report = time.monotonic()
+
+    def phase_start(self, phase: str, total_files: int, total_bytes: int) -> None:
+        with self._lock:
+            self._phase_stack.append({
+                "phase": phase,
+                "start": time.monotonic(),
+                "total_files": total_files,
+                "total_bytes": total_bytes,
+                "files": 0,
+                "bytes": 0,
+                "dedup_hits": 0,
+                "dedup_bytes": 0
+            })
+        logger.info("Phase %s started", phase)
+
+    def phase_end(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            if self._phase_stack and self._phase_stack[-1]["phase"] == phase:
+                self._phase_stack.pop()
+            self._phase_seconds[phase] = self._phase_seconds.get(phase, 0.0) + seconds
+        logger.info("Phase %s finished in %.2fs", phase, seconds)
+        self._report()
+
+    def file_done(self, size: int) -> None:
+        with self._lock:
+            self._totals["files"] += 1
+            self._totals["bytes"] += size
+            if self._phase_stack:
+                current = self._phase_stack[-1]
+                current["files"] += 1
+                current["bytes"] += size
+        self._maybe_report()
+
+    def dedup_hit(self, size: int) -> None:
+        with self._lock:
+            self._totals["dedup_hits"] += 1
+            self._totals["dedup_bytes"] += size
+            if self._phase_stack:
+                current = self._phase_stack[-1]
+                current["dedup_hits"] += 1
+                current["dedup_bytes"] += size
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            phase_list = []
+            for current in self._phase_stack:
+                elapsed = now - current["start"]
+                status = {key: value for key, value in current.items() if key != "start"}
+                status["elapsed"] = elapsed
+                status["bytes_per_second"] = current["bytes"] / elapsed if elapsed > 0 else None
+                status["eta"] = _eta(current, elapsed)
+                phase_list.append(status)
+            return {
+                "time": time.time(),
+                "phases": phase_list,
+                "phase_seconds": dict(self._phase_seconds),
+                "totals": dict(self._totals)
+            }
+
+    def _maybe_report(self) -> None:
+        if time.monotonic() - self._last_report >= self.interval:
+            self._report()
+
+    def _report(self) -> None:
+        self._last_report = time.monotonic()
+        status = self.snapshot()
+        if status["phases"]:
+            current = status["phases"][-1]
+            logger.info("%s: %d files, %.1f MiB, %.1f MiB/s, eta %s",
+                current["phase"], current["files"], current["bytes"] / (1024 * 1024),
+                (current["bytes_per_second"] or 0) / (1024 * 1024),
+                "-" if current["eta"] is None else "{:.0f}s".format(current["eta"]))
+        if self.status_path is not None:
+            tmp_path = self.status_path.with_name(self.status_path.name + ".tmp")
+            tmp_path.write_text(json.dumps(status))
+            tmp_path.replace(self.status_path)
+
+def _eta(current: dict, elapsed: float) -> float:
+    """Seconds left, from bytes when the phase knows its total bytes, from files otherwise."""
+    for done_key, total_key in (("bytes", "total_bytes"), ("files", "total_files")):
+        total = current[total_key]
+        done = current[done_key]
+        if total and done > 0:
+            return elapsed * (total - done) / done
+    return None
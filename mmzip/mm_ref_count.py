@@ -0,0 +1,84 @@
+import json
+import logging
+import mmzip.mm_const as mm_const
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def _iter_data_entry_name(entry_set: dict):
+    """Data files referred to by the entries, as get_data_entry_name_list() without a list per entry."""
+    for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
+        chunk_list = entry.get(mm_const.ENTRY_CHUNK_LIST)
+        if chunk_list is not None:
+            yield from chunk_list
+            continue
+        entry_name = entry.get(mm_const.ENTRY_ENTRY_NAME)
+        if entry_name is not None:
+            yield entry_name
+
+class MMRefCount:
+    """Number of file entries referring to each data file, stored as mm_info/ref_count.json.
+
+    The entry sets counted are recorded with the counts, so a file left
+    behind by an interrupted update is noticed and rebuilt instead of
+    trusted.
+    """
+    ref_map: dict
+    entry_set_num_list: list
+
+    def __init__(self):
+        self.ref_map = {}
+        self.entry_set_num_list = []
+
+    @classmethod
+    def loads(cls, data) -> "MMRefCount":
+        ref_count_dict = json.loads(data)
+        ref_count = cls()
+        ref_count.ref_map = ref_count_dict[mm_const.REF_COUNT_DATA]
+        ref_count.entry_set_num_list = ref_count_dict[mm_const.REF_COUNT_ENTRY_SET_NUM_LIST]
+        return ref_count
+
+    def dumps(self) -> str:
+        return json.dumps({
+            mm_const.REF_COUNT_ENTRY_SET_NUM_LIST: self.entry_set_num_list,
+            mm_const.REF_COUNT_DATA: self.ref_map
+        })
+
+    def add_entry_set(self, entry_set_num: int, entry_set: dict) -> None:
+        ref_map = self.ref_map
+        for entry_name in _iter_data_entry_name(entry_set):
+            ref_map[entry_name] = ref_map.get(entry_name, 0) + 1
+        if entry_set_num not in self.entry_set_num_list:
+            self.entry_set_num_list.append(entry_set_num)
+            self.entry_set_num_list.sort()
+
+    def remove_entry_set(self, entry_set_num: int, entry_set: dict) -> list:
+        """Uncount entry set N and return the data files nothing refers to any more."""
+        freed = []
+        ref_map = self.ref_map
+        for entry_name in _iter_data_entry_name(entry_set):
+            count = ref_map.get(entry_name, 0) - 1
+            if count > 0:
+                ref_map[entry_name] = count
+            elif entry_name in ref_map:
+                del ref_map[entry_name]
+                freed.append(entry_name)
+        if entry_set_num in self.entry_set_num_list:
+            self.entry_set_num_list.remove(entry_set_num)
+        return freed
+
+    def get(self, entry_name: str) -> int:
+        return self.ref_map.get(entry_name, 0)
+
+    def get_entry_name_list(self) -> list:
+        return list(self.ref_map.keys())
+
+    def is_for(self, entry_set_num_list: list) -> bool:
+        return sorted(entry_set_num_list) == self.entry_set_num_list
+
+def create_ref_count(entry_set_items) -> MMRefCount:
+    """Count the references of entry sets given as (entry set num, entry set) pairs."""
+    ref_count = MMRefCount()
+    for entry_set_num, entry_set in entry_set_items:
+        ref_count.add_entry_set(entry_set_num, entry_set)
+    return ref_count
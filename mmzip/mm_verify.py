@@ -0,0 +1,133 @@
+import logging
+import threading
+import concurrent.futures
+import mmzip.mm_const as mm_const
+import mmzip.mm_digest as mm_digest
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_observer as mm_observer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# verify result dict keys
+VERIFY_OK = "ok"
+VERIFY_DATA_ERRORS = "data_errors"
+VERIFY_ENTRY_ERRORS = "entry_errors"
+VERIFY_ENTRY_SET_NUM = "entry_set_num"
+VERIFY_FILE_NAME = "file_name"
+VERIFY_ERROR = "error"
+
+def verify(entry_set_items, data_entry_name_list: list, data_index: mm_data_index.MMDataIndex, open_func_factory, workers: int = 1) -> dict:
+    """Hash every data file once and check it and the entries referring to it.
+
+    entry_set_items is called twice and yields (entry set num, entry set)
+    pairs, data_entry_name_list holds the data files stored.
+    open_func_factory() is called once per worker thread and returns an
+    open_func(entry_name) for that thread. A data file is checked against
+    the size and digest of the data index, an entry against the CRC-32
+    recorded at ingest. Returns {"ok", "data_errors": {entry name: error},
+    "entry_errors": [{"entry_set_num", "file_name", "error"}]}.
+    """
+    stored = set(data_entry_name_list)
+    referenced = set()
+    for _, entry_set in entry_set_items():
+        for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
+            referenced.update(mm_entry_set.get_data_entry_name_list(entry))
+    entry_name_list = sorted(stored | referenced)
+
+    data_errors = {}
+    data_results = {}
+    with mm_observer.phase("verify", len(entry_name_list)):
+        for entry_name, result, error in _hash_data_list(entry_name_list, stored, open_func_factory, workers):
+            if error is None:
+                error = _check_data(data_index.get(entry_name), result)
+            if error is not None:
+                logger.error("Data %s: %s", entry_name, error)
+                data_errors[entry_name] = error
+            # only what the entry checks need, digests are not kept
+            data_results[entry_name] = None if result is None else (result[0], result[2])
+            mm_observer.file_done(0 if result is None else result[0])
+
+    entry_errors = []
+    for entry_set_num, entry_set in entry_set_items():
+        for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
+            if entry[mm_const.ENTRY_IS_DIR]:
+                continue
+            error = _check_entry(entry, data_results, data_errors)
+            if error is not None:
+                logger.error("Entry %s of entry set %d: %s", entry[mm_const.ENTRY_FILE_NAME], entry_set_num, error)
+                entry_errors.append({
+                    VERIFY_ENTRY_SET_NUM: entry_set_num,
+                    VERIFY_FILE_NAME: entry[mm_const.ENTRY_FILE_NAME],
+                    VERIFY_ERROR: error
+                })
+    logger.info("Verified %d data files: %d data errors, %d entry errors", len(entry_name_list), len(data_errors), len(entry_errors))
+    return {
+        VERIFY_OK: not data_errors and not entry_errors,
+        VERIFY_DATA_ERRORS: data_errors,
+        VERIFY_ENTRY_ERRORS: entry_errors
+    }
+
+def _hash_data_list(entry_name_list: list, stored: set, open_func_factory, workers: int):
+    """(entry name, (size, digest, crc) or None, error or None) of every data file, in completion order."""
+    def _hash(open_func, entry_name: str) -> tuple:
+        if entry_name not in stored:
+            return entry_name, None, "missing"
+        try:
+            with open_func(entry_name) as f:
+                return entry_name, mm_digest.stream_digest_crc(f), None
+        except Exception as e:
+            return entry_name, None, "unreadable: {}".format(e)
+
+    if workers <= 1:
+        open_func = open_func_factory()
+        for entry_name in entry_name_list:
+            yield _hash(open_func, entry_name)
+        return
+
+    local = threading.local()
+
+    def _hash_in_thread(entry_name: str) -> tuple:
+        open_func = getattr(local, "open_func", None)
+        if open_func is None:
+            open_func = local.open_func = open_func_factory()
+        return _hash(open_func, entry_name)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        # bounded, so a multi-TB store does not queue a future per data file up front
+        pending = set()
+        for entry_name in entry_name_list:
+            pending.add(executor.submit(_hash_in_thread, entry_name))
+            if len(pending) >= workers * 4:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+def _check_data(data_info: dict, result: tuple) -> str:
+    if data_info is None:
+        return None
+    size, digest, _ = result
+    if size != data_info[mm_const.DATA_SIZE]:
+        return "size {} does not match {}".format(size, data_info[mm_const.DATA_SIZE])
+    if data_info[mm_const.DATA_DIGEST] is not None and digest != data_info[mm_const.DATA_DIGEST]:
+        return "digest does not match"
+    return None
+
+def _check_entry(entry: dict, data_results: dict, data_errors: dict) -> str:
+    entry_name_list = mm_entry_set.get_data_entry_name_list(entry)
+    for entry_name in entry_name_list:
+        if entry_name in data_errors:
+            return "data {}: {}".format(entry_name, data_errors[entry_name])
+    expected_crc = entry.get(mm_const.ENTRY_CRC)
+    if expected_crc is None:
+        return None
+    crc = 0
+    for entry_name in entry_name_list:
+        size, data_crc = data_results[entry_name]
+        crc = mm_digest.crc32_combine(crc, data_crc, size)
+    if crc != expected_crc:
+        return "crc {:08x} does not match {:08x}".format(crc, expected_crc)
+    return None
@@ -0,0 +1,102 @@
+import io
+import zlib
+import shutil
+import pathlib
+import logging
+import tempfile
+import zipfile
+import mmzip.mm_const as mm_const
+import mmzip.mm_member_reader as mm_member_reader
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def choose_compress_type(file_path: pathlib.Path, compress_type: int = zipfile.ZIP_DEFLATED) -> int:
+    """STORED for data that does not compress (jpeg, mp4, archives, ...), compress_type otherwise.
+
+    Only a few blocks from the start, middle and end of the file are sampled.
+    """
+    if compress_type == zipfile.ZIP_STORED:
+        return compress_type
+    with file_path.open("rb") as f:
+        return choose_stream_compress_type(f, file_path.stat().st_size, compress_type)
+
+def choose_stream_compress_type(f, size: int, compress_type: int = zipfile.ZIP_DEFLATED) -> int:
+    """choose_compress_type() for a seekable file object of size bytes, like an archive member."""
+    if compress_type == zipfile.ZIP_STORED:
+        return compress_type
+    block_size = mm_const.COMPRESS_SAMPLE_BLOCK_SIZE
+    sample = b""
+    for offset in sorted(set([0, max(0, size // 2 - block_size // 2), max(0, size - block_size)])):
+        f.seek(offset)
+        sample += f.read(block_size)
+    if not sample:
+        return zipfile.ZIP_STORED
+    if len(zlib.compress(sample, 1)) >= len(sample) * mm_const.COMPRESS_SAMPLE_STORED_RATIO:
+        return zipfile.ZIP_STORED
+    return compress_type
+
+def compress_file(file_path: pathlib.Path, arcname: str, compress_type: int, compresslevel: int = None) -> tuple:
+    """Compress a file into a spooled temporary file for write_precompressed().
+
+    Safe to call from worker threads, zlib, bz2 and lzma release the GIL.
+    Returns the ZipInfo and the temporary file positioned at its start.
+    """
+    zip_info = zipfile.ZipInfo.from_file(file_path, arcname)
+    zip_info.compress_type = compress_type
+    compressor = zipfile._get_compressor(compress_type, compresslevel)
+    spool = tempfile.SpooledTemporaryFile(max_size=mm_const.COMPRESS_SPOOL_SIZE)
+    crc = 0
+    file_size = 0
+    try:
+        with file_path.open("rb") as f:
+            while True:
+                chunk = f.read(mm_const.COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                spool.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            spool.write(compressor.flush())
+    except BaseException:
+        spool.close()
+        raise
+    zip_info.CRC = crc
+    zip_info.file_size = file_size
+    zip_info.compress_size = spool.tell()
+    spool.seek(0)
+    return zip_info, spool
+
+def write_precompressed(zipf: zipfile.ZipFile, zip_info: zipfile.ZipInfo, f) -> None:
+    """Append a member whose compressed bytes are already in f.
+
+    zip_info must carry CRC, file_size and compress_size. zipfile has no
+    public way to do this, so the local header is written the way
+    ZipFile.write() does it and the member is registered for the central
+    directory.
+    """
+    if zipf._writing:
+        raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+    zipf._writecheck(zip_info)
+    zipf._didModify = True
+    zip_info.flag_bits &= ~zipfile._MASK_USE_DATA_DESCRIPTOR
+    zipf.fp.seek(zipf.start_dir)
+    zip_info.header_offset = zipf.fp.tell()
+    zipf.fp.write(zip_info.FileHeader())
+    shutil.copyfileobj(f, zipf.fp, mm_const.COPY_CHUNK_SIZE)
+    zipf.filelist.append(zip_info)
+    zipf.NameToInfo[zip_info.filename] = zip_info
+    zipf.start_dir = zipf.fp.tell()
+
+def copy_member_raw(zipf: zipfile.ZipFile, mapping, zip_info: zipfile.ZipInfo, arcname: str) -> None:
+    """Copy the compressed bytes of a member of the zip held by mapping under arcname, without recompressing."""
+    new_info = zipfile.ZipInfo(arcname, zip_info.date_time)
+    new_info.compress_type = zip_info.compress_type
+    new_info.external_attr = zip_info.external_attr
+    new_info.CRC = zip_info.CRC
+    new_info.file_size = zip_info.file_size
+    new_info.compress_size = zip_info.compress_size
+    offset = mm_member_reader.get_member_data_offset(mapping, zip_info)
+    with io.BufferedReader(mm_member_reader.MMMapMemberReader(mapping, offset, zip_info.compress_size)) as f:
+        write_precompressed(zipf, new_info, f)
@@ -1,11 +1,30 @@
-import datetime
 import os
+import io
+import shutil
+import functools
+import collections
+import contextlib
+import threading
+import concurrent.futures
 import pathlib
 import json
 import re
 import logging
 import zipfile
 import mmzip.mm_const as mm_const
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_data_writer as mm_data_writer
+import mmzip.mm_file_util as mm_file_util
+import mmzip.mm_extract as mm_extract
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_zip_writer as mm_zip_writer
+import mmzip.mm_member_reader as mm_member_reader
+import mmzip.mm_ref_count as mm_ref_count
+import mmzip.mm_compact as mm_compact
+import mmzip.mm_observer as mm_observer
+import mmzip.mm_verify as mm_verify
+import mmzip.mm_member_index as mm_member_index
+import mmzip.mm_archive as mm_archive
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -15,12 +34,23 @@ class MMDir:
     data_dir_path: pathlib.Path
     info_dir_path: pathlib.Path
     info_file_path: pathlib.Path
+    data_index_file_path: pathlib.Path
+    ref_count_file_path: pathlib.Path
+    _entry_set_path_map: dict
+    _entry_set_cache: mm_entry_set.MMEntrySetCache
+    _name_index_cache: mm_entry_set.MMEntrySetCache
 
     def __init__(self, path: str):
         self.base_dir_path = pathlib.Path(path)
         self.data_dir_path = self.base_dir_path / mm_const.DIR_PATH_DATA
         self.info_dir_path = self.base_dir_path / mm_const.DIR_PATH_MM_INFO
         self.info_file_path = self.base_dir_path / mm_const.FILE_PATH_INFO_JSON
+        self.data_index_file_path = self.base_dir_path / mm_const.FILE_PATH_DATA_INDEX
+        self.ref_count_file_path = self.base_dir_path / mm_const.FILE_PATH_REF_COUNT
+        self._entry_set_path_map = None
+        self._batch_ref_count = None
+        self._entry_set_cache = mm_entry_set.MMEntrySetCache(self._load_entry_set)
+        self._name_index_cache = mm_entry_set.MMEntrySetCache(self._load_name_index)
     
     def create(self) -> None:
         if self.base_dir_path.exists():
@@ -31,6 +61,7 @@ class MMDir:
             self.data_dir_path.mkdir()
             self.info_dir_path.mkdir()
             self._create_info()
+            self.save_data_index(mm_data_index.MMDataIndex())
             logger.info("Directory structure created successfully at %s", self.base_dir_path)
         except Exception as e:
             logger.error("An unexpected error occurred while creating directories: %s", e)
@@ -49,30 +80,266 @@ class MMDir:
     
     def have_info(self) -> bool:
         return self.info_file_path.exists()
+
+    def get_entry_set_format(self) -> str:
+        """Format new entry sets are written in, json unless info.json says otherwise."""
+        if not self.info_file_path.exists():
+            return mm_const.ENTRY_SET_FORMAT_JSON
+        info = json.loads(self.info_file_path.read_text())
+        return info.get(mm_const.INFO_DICT_ENTRY_SET_FORMAT, mm_const.ENTRY_SET_FORMAT_JSON)
+
+    def set_entry_set_format(self, entry_set_format: str) -> None:
+        info = json.loads(self.info_file_path.read_text())
+        info[mm_const.INFO_DICT_ENTRY_SET_FORMAT] = entry_set_format
+        try:
+            with self.info_file_path.open("w") as f:
+                json.dump(info, f)
+        except IOError as e:
+            logger.error("Failed to write info file: %s", e)
+            raise
     
     def get_entry_set_path_list(self) -> list:
-        entry_set_list = []
+        return list(self._scan_entry_set_path_map().values())
+
+    def _scan_entry_set_path_map(self) -> dict:
+        path_list = []
         for file in self.info_dir_path.glob(mm_const.FILE_PATH_GLOB_FORMAT_ENTRY_SET):
-            entry_set_list.append(file)
+            path_list.append(file)
         for file in self.info_dir_path.glob(mm_const.FILE_PATH_GLOB_FORMAT_ENTORY_SET):
-            entry_set_list.append(file)
-        return entry_set_list
+            path_list.append(file)
+        for file in self.info_dir_path.glob(mm_const.FILE_PATH_GLOB_FORMAT_ENTRY_SET_BIN):
+            path_list.append(file)
+        return mm_entry_set.create_entry_set_map(path_list, lambda file: file.name)
+
+    def _get_entry_set_path_map(self) -> dict:
+        if self._entry_set_path_map is None:
+            self._entry_set_path_map = self._scan_entry_set_path_map()
+        return self._entry_set_path_map
+
+    def get_entry_set_num_list(self) -> list:
+        return list(self._get_entry_set_path_map().keys())
+
+    def get_entry_set_count(self) -> int:
+        return len(self._get_entry_set_path_map())
 
     def get_entry_set_list(self):
         entry_set_list = []
         for file in self.get_entry_set_path_list():
-            data = file.read_text()
-            entry_set_list.append(json.loads(data))
+            entry_set_list.append(mm_entry_set.loads_dict(file.read_bytes()))
         return entry_set_list
-    
+
+    def _load_entry_set(self, entry_set_num: int):
+        return mm_entry_set.loads(self._get_entry_set_path_map()[entry_set_num].read_bytes())
+
+    def load_entry_set(self, entry_set_num: int) -> dict:
+        """A fresh, modifiable copy of entry set N, not taken from the cache."""
+        path_map = self._get_entry_set_path_map()
+        if entry_set_num not in path_map:
+            raise Exception("entry not found")
+        return mm_entry_set.loads_dict(path_map[entry_set_num].read_bytes())
+
     def get_entry_set(self, entry_set_num: int) -> dict:
-        entry_set_list = self.get_entry_set_list()
-        if entry_set_num < 0:
+        """Entry set N, parsed on first access and kept in a bounded cache.
+
+        The returned entry set is shared with the cache and must not be
+        modified, a binary entry set comes back as a read-only
+        MMCompactEntrySet. Use load_entry_set() for a modifiable copy.
+        """
+        if entry_set_num not in self._get_entry_set_path_map():
             raise Exception("entry not found")
-        if entry_set_num >= len(entry_set_list):
+        return self._entry_set_cache.get(entry_set_num)
+
+    def _load_name_index(self, entry_set_num: int) -> dict:
+        return mm_entry_set.create_name_index(self.get_entry_set(entry_set_num))
+
+    def get_entry(self, entry_set_num: int, file_name: str) -> dict:
+        """Entry of file_name in entry set N, found through a cached name index."""
+        entry_set = self.get_entry_set(entry_set_num)
+        index = self._name_index_cache.get(entry_set_num).get(file_name)
+        if index is None:
             raise Exception("entry not found")
+        return entry_set[mm_const.ENTRY_SET_ENTRY_LIST][index]
+
+    def get_next_entry_set_num(self) -> int:
+        num_list = list(self._scan_entry_set_path_map().keys())
+        if not num_list:
+            return 0
+        return num_list[-1] + 1
+
+    def save_entry_set(self, entry_set_num: int, entry_set: dict, entry_set_format: str = None, old_entry_set: dict = None) -> None:
+        """Write entry set N, replacing the file it had in any format.
+
+        Without entry_set_format the existing file keeps its format, and a
+        new one uses get_entry_set_format(). old_entry_set is the entry set
+        being replaced, when the caller has it the reference counts are
+        updated without reading it again.
+        """
+        old_path_list = []
+        for file_path_format in (mm_const.FILE_PATH_FORMAT_ENTRY_SET_BIN, mm_const.FILE_PATH_FORMAT_ENTRY_SET, mm_const.FILE_PATH_FORMAT_ENTORY_SET):
+            path = self.base_dir_path / file_path_format.format(entry_set_num)
+            if path.exists():
+                old_path_list.append(path)
+        if entry_set_format is None:
+            if old_path_list:
+                entry_set_format = mm_entry_set.get_entry_set_format(old_path_list[0].name)
+            else:
+                entry_set_format = self.get_entry_set_format()
+        entry_set_file_path = self.base_dir_path / mm_entry_set.get_entry_set_file_path(entry_set_num, entry_set_format)
+        if self._batch_ref_count is not None:
+            ref_count = self._batch_ref_count[0]
+        else:
+            ref_count = self._load_ref_count()
+            if ref_count is not None:
+                # a crash before the counts are saved again leaves them to be rebuilt
+                self.ref_count_file_path.unlink()
+        if ref_count is not None and old_path_list:
+            if old_entry_set is None:
+                old_entry_set = mm_entry_set.loads(old_path_list[0].read_bytes())
+            ref_count.remove_entry_set(entry_set_num, old_entry_set)
+        try:
+            mm_file_util.write_atomic(entry_set_file_path, mm_entry_set.dumps(entry_set, entry_set_format))
+            for path in old_path_list:
+                if path != entry_set_file_path:
+                    path.unlink()
+        except IOError as e:
+            logger.error("Failed to write entry set file: %s", e)
+            self._reset_entry_set_cache()
+            raise
+        self._set_entry_set_path(entry_set_num, entry_set_file_path)
+        if ref_count is not None:
+            ref_count.add_entry_set(entry_set_num, entry_set)
+            if self._batch_ref_count is None:
+                self.save_ref_count(ref_count)
+
+    @contextlib.contextmanager
+    def ref_count_batch(self):
+        """Save many entry sets with the stored reference counts loaded once and written once at the end.
+
+        If the block fails the counts are left to be rebuilt.
+        """
+        if self._batch_ref_count is not None:
+            yield
+            return
+        ref_count = self._load_ref_count()
+        if ref_count is not None:
+            self.ref_count_file_path.unlink()
+        self._batch_ref_count = [ref_count]
+        try:
+            yield
+        finally:
+            self._batch_ref_count = None
+        if ref_count is not None:
+            self.save_ref_count(ref_count)
 
-        return entry_set_list[entry_set_num]
+    def _set_entry_set_path(self, entry_set_num: int, path: pathlib.Path) -> None:
+        """Record the file of a saved entry set without rescanning mm_info/."""
+        self._entry_set_cache.discard(entry_set_num)
+        self._name_index_cache.discard(entry_set_num)
+        path_map = self._entry_set_path_map
+        if path_map is None:
+            return
+        append = not path_map or entry_set_num > next(reversed(path_map))
+        path_map[entry_set_num] = path
+        if not append:
+            self._entry_set_path_map = dict(sorted(path_map.items()))
+
+    def _reset_entry_set_cache(self) -> None:
+        self._entry_set_path_map = None
+        self._entry_set_cache.clear()
+        self._name_index_cache.clear()
+
+    def remove_entry_set(self, entry_set_num: int) -> list:
+        """Remove entry set N and the data files no other entry set refers to.
+
+        Returns the entry names of the removed data files.
+        """
+        logger.info("Removing entry set %d from %s", entry_set_num, self.base_dir_path)
+        ref_count = self.get_ref_count()
+        path_map = self._scan_entry_set_path_map()
+        if entry_set_num not in path_map:
+            raise Exception("entry not found")
+        freed = ref_count.remove_entry_set(entry_set_num, mm_entry_set.loads_dict(path_map[entry_set_num].read_bytes()))
+        self.ref_count_file_path.unlink()
+        try:
+            for file_path_format in (mm_const.FILE_PATH_FORMAT_ENTRY_SET_BIN, mm_const.FILE_PATH_FORMAT_ENTRY_SET, mm_const.FILE_PATH_FORMAT_ENTORY_SET):
+                path = self.base_dir_path / file_path_format.format(entry_set_num)
+                if path.exists():
+                    path.unlink()
+        finally:
+            self._reset_entry_set_cache()
+        self.save_ref_count(ref_count)
+        data_index = self.get_data_index()
+        for entry_name in freed:
+            (self.base_dir_path / entry_name).unlink(missing_ok=True)
+            data_index.remove(entry_name)
+        self.save_data_index(data_index)
+        return freed
+
+    def _load_ref_count(self) -> mm_ref_count.MMRefCount:
+        """Stored reference counts, None when there are none or they do not match the entry sets."""
+        if not self.ref_count_file_path.exists():
+            return None
+        ref_count = mm_ref_count.MMRefCount.loads(self.ref_count_file_path.read_text())
+        if not ref_count.is_for(self.get_entry_set_num_list()):
+            return None
+        return ref_count
+
+    def get_ref_count(self) -> mm_ref_count.MMRefCount:
+        """Reference counts of the data files, counted over all entry sets if not stored yet."""
+        ref_count = self._load_ref_count()
+        if ref_count is None:
+            logger.info("Counting data references of %s", self.base_dir_path)
+            path_map = self._scan_entry_set_path_map()
+            ref_count = mm_ref_count.create_ref_count((entry_set_num, mm_entry_set.loads(path.read_bytes())) for entry_set_num, path in path_map.items())
+            self.save_ref_count(ref_count)
+        return ref_count
+
+    def save_ref_count(self, ref_count: mm_ref_count.MMRefCount) -> None:
+        try:
+            with self.ref_count_file_path.open("w") as f:
+                f.write(ref_count.dumps())
+        except IOError as e:
+            logger.error("Failed to write ref count file: %s", e)
+            raise
+
+    def compact(self) -> None:
+        """Remove unreferenced data files and renumber data files and entry sets densely.
+
+        An interrupted compaction is finished by calling compact() again.
+        """
+        mm_compact.compact_mmdir(self)
+
+    def add_archive(self, file_path: str, dedup: bool = True, chunk: bool = False) -> int:
+        """Add a zip or rar file as a new entry set, writing only data not stored yet.
+
+        With chunk large members are stored as content-defined chunks.
+        Only the data index entries it changed are written, as
+        mm_info/data_indexN.json. Returns the number of the new entry set.
+        """
+        logger.info("Adding %s to %s", file_path, self.base_dir_path)
+        indexed = self.data_index_file_path.exists()
+        if indexed or self._get_data_index_append_path_list():
+            data_index = self.get_data_index()
+        else:
+            data_index = self.update_data_index(save=False)
+        snapshot = data_index.snapshot()
+        data_writer = mm_data_writer.MMDataWriter(self.base_dir_path, data_index, dedup=dedup, next_data_num=data_index.get_max_data_num() + 1, chunk=chunk)
+        entry_set = mm_archive.read_archive(file_path, data_writer)
+        entry_set_num = self.get_next_entry_set_num()
+        # the data added is indexed before the entry set refers to it
+        if indexed:
+            changed = data_index.get_changed_entry_name_list(snapshot)
+            delta_path = self.base_dir_path / mm_const.FILE_PATH_FORMAT_DATA_INDEX_APPEND.format(entry_set_num)
+            try:
+                with delta_path.open("w") as f:
+                    f.write(data_index.dumps(changed))
+            except IOError as e:
+                logger.error("Failed to write data index file: %s", e)
+                raise
+        else:
+            self.save_data_index(data_index)
+        self.save_entry_set(entry_set_num, entry_set)
+        return entry_set_num
 
     def get_data_files(self) -> list:
         data_files = []
@@ -83,36 +350,178 @@ class MMDir:
             })
         return data_files
 
-    def extract(self, entry_set_num: int, extract_to: str) -> None:
+    def get_data_index(self) -> mm_data_index.MMDataIndex:
+        data_index = mm_data_index.MMDataIndex()
+        if self.data_index_file_path.exists():
+            data_index.update(self.data_index_file_path.read_text())
+        # left by MMZip.add_archive when the MMDir came from an appended MMZip
+        for _, file in self._get_data_index_append_path_list():
+            data_index.update(file.read_text())
+        return data_index
+
+    def _get_data_index_append_path_list(self) -> list:
+        path_list = []
+        pt = re.compile(mm_const.FILE_PATH_REGEX_DATA_INDEX_APPEND)
+        for file in self.info_dir_path.iterdir():
+            m = pt.fullmatch(mm_const.DIR_PATH_MM_INFO + file.name)
+            if m:
+                path_list.append((int(m.group(1)), file))
+        path_list.sort(key=lambda num_path: num_path[0])
+        return path_list
+
+    def save_data_index(self, data_index: mm_data_index.MMDataIndex) -> None:
+        try:
+            with self.data_index_file_path.open("w") as f:
+                f.write(data_index.dumps())
+            for _, file in self._get_data_index_append_path_list():
+                file.unlink()
+        except IOError as e:
+            logger.error("Failed to write data index file: %s", e)
+            raise
+
+    def update_data_index(self, save: bool = True) -> mm_data_index.MMDataIndex:
+        """Bring the data index in line with data/ without reading any data file.
+
+        Unknown or resized data files are added without a digest, missing
+        ones are dropped.
+        """
+        data_index = self.get_data_index()
+        data_entry_names = set()
+        for file in self.get_data_files():
+            entry_name = file["entry_name"]
+            data_entry_names.add(entry_name)
+            size = file["path"].stat().st_size
+            data_info = data_index.get(entry_name)
+            if data_info is None or data_info[mm_const.DATA_SIZE] != size:
+                data_index.add(entry_name, size)
+        for entry_name in data_index.get_entry_name_list():
+            if entry_name not in data_entry_names:
+                data_index.remove(entry_name)
+        if save:
+            self.save_data_index(data_index)
+        return data_index
+
+    def open_data(self, entry_name: str):
+        return (self.base_dir_path / entry_name).open("rb")
+
+    def open(self, entry_set_num: int, file_name: str):
+        """Seekable binary stream of file_name in entry set N, read from its data file."""
+        entry = self.get_entry(entry_set_num, file_name)
+        if entry[mm_const.ENTRY_IS_DIR]:
+            raise Exception("entry is a directory")
+        chunk_list = entry.get(mm_const.ENTRY_CHUNK_LIST)
+        if chunk_list is not None:
+            size_list = [(self.base_dir_path / chunk).stat().st_size for chunk in chunk_list]
+            return io.BufferedReader(mm_member_reader.MMChunkReader(self.open_data, chunk_list, size_list))
+        return self.open_data(entry[mm_const.ENTRY_ENTRY_NAME])
+
+    def extract(self, entry_set_num: int, extract_to: str, workers: int = 1, include=None, exclude=None, prefix: str = None, exist_ok: bool = False, skip_up_to_date: bool = False, link_duplicates: bool = False, cancel_event: threading.Event = None) -> None:
+        """Extract entry set N, or the part of it selected by prefix and include/exclude globs.
+
+        With exist_ok the destination may already exist, and with
+        skip_up_to_date files there with the right size and mtime are kept.
+        With link_duplicates each data file is written once and the other
+        entries sharing it become hard links, reflinks or copies of it.
+        Setting cancel_event from another thread stops before the next file.
+        """
         logger.info("Extracting entry set %d to %s", entry_set_num, extract_to)
         entry_set = self.get_entry_set(entry_set_num)
-        extract_path = pathlib.Path(extract_to)
-        if extract_path.exists():
-            raise Exception("Destination directory already exists")
-        extract_path.mkdir()
-        for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
-            output_path: pathlib.Path = extract_path / entry[mm_const.ENTRY_FILE_NAME]
-            date_time = entry[mm_const.ENTRY_DATE_TIME]
-            atime = datetime.datetime(year=date_time[0], month=date_time[1], day=date_time[2], hour=date_time[3], minute=date_time[4], second=date_time[5], microsecond=0, tzinfo=datetime.timezone.utc)
-
-            if entry[mm_const.ENTRY_IS_DIR]:
-                output_path.mkdir(parents=True, exist_ok=True)
-                os.utime(path=str(output_path), times=(atime.timestamp(), atime.timestamp()))
-            else:
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                entry_path: pathlib.Path = self.base_dir_path / entry[mm_const.ENTRY_ENTRY_NAME]
-                logger.debug("Extracting %s to %s", entry_path, output_path)
-                output_path.write_bytes(entry_path.read_bytes())
-                os.utime(path=str(output_path), times=(atime.timestamp(), atime.timestamp()))
+        extract_path = mm_extract.prepare_extract_path(extract_to, exist_ok)
+        entry_list = mm_extract.select_entry_list(entry_set, lambda: self._name_index_cache.get(entry_set_num), include, exclude, prefix)
+        size_func = self._get_entry_size if skip_up_to_date else None
+
+        def _write(entry: dict, output_path: pathlib.Path) -> None:
+            chunk_list = entry.get(mm_const.ENTRY_CHUNK_LIST)
+            if chunk_list is not None:
+                logger.debug("Joining %d chunks to %s", len(chunk_list), output_path)
+                with output_path.open("wb") as f:
+                    for chunk in chunk_list:
+                        with self.open_data(chunk) as chunk_f:
+                            shutil.copyfileobj(chunk_f, f, mm_const.COPY_CHUNK_SIZE)
+                return
+            entry_path: pathlib.Path = self.base_dir_path / entry[mm_const.ENTRY_ENTRY_NAME]
+            logger.debug("Extracting %s to %s", entry_path, output_path)
+            mm_file_util.copy_file(entry_path, output_path)
+
+        mm_extract.extract_entry_list(entry_list, extract_path, _write, workers, size_func, link_duplicates, cancel_event)
         logger.info("Extraction of entry set %d completed successfully to %s", entry_set_num, extract_to)
 
-    def to_mmzip(self, output_path: str) -> None:
-        # Placeholder for conversion logic to MMZip format
+    def verify(self, workers: int = 1) -> dict:
+        """Check every data file and entry against the digests and CRCs recorded at ingest.
+
+        Each data file is read once, by workers threads, and nothing is
+        written. See mm_verify.verify() for the result.
+        """
+        logger.info("Verifying %s", self.base_dir_path)
+        return mm_verify.verify(
+            lambda: ((entry_set_num, self.get_entry_set(entry_set_num)) for entry_set_num in self.get_entry_set_num_list()),
+            [file["entry_name"] for file in self.get_data_files()],
+            self.get_data_index(),
+            lambda: self.open_data,
+            workers
+        )
+
+    def _get_entry_size(self, entry: dict) -> int:
+        return sum((self.base_dir_path / entry_name).stat().st_size for entry_name in mm_entry_set.get_data_entry_name_list(entry))
+
+    def to_mmzip(self, output_path: str, workers: int = 1, compress_type: int = zipfile.ZIP_DEFLATED, compresslevel: int = None, compress_policy=None) -> None:
+        """Write the MMDir as an MMZip, mm_info/ first and then data/ in name order.
+
+        Members are compressed by a pool of workers threads and written in
+        that stable order. compress_policy(file_path) picks the compression
+        of each data member; by default a sample decides between STORED and
+        compress_type. A member index written last lets MMZip open it
+        without reading the central directory.
+        """
         logger.info("Converting to MMZip format at %s", output_path)
         zip_file_path = pathlib.Path(output_path)
-        with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(self.base_dir_path):
-                for file in files:
-                    file_path = pathlib.Path(root) / file
-                    arcname = file_path.relative_to(self.base_dir_path)
-                    zipf.write(file_path, arcname)
+        if compress_policy is None:
+            compress_policy = functools.partial(mm_zip_writer.choose_compress_type, compress_type=compress_type)
+
+        def _compress(file_path: pathlib.Path, arcname: str):
+            if arcname.startswith(mm_const.DIR_PATH_MM_INFO):
+                member_compress_type = compress_type
+            else:
+                member_compress_type = compress_policy(file_path)
+            if member_compress_type == zipfile.ZIP_STORED:
+                return None
+            return mm_zip_writer.compress_file(file_path, arcname, member_compress_type, compresslevel)
+
+        def _write(zipf: zipfile.ZipFile, file_path: pathlib.Path, arcname: str, future: concurrent.futures.Future) -> None:
+            compressed = future.result()
+            if compressed is None:
+                zipf.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                zip_info, spool = compressed
+                with spool:
+                    mm_zip_writer.write_precompressed(zipf, zip_info, spool)
+            mm_observer.file_done(zipf.NameToInfo[arcname].file_size)
+
+        max_pending = max(1, workers) * 2
+        member_list = self._get_mmzip_member_list()
+        with mm_observer.phase("to_mmzip", len(member_list)):
+            with zipfile.ZipFile(zip_file_path, 'w', compress_type) as zipf:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                    pending = collections.deque()
+                    for file_path, arcname in member_list:
+                        pending.append((file_path, arcname, executor.submit(_compress, file_path, arcname)))
+                        if len(pending) > max_pending:
+                            _write(zipf, *pending.popleft())
+                    while pending:
+                        _write(zipf, *pending.popleft())
+                mm_member_index.write_member_index(zipf)
+
+    def _get_mmzip_member_list(self) -> list:
+        member_list = []
+        for root, _, files in os.walk(self.base_dir_path):
+            for file in files:
+                file_path = pathlib.Path(root) / file
+                arcname = file_path.relative_to(self.base_dir_path).as_posix()
+                # reference counts, unfinished compaction and batch state are local bookkeeping,
+                # a member index copied from an MMZip holds the offsets of that zip
+                if arcname in (mm_const.FILE_PATH_REF_COUNT, mm_const.FILE_PATH_MEMBER_INDEX) or arcname.startswith((mm_const.DIR_PATH_COMPACT, mm_const.DIR_PATH_BATCH)):
+                    continue
+                member_list.append((file_path, arcname))
+        # readers find the metadata without seeking through the data
+        member_list.sort(key=lambda member: (not member[1].startswith(mm_const.DIR_PATH_MM_INFO), member[1]))
+        return member_list
@@ -1,72 +1,56 @@
 from mmzip.mmdir import MMDir
-import json
-import shutil
 import mmzip.mm_const as mm_const
-from mmzip.mmdir_remove_same_file import mmdir_remove_same_file
+import mmzip.mm_data_writer as mm_data_writer
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_observer as mm_observer
 
 def mmdir_fusion(mm_dir_path1: str, mm_dir_path2: str, mm_dir_path_dest: str) -> None:
-    mm_dir1 = MMDir(mm_dir_path1)
-    mm_dir2 = MMDir(mm_dir_path2)
+    mmdir_fusion_list([mm_dir_path1, mm_dir_path2], mm_dir_path_dest)
+
+def mmdir_fusion_list(mm_dir_path_list: list, mm_dir_path_dest: str) -> None:
+    mm_dir_list = [MMDir(mm_dir_path) for mm_dir_path in mm_dir_path_list]
     mm_dir_dest = MMDir(mm_dir_path_dest)
 
-    if not mm_dir1.have_info() or not mm_dir2.have_info():
-        raise Exception("One of the directories does not have an info file")
+    for mm_dir in mm_dir_list:
+        if not mm_dir.have_info():
+            raise Exception("One of the directories does not have an info file")
 
     mm_dir_dest.create()
-
-    data_conv_maps = _copy_data_files(mm_dir1, mm_dir2, mm_dir_dest)
-    entry_set_list_1 = _conv_entry_set(mm_dir1, data_conv_maps["dir1_conv_map"])
-    entry_set_list_2 = _conv_entry_set(mm_dir2, data_conv_maps["dir2_conv_map"])
-    entry_set_list_1.extend(entry_set_list_2)
-    _save_entry_set(mm_dir_dest, entry_set_list_1)
-    mmdir_remove_same_file(mm_dir_dest.base_dir_path)
-
-def _copy_data_files(mm_dir1: MMDir, mm_dir2: MMDir, mm_dir_dest: MMDir) -> dict:
-    i = 0
-    dir1_conv_map = []
-    for file in mm_dir1.get_data_files():
-        src_file = file["path"]
-        src_entry_name = file["entry_name"]
-        dest_entry_name = mm_const.FILE_PATH_FORMAT_DATA.format(i)
-        dest_file_path = mm_dir_dest.base_dir_path / dest_entry_name
-        shutil.copy(src=src_file, dst=dest_file_path)
-        dir1_conv_map.append({
-            "src_entry_name": src_entry_name,
-            "dest_entry_name": dest_entry_name
-        })
-        i += 1
-    dir2_conv_map = []
-    for file in mm_dir2.get_data_files():
-        src_file = file["path"]
-        src_entry_name = file["entry_name"]
-        dest_entry_name = mm_const.FILE_PATH_FORMAT_DATA.format(i)
-        dest_file_path = mm_dir_dest.base_dir_path / dest_entry_name
-        shutil.copy(src=src_file, dst=dest_file_path)
-        dir2_conv_map.append({
-            "src_entry_name": src_entry_name,
-            "dest_entry_name": dest_entry_name
-        })
-        i += 1
-    return {
-        "dir1_conv_map": dir1_conv_map,
-        "dir2_conv_map": dir2_conv_map
-    }
-
-
-def _conv_entry_set(mm_dir: MMDir, conv_map: list) -> list:
+    mm_dir_dest.set_entry_set_format(mm_dir_list[0].get_entry_set_format())
+
+    data_writer = mm_data_writer.MMDataWriter(mm_dir_dest.base_dir_path, mm_dir_dest.get_data_index(), next_data_num=0)
+    entry_set_num = 0
+    for mm_dir in mm_dir_list:
+        conv_map = _link_data_files(mm_dir, data_writer)
+        entry_set_list = _conv_entry_set(mm_dir, conv_map)
+        entry_set_num = _save_entry_set(mm_dir_dest, entry_set_list, entry_set_num)
+    mm_dir_dest.save_data_index(data_writer.data_index)
+
+def _link_data_files(mm_dir: MMDir, data_writer: mm_data_writer.MMDataWriter) -> dict:
+    conv_map = {}
+    data_index = mm_dir.update_data_index(save=False)
+    entry_name_list = sorted(data_index.get_entry_name_list())
+    with mm_observer.phase("fusion", len(entry_name_list)):
+        for src_entry_name in entry_name_list:
+            data_info = data_index.get(src_entry_name)
+            conv_map[src_entry_name] = data_writer.add_file(
+                mm_dir.base_dir_path / src_entry_name,
+                data_info[mm_const.DATA_SIZE],
+                data_info[mm_const.DATA_DIGEST]
+            )
+            mm_observer.file_done(data_info[mm_const.DATA_SIZE])
+    return conv_map
+
+def _conv_entry_set(mm_dir: MMDir, conv_map: dict) -> list:
     entry_set_list = mm_dir.get_entry_set_list()
     for entry_set in entry_set_list:
         for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
-            for conv in conv_map:
-                if entry[mm_const.ENTRY_ENTRY_NAME] == conv["src_entry_name"]:
-                    entry[mm_const.ENTRY_ENTRY_NAME] = conv["dest_entry_name"]
-                    break
+            mm_entry_set.conv_entry_data(entry, conv_map)
     return entry_set_list
 
-def _save_entry_set(mm_dir_dest: MMDir, entry_set_list: list) -> None:
-    i = 0
-    for entry_set in entry_set_list:
-        entry_set_file = mm_dir_dest.base_dir_path / mm_const.FILE_PATH_FORMAT_ENTRY_SET.format(i)
-        with open(entry_set_file, "w", encoding="utf-8") as f:
-            json.dump(entry_set, f)
-        i += 1
+def _save_entry_set(mm_dir_dest: MMDir, entry_set_list: list, entry_set_num: int) -> int:
+    with mm_dir_dest.ref_count_batch():
+        for entry_set in entry_set_list:
+            mm_dir_dest.save_entry_set(entry_set_num, entry_set)
+            entry_set_num += 1
+    return entry_set_num
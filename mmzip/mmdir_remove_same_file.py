@@ -1,84 +1,74 @@
-import pathlib
-import json
 import logging
 import mmzip.mm_const as mm_const
-import zlib
 import mmzip.mmdir as mmdir
+import mmzip.mm_digest as mm_digest
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_observer as mm_observer
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(logging.INFO)
 
 def mmdir_remove_same_file(mm_dir_path: str):
     mm_dir = mmdir.MMDir(mm_dir_path)   
-    data_list = _create_data_list(mm_dir.data_dir_path)
-    _search_same_file(data_list)
-    _remove_same_file(data_list)
-    _remove_same_entry_from_entry_set(mm_dir, data_list)
+    data_index = mm_dir.update_data_index()
+    data_list = _create_data_list(mm_dir, data_index)
+    with mm_observer.phase("find_same_file", len(data_list)):
+        _search_same_file(data_list)
+    with mm_observer.phase("remove_same_file"):
+        _remove_same_file(data_list)
+    with mm_observer.phase("remap_entry_set", mm_dir.get_entry_set_count()):
+        _remove_same_entry_from_entry_set(mm_dir, data_list)
+    _update_data_index(mm_dir, data_index, data_list)
 
-def _create_data_list(data_dir: pathlib.Path) -> list:
+def _create_data_list(mm_dir: mmdir.MMDir, data_index: mm_data_index.MMDataIndex) -> list:
     data_list = []
-    for entry in data_dir.iterdir():
+    for entry_name in sorted(data_index.get_entry_name_list()):
+        data_info = data_index.get(entry_name)
         file_data = {
-            "path":entry,
-            "entry_name": mm_const.DIR_PATH_DATA + entry.name,
-            "size": entry.stat().st_size,
+            "path": mm_dir.base_dir_path / entry_name,
+            "entry_name": entry_name,
+            "size": data_info[mm_const.DATA_SIZE],
             "same_entry_name" : None,
-            "crc":None
+            "digest": data_info[mm_const.DATA_DIGEST]
         }
         logger.debug("file_data: %s", file_data)
         data_list.append(file_data)
     return data_list
 
 def _search_same_file(data_list: list):
-    for i in range(len(data_list)):
-        now_data = data_list[i]
-        now_data_bytes = now_data["path"].read_bytes()
-
-        if now_data["crc"] is None:
-            now_data["crc"] = zlib.crc32(now_data_bytes)
-        
-        # already found same file
-        if now_data["same_entry_name"] is not None:
-            continue
-
-        for j in range(i+1, len(data_list)):
-            next_data = data_list[j]
-
-            if now_data["size"] != next_data["size"]:
-                continue
-
-            next_data_bytes = None
-            if next_data["crc"] is None:
-                next_data_bytes = next_data["path"].read_bytes()
-                next_data["crc"] = zlib.crc32(next_data_bytes)
-            
-            if now_data["crc"] != next_data["crc"]:
-                continue
-            
-            if next_data_bytes is None:
-                next_data_bytes = next_data["path"].read_bytes()
-            
-            if now_data_bytes == next_data_bytes:
-                logger.info("Found same file: %s, %s", now_data["entry_name"], next_data["entry_name"])
-                next_data["same_entry_name"] = now_data["entry_name"]
+    mm_digest.find_same_files(data_list)
 
 def _remove_same_file(data_list: list):
     for data in data_list:
         if data["same_entry_name"] is not None:
             data["path"].unlink()
+            mm_observer.dedup_hit(data["size"])
 
 def _remove_same_entry_from_entry_set(mm_dir: mmdir.MMDir ,data_list: list):
-    for entry_set_path in mm_dir.get_entry_set_path_list():
-        with entry_set_path.open("r") as f:
-            entry_set = json.load(f)
-        
-        entry_list = entry_set[mm_const.ENTRY_SET_ENTRY_LIST]
-        for entry in entry_list:
-            for data in data_list:
-                if entry[mm_const.ENTRY_ENTRY_NAME] == data["entry_name"]:
-                    if data["same_entry_name"] is not None:
-                        entry[mm_const.ENTRY_ENTRY_NAME] = data["same_entry_name"]
-                    break
-        
-        with entry_set_path.open("w") as f:
-            json.dump(entry_set, f)
\ No newline at end of file
+    same_entry_map = {}
+    for data in data_list:
+        if data["same_entry_name"] is not None:
+            same_entry_map[data["entry_name"]] = data["same_entry_name"]
+
+    with mm_dir.ref_count_batch():
+        for entry_set_num in mm_dir.get_entry_set_num_list():
+            old_entry_set = mm_dir.load_entry_set(entry_set_num)
+            # entries are copied, the old ones update the reference counts
+            entry_list = [dict(entry) for entry in old_entry_set[mm_const.ENTRY_SET_ENTRY_LIST]]
+            for entry in entry_list:
+                mm_entry_set.conv_entry_data(entry, same_entry_map)
+            entry_set = dict(old_entry_set)
+            entry_set[mm_const.ENTRY_SET_ENTRY_LIST] = entry_list
+            
+            mm_dir.save_entry_set(entry_set_num, entry_set, old_entry_set=old_entry_set)
+            mm_observer.file_done(0)
+
+def _update_data_index(mm_dir: mmdir.MMDir, data_index: mm_data_index.MMDataIndex, data_list: list):
+    for data in data_list:
+        if data["same_entry_name"] is None and data["digest"] is not None:
+            data_index.set_digest(data["entry_name"], data["digest"])
+    for data in data_list:
+        if data["same_entry_name"] is not None:
+            data_index.remove(data["entry_name"])
+    mm_dir.save_data_index(data_index)
\ No newline at end of file
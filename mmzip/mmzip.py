@@ -1,93 +1,396 @@
-import datetime
 import os
+import io
+import mmap
 import pathlib
 import json
 import re
+import shutil
+import threading
 import logging
 import zipfile
 import mmzip.mm_const as mm_const
+import mmzip.mm_data_index as mm_data_index
+import mmzip.mm_data_writer as mm_data_writer
+import mmzip.mm_extract as mm_extract
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_member_reader as mm_member_reader
+import mmzip.mm_ref_count as mm_ref_count
+import mmzip.mm_compact as mm_compact
+import mmzip.mm_verify as mm_verify
+import mmzip.mm_member_index as mm_member_index
+import mmzip.mm_archive as mm_archive
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 class MMZip:
+    """Read access to an MMZip.
+
+    A zip written with a member index is opened from it alone: members are
+    located through the index and zip_obj, the ZipFile parsing the whole
+    central directory, is only built once something asks for it.
+    """
     path: set
-    zip_obj: zipfile.ZipFile
+    _zip_obj: zipfile.ZipFile
+    _member_index: mm_member_index.MMMemberIndex
+    _entry_set_zipinfo_map: dict
+    _entry_set_cache: mm_entry_set.MMEntrySetCache
+    _name_index_cache: mm_entry_set.MMEntrySetCache
+    _mmap: mmap.mmap
 
     def __init__(self, path: str):
         self.path = path
-        self.zip_obj = zipfile.ZipFile(self.path,"r")    
+        self._mmap = None
+        self._mmap_lock = threading.Lock()
+        self._entry_set_cache = mm_entry_set.MMEntrySetCache(self._load_entry_set)
+        self._name_index_cache = mm_entry_set.MMEntrySetCache(self._load_name_index)
+        self._open()
+
+    def _open(self) -> None:
+        self._close_mmap()
+        self._zip_obj = None
+        self._zip_obj_lock = threading.Lock()
+        self._member_index = None
+        # an empty file can not be mapped, zipfile reports it as not a zip
+        if os.path.getsize(self.path) > 0:
+            self._member_index = mm_member_index.read_member_index(self._get_mmap())
+        if self._member_index is None:
+            self._zip_obj = zipfile.ZipFile(self.path, "r")
+        self._entry_set_zipinfo_map = mm_entry_set.create_entry_set_map(self._get_entry_set_zipinfo_list(), lambda file: file.filename)
+        self._entry_set_cache.clear()
+        self._name_index_cache.clear()
     
+    @property
+    def zip_obj(self) -> zipfile.ZipFile:
+        with self._zip_obj_lock:
+            if self._zip_obj is None:
+                self._zip_obj = zipfile.ZipFile(self.path, "r")
+            return self._zip_obj
+
+    def _has_member(self, entry_name: str) -> bool:
+        if self._member_index is not None:
+            return entry_name in self._member_index
+        return entry_name in self._zip_obj.NameToInfo
+
+    def _get_zipinfo(self, entry_name: str) -> zipfile.ZipInfo:
+        if self._member_index is not None:
+            return self._member_index.get_info(entry_name)
+        return self._zip_obj.getinfo(entry_name)
+
+    def _get_info_zipinfo_list(self) -> list:
+        """ZipInfo of the mm_info/ members."""
+        if self._member_index is not None:
+            return self._member_index.get_info_list(mm_const.DIR_PATH_MM_INFO)
+        return [file for file in self._zip_obj.filelist if file.filename.startswith(mm_const.DIR_PATH_MM_INFO)]
+
+    def _read_member(self, zip_info: zipfile.ZipInfo) -> bytes:
+        with self._open_zipinfo(zip_info) as f:
+            return f.read()
+
     def have_info(self) -> bool:
-        return mm_const.FILE_PATH_INFO_JSON in self.zip_obj.NameToInfo.keys()
+        return self._has_member(mm_const.FILE_PATH_INFO_JSON)
+
+    def get_entry_set_format(self) -> str:
+        if not self.have_info():
+            return mm_const.ENTRY_SET_FORMAT_JSON
+        info = json.loads(self._read_member(self._get_zipinfo(mm_const.FILE_PATH_INFO_JSON)))
+        return info.get(mm_const.INFO_DICT_ENTRY_SET_FORMAT, mm_const.ENTRY_SET_FORMAT_JSON)
     
     def _get_entry_set_zipinfo_list(self) -> list:
         entry_set_list = []
+        info_list = self._get_info_zipinfo_list()
         pt = re.compile(mm_const.FILE_PATH_REGEX_ENTRY_SET)
-        for file in self.zip_obj.filelist:
+        for file in info_list:
             if pt.match(file.filename):
                 entry_set_list.append(file)
         pt = re.compile(mm_const.FILE_PATH_REGEX_ENTORY_SET)
-        for file in self.zip_obj.filelist:
+        for file in info_list:
+            if pt.match(file.filename):
+                entry_set_list.append(file)
+        pt = re.compile(mm_const.FILE_PATH_REGEX_ENTRY_SET_BIN)
+        for file in info_list:
             if pt.match(file.filename):
                 entry_set_list.append(file)
         return entry_set_list
 
+    def get_entry_set_num_list(self) -> list:
+        return list(self._entry_set_zipinfo_map.keys())
+
+    def get_entry_set_count(self) -> int:
+        return len(self._entry_set_zipinfo_map)
+
     def get_entry_set_list(self):
         entry_set_list = []
-        for file in self._get_entry_set_zipinfo_list():
-            data = self.zip_obj.open(file,"r").read()
-            entry_set_list.append(json.loads(data))
+        for file in self._entry_set_zipinfo_map.values():
+            data = self._read_member(file)
+            entry_set_list.append(mm_entry_set.loads_dict(data))
         return entry_set_list
+
+    def _load_entry_set(self, entry_set_num: int):
+        return mm_entry_set.loads(self._read_member(self._entry_set_zipinfo_map[entry_set_num]))
+
+    def load_entry_set(self, entry_set_num: int) -> dict:
+        """A fresh, modifiable copy of entry set N, not taken from the cache."""
+        if entry_set_num not in self._entry_set_zipinfo_map:
+            raise Exception("entry not found")
+        return mm_entry_set.loads_dict(self._read_member(self._entry_set_zipinfo_map[entry_set_num]))
     
     def get_entry_set(self, entry_set_num: int) -> dict:
-        entry_set_list = self.get_entry_set_list()
-        if entry_set_num < 0:
-            raise Exception("entry not found")
-        if entry_set_num >= len(entry_set_list):
+        """Entry set N, parsed on first access and kept in a bounded cache.
+
+        The returned entry set is shared with the cache and must not be
+        modified, a binary entry set comes back as a read-only
+        MMCompactEntrySet. Use load_entry_set() for a modifiable copy.
+        """
+        if entry_set_num not in self._entry_set_zipinfo_map:
             raise Exception("entry not found")
+        return self._entry_set_cache.get(entry_set_num)
 
-        return entry_set_list[entry_set_num]
+    def get_data_entry_name_list(self) -> list:
+        if self._member_index is not None:
+            return self._member_index.get_data_entry_name_list()
+        return [file.filename for file in self.get_data_files()]
 
     def get_data_files(self) -> list:
+        if self._member_index is not None:
+            return [self._member_index.get_info(entry_name) for entry_name in self._member_index.get_data_entry_name_list()]
         data_files = []
         for file in self.zip_obj.filelist:
             if file.filename.startswith(mm_const.DIR_PATH_DATA):
                 data_files.append(file)
         return data_files
 
-    def extract(self, entry_set_num: int, extract_to: str) -> None:
+    def get_data_index(self) -> mm_data_index.MMDataIndex:
+        if self._has_member(mm_const.FILE_PATH_DATA_INDEX):
+            data_index = mm_data_index.MMDataIndex.loads(self._read_member(self._get_zipinfo(mm_const.FILE_PATH_DATA_INDEX)))
+        else:
+            data_index = mm_data_index.MMDataIndex()
+            for file in self.get_data_files():
+                data_index.add(file.filename, file.file_size)
+        # indexes written by add_archive hold only what each append changed
+        for _, zip_info in self._get_data_index_append_zipinfo_list():
+            data_index.update(self._read_member(zip_info))
+        return data_index
+
+    def _get_data_index_append_zipinfo_list(self) -> list:
+        zipinfo_list = []
+        pt = re.compile(mm_const.FILE_PATH_REGEX_DATA_INDEX_APPEND)
+        for file in self._get_info_zipinfo_list():
+            m = pt.fullmatch(file.filename)
+            if m:
+                zipinfo_list.append((int(m.group(1)), file))
+        zipinfo_list.sort(key=lambda num_info: num_info[0])
+        return zipinfo_list
+
+    def _load_name_index(self, entry_set_num: int) -> dict:
+        return mm_entry_set.create_name_index(self.get_entry_set(entry_set_num))
+
+    def get_entry(self, entry_set_num: int, file_name: str) -> dict:
+        """Entry of file_name in entry set N, found through a cached name index."""
+        entry_set = self.get_entry_set(entry_set_num)
+        index = self._name_index_cache.get(entry_set_num).get(file_name)
+        if index is None:
+            raise Exception("entry not found")
+        return entry_set[mm_const.ENTRY_SET_ENTRY_LIST][index]
+
+    def get_next_entry_set_num(self) -> int:
+        num_list = self.get_entry_set_num_list()
+        if not num_list:
+            return 0
+        return num_list[-1] + 1
+
+    def add_archive(self, file_path: str, dedup: bool = True, chunk: bool = False) -> int:
+        """Append a zip or rar file as a new entry set, writing only data not stored yet.
+
+        The new data members, the entry set and an index of the changed data
+        are appended to the zip in place, which leaves any member index
+        stale until compact() writes a new one. With chunk large members are stored
+        as content-defined chunks. Returns the number of the new entry set.
+        """
+        logger.info("Adding %s to %s", file_path, self.path)
+        data_index = self.get_data_index()
+        snapshot = data_index.snapshot()
+        entry_set_num = self.get_next_entry_set_num()
+        entry_set_format = self.get_entry_set_format()
+        # an append that failed leaves data members in the zip that no data index lists
+        next_data_num = max([data_index.get_max_data_num()] + [int(name[len(mm_const.DIR_PATH_DATA):]) for name in self.get_data_entry_name_list() if name[len(mm_const.DIR_PATH_DATA):].isdigit()]) + 1
+        self.close()
+        try:
+            with zipfile.ZipFile(self.path, "a", zipfile.ZIP_DEFLATED) as zf:
+                data_writer = mm_data_writer.MMZipDataWriter(zf, data_index, dedup=dedup, next_data_num=next_data_num, chunk=chunk)
+                entry_set = mm_archive.read_archive(file_path, data_writer)
+                zf.writestr(mm_entry_set.get_entry_set_file_path(entry_set_num, entry_set_format), mm_entry_set.dumps(entry_set, entry_set_format))
+                changed = data_index.get_changed_entry_name_list(snapshot)
+                zf.writestr(mm_const.FILE_PATH_FORMAT_DATA_INDEX_APPEND.format(entry_set_num), data_index.dumps(changed))
+        finally:
+            self._open()
+        return entry_set_num
+
+    def get_ref_count(self) -> mm_ref_count.MMRefCount:
+        """Reference counts of the data files, counted over all entry sets."""
+        return mm_ref_count.create_ref_count((entry_set_num, self.get_entry_set(entry_set_num)) for entry_set_num in self.get_entry_set_num_list())
+
+    def remove_entry_set(self, entry_set_num: int) -> None:
+        """Remove entry set N and the data members no other entry set refers to.
+
+        The zip is rewritten without them, copying the other members as they are.
+        """
+        if entry_set_num not in self._entry_set_zipinfo_map:
+            raise Exception("entry not found")
+        mm_compact.rewrite_mmzip(self, [entry_set_num], renumber=False)
+
+    def compact(self) -> None:
+        """Rewrite the zip without unreferenced data, renumbering data members and entry sets densely."""
+        mm_compact.rewrite_mmzip(self)
+
+    def open_data(self, entry_name: str):
+        return self._open_member(entry_name)
+
+    def open(self, entry_set_num: int, file_name: str):
+        """Seekable binary stream of file_name in entry set N, read from its zip member.
+
+        A STORED member is read through a memory mapping of the zip without
+        copying, see MMMapMemberReader.getbuffer().
+        """
+        entry = self.get_entry(entry_set_num, file_name)
+        if entry[mm_const.ENTRY_IS_DIR]:
+            raise Exception("entry is a directory")
+        chunk_list = entry.get(mm_const.ENTRY_CHUNK_LIST)
+        if chunk_list is not None:
+            size_list = [self._get_zipinfo(chunk).file_size for chunk in chunk_list]
+            return io.BufferedReader(mm_member_reader.MMChunkReader(self._open_member, chunk_list, size_list))
+        return self._open_member(entry[mm_const.ENTRY_ENTRY_NAME])
+
+    def _open_member(self, entry_name: str):
+        return self._open_zipinfo(self._get_zipinfo(entry_name))
+
+    def _open_zipinfo(self, zip_info: zipfile.ZipInfo):
+        if zip_info.compress_type == zipfile.ZIP_STORED and not zip_info.flag_bits & 0x1 and zip_info.file_size > 0:
+            mapping = self._get_mmap()
+            offset = mm_member_reader.get_member_data_offset(mapping, zip_info)
+            return mm_member_reader.MMMapMemberReader(mapping, offset, zip_info.file_size)
+        if self._member_index is not None and not zip_info.flag_bits & 0x1:
+            # decompressed straight from the mapping, so readers share no file position
+            mapping = self._get_mmap()
+            offset = mm_member_reader.get_member_data_offset(mapping, zip_info)
+            return zipfile.ZipExtFile(mm_member_reader.MMMapMemberReader(mapping, offset, zip_info.compress_size), "r", zip_info, close_fileobj=True)
+        return self.zip_obj.open(zip_info, "r")
+
+    def _get_mmap(self) -> mmap.mmap:
+        with self._mmap_lock:
+            if self._mmap is None:
+                with open(self.path, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+    def close(self) -> None:
+        if self._zip_obj is not None:
+            self._zip_obj.close()
+        self._close_mmap()
+
+    def _close_mmap(self) -> None:
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # still exported to open readers, released with them
+                pass
+            self._mmap = None
+
+    def extract(self, entry_set_num: int, extract_to: str, workers: int = 1, include=None, exclude=None, prefix: str = None, exist_ok: bool = False, skip_up_to_date: bool = False, link_duplicates: bool = False, cancel_event: threading.Event = None) -> None:
+        """Extract entry set N, or the part of it selected by prefix and include/exclude globs.
+
+        With exist_ok the destination may already exist, and with
+        skip_up_to_date files there with the right size and mtime are kept.
+        With link_duplicates each data file is written once and the other
+        entries sharing it become hard links, reflinks or copies of it.
+        Setting cancel_event from another thread stops before the next file.
+        """
         logger.info("Extracting entry set %d to %s", entry_set_num, extract_to)
         entry_set = self.get_entry_set(entry_set_num)
-        extract_path = pathlib.Path(extract_to)
-        if extract_path.exists():
-            raise Exception("Destination directory already exists")
-        extract_path.mkdir()
-        for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]:
-            output_path: pathlib.Path = extract_path / entry[mm_const.ENTRY_FILE_NAME]
-            date_time = entry[mm_const.ENTRY_DATE_TIME]
-            atime = datetime.datetime(year=date_time[0], month=date_time[1], day=date_time[2], hour=date_time[3], minute=date_time[4], second=date_time[5], microsecond=0, tzinfo=datetime.timezone.utc)
-
-            if entry[mm_const.ENTRY_IS_DIR]:
-                output_path.mkdir(parents=True, exist_ok=True)
-                os.utime(path=str(output_path), times=(atime.timestamp(), atime.timestamp()))
-            else:
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                zip_info = self.zip_obj.NameToInfo[entry[mm_const.ENTRY_ENTRY_NAME]]
-                with self.zip_obj.open(zip_info,"r") as zf:
-                    with output_path.open("wb") as of:
-                        of.write(zf.read())
-                os.utime(path=str(output_path), times=(atime.timestamp(), atime.timestamp()))
+        extract_path = mm_extract.prepare_extract_path(extract_to, exist_ok)
+        entry_list = mm_extract.select_entry_list(entry_set, lambda: self._name_index_cache.get(entry_set_num), include, exclude, prefix)
+        size_func = self._get_entry_size if skip_up_to_date else None
+
+        # ZipFile handles share one file position, give every worker its own
+        local = threading.local()
+        zip_obj_list = []
+        zip_obj_list_lock = threading.Lock()
+
+        def _get_zip_obj() -> zipfile.ZipFile:
+            if workers <= 1:
+                return self.zip_obj
+            zip_obj = getattr(local, "zip_obj", None)
+            if zip_obj is None:
+                zip_obj = zipfile.ZipFile(self.path, "r")
+                local.zip_obj = zip_obj
+                with zip_obj_list_lock:
+                    zip_obj_list.append(zip_obj)
+            return zip_obj
+
+        def _open_data(entry_name: str):
+            if self._member_index is not None:
+                return self._open_member(entry_name)
+            zip_obj = _get_zip_obj()
+            return zip_obj.open(zip_obj.NameToInfo[entry_name], "r")
+
+        def _write(entry: dict, output_path: pathlib.Path) -> None:
+            with output_path.open("wb") as of:
+                for entry_name in mm_entry_set.get_data_entry_name_list(entry):
+                    with _open_data(entry_name) as zf:
+                        shutil.copyfileobj(zf, of, mm_const.COPY_CHUNK_SIZE)
+
+        try:
+            mm_extract.extract_entry_list(entry_list, extract_path, _write, workers, size_func, link_duplicates, cancel_event)
+        finally:
+            for zip_obj in zip_obj_list:
+                zip_obj.close()
         logger.info("Extraction of entry set %d completed successfully to %s", entry_set_num, extract_to)
 
+    def verify(self, workers: int = 1) -> dict:
+        """Check every data member and entry against the digests and CRCs recorded at ingest.
+
+        Each data member is read once, by workers threads with a ZipFile
+        each, and nothing is written. See mm_verify.verify() for the result.
+        """
+        logger.info("Verifying %s", self.path)
+        zip_obj_list = []
+        lock = threading.Lock()
+
+        def _open_func_factory():
+            if self._member_index is not None:
+                return self._open_member
+            zip_obj = zipfile.ZipFile(self.path, "r")
+            with lock:
+                zip_obj_list.append(zip_obj)
+            return zip_obj.open
+
+        try:
+            return mm_verify.verify(
+                lambda: ((entry_set_num, self.get_entry_set(entry_set_num)) for entry_set_num in self.get_entry_set_num_list()),
+                self.get_data_entry_name_list(),
+                self.get_data_index(),
+                _open_func_factory,
+                workers
+            )
+        finally:
+            for zip_obj in zip_obj_list:
+                zip_obj.close()
+
+    def _get_entry_size(self, entry: dict) -> int:
+        return sum(self._get_zipinfo(entry_name).file_size for entry_name in mm_entry_set.get_data_entry_name_list(entry))
+
     def to_mmdir(self, output_path: str) -> None:
         # Placeholder for conversion logic to MMDir format
         logger.info("Converting to MMDir format at %s", output_path)
         out_dir_path = pathlib.Path(output_path)
         out_dir_path.mkdir(parents=True, exist_ok=True)
         for entry in self.zip_obj.filelist:
+            # its offsets are those of this zip
+            if entry.filename == mm_const.FILE_PATH_MEMBER_INDEX:
+                continue
             data_path = out_dir_path / entry.filename
             data_path.parent.mkdir(parents=True, exist_ok=True)
             with self.zip_obj.open(entry,"r") as zf:
                with data_path.open("wb") as of:
-                    of.write(zf.read())
+                    shutil.copyfileobj(zf, of, mm_const.COPY_CHUNK_SIZE)
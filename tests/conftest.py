@@ -0,0 +1,38 @@
+import zipfile
+import pytest
+import mmzip
+
+def _member_map(seed: int) -> dict:
+    # random, repeated and compressible members, so some data is shared
+    random_data = bytes((seed * 7919 + i * 104729) % 251 for i in range(5000))
+    return {
+        "a/random.bin": random_data,
+        "a/same.bin": random_data,
+        "b/text.txt": b"line %d\n" % seed * 500,
+        "b/empty.txt": b"",
+        "c/large.bin": bytes(range(256)) * 400 + bytes([seed % 256]),
+    }
+
+def write_zip(path, member_map: dict) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in member_map.items():
+            zf.writestr(name, data)
+
+@pytest.fixture
+def member_map_list() -> list:
+    return [_member_map(1), _member_map(2)]
+
+@pytest.fixture
+def mm_zip_path(tmp_path, member_map_list) -> str:
+    """An MMZip written by MMDir.to_mmzip, with an entry set per member map."""
+    mm_dir_path = tmp_path / "mmdir"
+    for i, member_map in enumerate(member_map_list):
+        zip_path = tmp_path / "src{}.zip".format(i)
+        write_zip(zip_path, member_map)
+        if i == 0:
+            mmzip.zip_to_mmdir(str(zip_path), str(mm_dir_path), dedup=True)
+        else:
+            mmzip.MMDir(str(mm_dir_path)).add_archive(str(zip_path))
+    path = tmp_path / "out.mmzip"
+    mmzip.MMDir(str(mm_dir_path)).to_mmzip(str(path))
+    return str(path)
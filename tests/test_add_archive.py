@@ -0,0 +1,58 @@
+import warnings
+import zipfile
+import pytest
+import mmzip
+import mmzip.mm_const as mm_const
+import mmzip.mm_archive as mm_archive
+from conftest import write_zip
+
+def test_mmdir_add_archive_writes_data_index_delta(tmp_path, member_map_list):
+    mm_dir_path = str(tmp_path / "mmdir")
+    write_zip(tmp_path / "src0.zip", member_map_list[0])
+    write_zip(tmp_path / "src1.zip", member_map_list[1])
+    mmzip.zip_to_mmdir(str(tmp_path / "src0.zip"), mm_dir_path, dedup=True)
+    mm_dir = mmzip.MMDir(mm_dir_path)
+    base_data = mm_dir.data_index_file_path.read_bytes()
+
+    entry_set_num = mm_dir.add_archive(str(tmp_path / "src1.zip"))
+
+    assert mm_dir.data_index_file_path.read_bytes() == base_data
+    assert (mm_dir.base_dir_path / mm_const.FILE_PATH_FORMAT_DATA_INDEX_APPEND.format(entry_set_num)).exists()
+    data_index = mm_dir.get_data_index()
+    for file in mm_dir.get_data_files():
+        assert data_index.get(file["entry_name"])[mm_const.DATA_SIZE] == file["path"].stat().st_size
+    for name, data in member_map_list[1].items():
+        with mm_dir.open(entry_set_num, name) as f:
+            assert f.read() == data
+    assert mm_dir.verify()["ok"]
+
+def test_mmzip_add_archive_after_failed_append(tmp_path, mm_zip_path, member_map_list, monkeypatch):
+    read_archive = mm_archive.read_archive
+    new_member_map = {"new/x.bin": b"x" * 3000, "new/y.txt": b"new data y"}
+    write_zip(tmp_path / "new.zip", new_member_map)
+
+    def _read_archive_and_fail(file_path, data_writer):
+        read_archive(file_path, data_writer)
+        raise RuntimeError("interrupted")
+    monkeypatch.setattr(mm_archive, "read_archive", _read_archive_and_fail)
+    mm_zip = mmzip.MMZip(mm_zip_path)
+    try:
+        with pytest.raises(RuntimeError):
+            mm_zip.add_archive(str(tmp_path / "new.zip"))
+        monkeypatch.setattr(mm_archive, "read_archive", read_archive)
+        with warnings.catch_warnings():
+            # zipfile warns about a duplicate member name
+            warnings.simplefilter("error")
+            entry_set_num = mm_zip.add_archive(str(tmp_path / "new.zip"))
+        for name, data in new_member_map.items():
+            with mm_zip.open(entry_set_num, name) as f:
+                assert f.read() == data
+        for name, data in member_map_list[0].items():
+            with mm_zip.open(0, name) as f:
+                assert f.read() == data
+        assert mm_zip.verify()["ok"]
+    finally:
+        mm_zip.close()
+    with zipfile.ZipFile(mm_zip_path) as zf:
+        name_list = zf.namelist()
+    assert len(name_list) == len(set(name_list))
@@ -0,0 +1,41 @@
+import os
+import zipfile
+import mmzip
+import mmzip.mm_const as mm_const
+import mmzip.mm_entry_set as mm_entry_set
+
+def _data_compress_type_map(mm_zip_path: str) -> dict:
+    """file name -> compress type of its data member."""
+    with zipfile.ZipFile(mm_zip_path) as zf:
+        entry_set = mm_entry_set.loads(zf.read(mm_entry_set.get_entry_set_file_path(0, mm_const.ENTRY_SET_FORMAT_JSON)))
+        return {entry[mm_const.ENTRY_FILE_NAME]: zf.getinfo(entry[mm_const.ENTRY_ENTRY_NAME]).compress_type for entry in entry_set[mm_const.ENTRY_SET_ENTRY_LIST]}
+
+def test_zip_to_mmzip_chooses_compress_type(tmp_path):
+    member_map = {
+        "stored_text.txt": (b"compressible line\n" * 2000, zipfile.ZIP_STORED),
+        "stored_random.bin": (os.urandom(50000), zipfile.ZIP_STORED),
+        "deflated_text.txt": (b"another line\n" * 2000, zipfile.ZIP_DEFLATED),
+        "deflated_random.bin": (os.urandom(50000), zipfile.ZIP_DEFLATED),
+    }
+    zip_path = tmp_path / "src.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        for name, (data, compress_type) in member_map.items():
+            zf.writestr(name, data, compress_type=compress_type)
+
+    for compress_type in (zipfile.ZIP_DEFLATED, zipfile.ZIP_LZMA):
+        output_path = str(tmp_path / "out{}.mmzip".format(compress_type))
+        mmzip.zip_to_mmzip(str(zip_path), output_path, compress_type=compress_type)
+        assert _data_compress_type_map(output_path) == {
+            "stored_text.txt": compress_type,
+            "stored_random.bin": zipfile.ZIP_STORED,
+            "deflated_text.txt": compress_type,
+            "deflated_random.bin": zipfile.ZIP_DEFLATED if compress_type == zipfile.ZIP_DEFLATED else zipfile.ZIP_STORED,
+        }
+        mm_zip = mmzip.MMZip(output_path)
+        try:
+            for name, (data, _) in member_map.items():
+                with mm_zip.open(0, name) as f:
+                    assert f.read() == data
+            assert mm_zip.verify()["ok"]
+        finally:
+            mm_zip.close()
@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import threading
+import pytest
+import mmzip
+import mmzip.mm_async as mm_async
+
+_TIMEOUT = 5
+
+async def _assert_slots_free(pool: mm_async.MMAsyncPool) -> None:
+    """Every slot and every long job slot can be taken at once."""
+    for long, count in ((False, pool.max_workers), (True, pool.max_long_jobs)):
+        barrier = threading.Barrier(count, timeout=_TIMEOUT)
+        await asyncio.wait_for(asyncio.gather(*[pool.run(barrier.wait, long=long) for _ in range(count)]), _TIMEOUT)
+
+def test_pool_caps_long_jobs():
+    async def _main():
+        pool = mm_async.MMAsyncPool(max_workers=4)
+        assert pool.max_long_jobs == 2
+        release = threading.Event()
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def _long_job():
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            release.wait(_TIMEOUT)
+            with lock:
+                active[0] -= 1
+        try:
+            task_list = [asyncio.ensure_future(pool.run(_long_job, long=True)) for _ in range(5)]
+            await asyncio.sleep(0.1)
+            # short jobs still get a thread while the long ones wait
+            assert await asyncio.wait_for(pool.run(lambda: "short"), _TIMEOUT) == "short"
+            assert active == [2, 2]
+            release.set()
+            await asyncio.wait_for(asyncio.gather(*task_list), _TIMEOUT)
+            assert active == [0, 2]
+            await _assert_slots_free(pool)
+        finally:
+            release.set()
+            pool.shutdown()
+    asyncio.run(_main())
+
+def test_pool_cancel_before_submit():
+    async def _main():
+        pool = mm_async.MMAsyncPool(max_workers=1)
+        release = threading.Event()
+        ran = []
+        try:
+            running = asyncio.ensure_future(pool.run(release.wait, _TIMEOUT, long=True))
+            await asyncio.sleep(0.1)
+            waiting = asyncio.ensure_future(pool.run(ran.append, 1, long=True))
+            await asyncio.sleep(0.1)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            release.set()
+            assert await asyncio.wait_for(running, _TIMEOUT)
+            await _assert_slots_free(pool)
+            assert ran == []
+        finally:
+            release.set()
+            pool.shutdown()
+    asyncio.run(_main())
+
+def test_pool_cancel_after_submit():
+    async def _main():
+        pool = mm_async.MMAsyncPool(max_workers=2)
+        started = threading.Event()
+        release = threading.Event()
+        cancel_event = threading.Event()
+        finished = []
+
+        def _job():
+            started.set()
+            release.wait(_TIMEOUT)
+            finished.append(True)
+        try:
+            task = asyncio.ensure_future(pool.run(_job, long=True, cancel_event=cancel_event))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, _TIMEOUT)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert cancel_event.is_set()
+            # the slot is held until the thread is done, the only long slot too
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.run(lambda: None, long=True), 0.2)
+            release.set()
+            await _assert_slots_free(pool)
+            assert finished == [True]
+        finally:
+            release.set()
+            pool.shutdown()
+    asyncio.run(_main())
+
+def test_async_iter_chunks_and_read(tmp_path, mm_zip_path, member_map_list):
+    async def _main():
+        pool = mm_async.MMAsyncPool(max_workers=2)
+        try:
+            for mm in (await mm_async.AsyncMMDir.open(str(tmp_path / "mmdir"), pool), await mm_async.AsyncMMZip.open(mm_zip_path, pool)):
+                assert await mm.get_entry_set_num_list() == [0, 1]
+                for entry_set_num, member_map in enumerate(member_map_list):
+                    for name in member_map:
+                        with mm.sync.open(entry_set_num, name) as f:
+                            data = f.read()
+                        chunk_list = [chunk async for chunk in mm.iter_chunks(entry_set_num, name, chunk_size=1000)]
+                        assert b"".join(chunk_list) == data
+                        assert all(len(chunk) == 1000 for chunk in chunk_list[:-1])
+                        assert await mm.read(entry_set_num, name) == data
+                if isinstance(mm, mm_async.AsyncMMZip):
+                    await mm.close()
+            await _assert_slots_free(pool)
+        finally:
+            pool.shutdown()
+    asyncio.run(_main())
+
+def test_async_iter_chunks_closes_file_when_stopped(tmp_path, mm_zip_path):
+    async def _main():
+        pool = mm_async.MMAsyncPool(max_workers=2)
+        mm_dir = await mm_async.AsyncMMDir.open(str(tmp_path / "mmdir"), pool)
+        opened = []
+        open_func = mm_dir.sync.open
+
+        def _open(entry_set_num, file_name):
+            f = open_func(entry_set_num, file_name)
+            opened.append(f)
+            return f
+        mm_dir.sync.open = _open
+        try:
+            async with contextlib.aclosing(mm_dir.iter_chunks(0, "c/large.bin", chunk_size=100)) as chunk_iter:
+                async for chunk in chunk_iter:
+                    assert len(chunk) == 100
+                    break
+        finally:
+            pool.shutdown(wait=True)
+        assert len(opened) == 1 and opened[0].closed
+    asyncio.run(_main())
+
+def test_async_extract_cancel_stops_extraction(tmp_path, mm_zip_path):
+    async def _main():
+        pool = mm_async.MMAsyncPool(max_workers=2)
+        mm_dir = await mm_async.AsyncMMDir.open(str(tmp_path / "mmdir"), pool)
+        started = threading.Event()
+        extract_func = mm_dir.sync.extract
+
+        def _extract(entry_set_num, extract_to, cancel_event=None, **kwargs):
+            # extraction starts once the caller has given up
+            started.set()
+            cancel_event.wait(_TIMEOUT)
+            extract_func(entry_set_num, extract_to, cancel_event=cancel_event, **kwargs)
+        mm_dir.sync.extract = _extract
+        try:
+            task = asyncio.ensure_future(mm_dir.extract(0, str(tmp_path / "out")))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, _TIMEOUT)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            pool.shutdown(wait=True)
+        assert not [path for path in (tmp_path / "out").rglob("*") if path.is_file()]
+    asyncio.run(_main())
+
+def test_async_extract(tmp_path, mm_zip_path, member_map_list):
+    async def _main():
+        pool = mm_async.MMAsyncPool(max_workers=2)
+        try:
+            async with await mm_async.AsyncMMZip.open(mm_zip_path, pool) as mm_zip:
+                await mm_zip.extract(1, str(tmp_path / "out"))
+        finally:
+            pool.shutdown()
+        for name, data in member_map_list[1].items():
+            assert (tmp_path / "out" / name).read_bytes() == data
+    asyncio.run(_main())
@@ -0,0 +1,49 @@
+import json
+import mmzip
+import mmzip.mm_const as mm_const
+import mmzip.mm_batch as mm_batch
+from conftest import write_zip
+
+def test_batch_ingest_drops_stale_pending_record(tmp_path, member_map_list):
+    mm_dir_path = tmp_path / "mmdir"
+    zip_path = tmp_path / "src.zip"
+    write_zip(zip_path, member_map_list[0])
+    archive = str(zip_path.resolve())
+    # a commit interrupted before its entry set was saved
+    mmzip.MMDir(str(mm_dir_path)).create()
+    journal_path = mm_dir_path / mm_const.FILE_PATH_BATCH_JOURNAL
+    journal_path.parent.mkdir()
+    journal_path.write_text(json.dumps({mm_const.BATCH_ARCHIVE: archive, mm_const.BATCH_STATE: mm_const.BATCH_STATE_PENDING, mm_const.BATCH_ENTRY_SET_NUM: 0}) + "\n")
+
+    assert mmzip.mmdir_batch_ingest([], str(mm_dir_path), workers=1) == {"done": {}, "failed": {}}
+    assert json.loads(journal_path.read_text().splitlines()[-1])[mm_const.BATCH_STATE] == mm_const.BATCH_STATE_DROPPED
+    assert archive not in mm_batch._load_journal(journal_path)
+
+    result = mmzip.mmdir_batch_ingest([str(zip_path)], str(mm_dir_path), workers=1)
+    assert result == {"done": {str(zip_path): 0}, "failed": {}}
+    assert mm_batch._load_journal(journal_path)[archive][mm_const.BATCH_STATE] == mm_const.BATCH_STATE_DONE
+    mm_dir = mmzip.MMDir(str(mm_dir_path))
+    for name, data in member_map_list[0].items():
+        with mm_dir.open(0, name) as f:
+            assert f.read() == data
+
+def test_batch_ingest_drops_torn_entry_set(tmp_path, member_map_list):
+    mm_dir_path = tmp_path / "mmdir"
+    zip_path = tmp_path / "src.zip"
+    write_zip(zip_path, member_map_list[0])
+    archive = str(zip_path.resolve())
+    # a commit interrupted while its entry set was written
+    mmzip.MMDir(str(mm_dir_path)).create()
+    journal_path = mm_dir_path / mm_const.FILE_PATH_BATCH_JOURNAL
+    journal_path.parent.mkdir()
+    journal_path.write_text(json.dumps({mm_const.BATCH_ARCHIVE: archive, mm_const.BATCH_STATE: mm_const.BATCH_STATE_PENDING, mm_const.BATCH_ENTRY_SET_NUM: 0}) + "\n")
+    (mm_dir_path / mm_const.FILE_PATH_FORMAT_ENTRY_SET.format(0)).write_text('{"file_name": "src.z')
+
+    result = mmzip.mmdir_batch_ingest([str(zip_path)], str(mm_dir_path), workers=1)
+    assert result == {"done": {str(zip_path): 0}, "failed": {}}
+    mm_dir = mmzip.MMDir(str(mm_dir_path))
+    assert mm_dir.get_entry_set_num_list() == [0]
+    for name, data in member_map_list[0].items():
+        with mm_dir.open(0, name) as f:
+            assert f.read() == data
+    assert mm_dir.verify()["ok"]
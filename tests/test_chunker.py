@@ -0,0 +1,32 @@
+import io
+import random
+import mmzip.mm_chunker as mm_chunker
+import mmzip.mm_const as mm_const
+
+def _find_cut_point_reference(buf, min_size: int = mm_const.CHUNK_MIN_SIZE, max_size: int = mm_const.CHUNK_MAX_SIZE) -> int:
+    size = len(buf)
+    if size <= min_size:
+        return size
+    end = min(size, max_size)
+    h = 0
+    for i in range(min_size, end):
+        h = ((h << 1) + mm_chunker._GEAR_TABLE[buf[i]]) & mm_chunker._MASK_64
+        if not h & mm_chunker._CUT_MASK:
+            return i + 1
+    return end
+
+def test_find_cut_point_matches_byte_loop():
+    rand = random.Random(1)
+    data = bytes(rand.getrandbits(8) for _ in range(600 * 1024)) + bytes(300 * 1024)
+    for start in (0, 1, 70000, 400000, 600 * 1024):
+        for size in (0, mm_const.CHUNK_MIN_SIZE, mm_const.CHUNK_MIN_SIZE + 1, 100000, mm_const.CHUNK_MAX_SIZE):
+            buf = bytearray(data[start:start + size])
+            assert mm_chunker.find_cut_point(buf) == _find_cut_point_reference(buf)
+
+def test_iter_chunks_round_trip():
+    rand = random.Random(2)
+    data = bytes(rand.getrandbits(8) for _ in range(1024 * 1024))
+    chunk_list = list(mm_chunker.iter_chunks(io.BytesIO(data)))
+    assert b"".join(chunk_list) == data
+    assert all(len(chunk) <= mm_const.CHUNK_MAX_SIZE for chunk in chunk_list)
+    assert all(len(chunk) >= mm_const.CHUNK_MIN_SIZE for chunk in chunk_list[:-1])
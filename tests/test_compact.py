@@ -0,0 +1,125 @@
+import os
+import json
+import zipfile
+import pytest
+import mmzip
+import mmzip.mm_const as mm_const
+import mmzip.mm_compact as mm_compact
+from conftest import write_zip
+
+class _Interrupted(Exception):
+    pass
+
+def _create_mm_dir(tmp_path, member_map_list: list) -> mmzip.MMDir:
+    """MMDir of entry sets 1 and 2 of member_map_list, with entry set 0 removed to leave gaps."""
+    tmp_path.mkdir(exist_ok=True)
+    mm_dir_path = tmp_path / "mmdir"
+    for i, member_map in enumerate(member_map_list):
+        zip_path = tmp_path / "src{}.zip".format(i)
+        write_zip(zip_path, member_map)
+        if i == 0:
+            mmzip.zip_to_mmdir(str(zip_path), str(mm_dir_path), dedup=True)
+        else:
+            mmzip.MMDir(str(mm_dir_path)).add_archive(str(zip_path))
+    mm_dir = mmzip.MMDir(str(mm_dir_path))
+    mm_dir.remove_entry_set(0)
+    return mm_dir
+
+def _assert_compacted(mm_dir: mmzip.MMDir, member_map_list: list) -> None:
+    assert not (mm_dir.base_dir_path / mm_const.DIR_PATH_COMPACT).exists()
+    assert mm_dir.get_entry_set_num_list() == list(range(len(member_map_list) - 1))
+    data_name_list = sorted(file["entry_name"] for file in mm_dir.get_data_files())
+    assert data_name_list == [mm_const.FILE_PATH_FORMAT_DATA.format(data_num) for data_num in range(1, len(data_name_list) + 1)]
+    for entry_set_num, member_map in enumerate(member_map_list[1:]):
+        for name, data in member_map.items():
+            with mm_dir.open(entry_set_num, name) as f:
+                assert f.read() == data
+    assert mm_dir.verify()["ok"]
+
+@pytest.fixture
+def three_member_map_list(member_map_list) -> list:
+    return member_map_list + [{"d/unique.txt": b"only in the third archive\n" * 100, "d/empty.txt": b""}]
+
+def test_compact_mmdir(tmp_path, three_member_map_list):
+    mm_dir = _create_mm_dir(tmp_path, three_member_map_list)
+    mm_dir.compact()
+    _assert_compacted(mmzip.MMDir(str(mm_dir.base_dir_path)), three_member_map_list)
+
+def test_compact_mmdir_resumes_after_each_rename(tmp_path, three_member_map_list, monkeypatch):
+    # every data move of the copy phase and every rename of the swap phase in turn
+    rename = os.rename
+    phase_set = set()
+    stop_after = 0
+    while True:
+        mm_dir = _create_mm_dir(tmp_path / str(stop_after), three_member_map_list)
+        plan_path = mm_dir.base_dir_path / mm_const.FILE_PATH_COMPACT_PLAN
+        rename_count = [0]
+
+        def _rename(src, dst):
+            if rename_count[0] == stop_after:
+                raise _Interrupted()
+            rename_count[0] += 1
+            rename(src, dst)
+        monkeypatch.setattr(mm_compact.os, "rename", _rename)
+        try:
+            mm_dir.compact()
+            interrupted = False
+        except _Interrupted:
+            interrupted = True
+            phase_set.add(json.loads(plan_path.read_text())[mm_const.COMPACT_PLAN_PHASE])
+        monkeypatch.setattr(mm_compact.os, "rename", rename)
+        if not interrupted:
+            break
+        # a new process picks it up
+        mm_dir = mmzip.MMDir(str(mm_dir.base_dir_path))
+        mm_dir.compact()
+        _assert_compacted(mmzip.MMDir(str(mm_dir.base_dir_path)), three_member_map_list)
+        stop_after += 1
+    assert phase_set == {mm_const.COMPACT_PHASE_COPY, mm_const.COMPACT_PHASE_SWAP}
+    # the data files moved and the four renames of mm_info/ and data/
+    assert stop_after == len(mm_dir.get_data_files()) + 4
+    _assert_compacted(mm_dir, three_member_map_list)
+
+def test_compact_mmdir_resumes_after_copied_entry_sets(tmp_path, three_member_map_list, monkeypatch):
+    mm_dir = _create_mm_dir(tmp_path, three_member_map_list)
+
+    def _copy_info_files(mm_dir, compact_dir_path):
+        raise _Interrupted()
+    copy_info_files = mm_compact._copy_info_files
+    monkeypatch.setattr(mm_compact, "_copy_info_files", _copy_info_files)
+    with pytest.raises(_Interrupted):
+        mm_dir.compact()
+    monkeypatch.setattr(mm_compact, "_copy_info_files", copy_info_files)
+    mm_dir = mmzip.MMDir(str(mm_dir.base_dir_path))
+    mm_dir.compact()
+    _assert_compacted(mm_dir, three_member_map_list)
+
+def _read_all(mm_zip: mmzip.MMZip, entry_set_num: int, member_map: dict) -> None:
+    for name, data in member_map.items():
+        with mm_zip.open(entry_set_num, name) as f:
+            assert f.read() == data
+
+def test_mmzip_remove_entry_set_and_compact(mm_zip_path, member_map_list):
+    mm_zip = mmzip.MMZip(mm_zip_path)
+    try:
+        data_count = len(mm_zip.get_data_entry_name_list())
+        mm_zip.remove_entry_set(0)
+        assert mm_zip.get_entry_set_num_list() == [1]
+        _read_all(mm_zip, 1, member_map_list[1])
+        assert mm_zip.verify()["ok"]
+        data_name_list = mm_zip.get_data_entry_name_list()
+        assert len(data_name_list) < data_count
+        with pytest.raises(Exception):
+            mm_zip.remove_entry_set(0)
+
+        mm_zip.compact()
+        assert mm_zip.get_entry_set_num_list() == [0]
+        assert sorted(mm_zip.get_data_entry_name_list()) == [mm_const.FILE_PATH_FORMAT_DATA.format(data_num) for data_num in range(1, len(data_name_list) + 1)]
+        _read_all(mm_zip, 0, member_map_list[1])
+        assert mm_zip.verify()["ok"]
+    finally:
+        mm_zip.close()
+    with zipfile.ZipFile(mm_zip_path) as zf:
+        name_list = zf.namelist()
+    assert name_list[-1] == mm_const.FILE_PATH_MEMBER_INDEX
+    assert len(name_list) == len(set(name_list))
@@ -0,0 +1,39 @@
+import zipfile
+import mmzip
+import mmzip.mm_const as mm_const
+
+def test_mmzip_convert_entry_set_with_member_index(tmp_path, mm_zip_path, member_map_list):
+    mm_zip = mmzip.MMZip(mm_zip_path)
+    assert mm_zip._member_index is not None
+    mm_zip.close()
+    output_path = str(tmp_path / "binary.mmzip")
+    mmzip.mmzip_convert_entry_set(mm_zip_path, output_path)
+
+    with zipfile.ZipFile(output_path) as zf:
+        name_list = zf.namelist()
+    assert len(name_list) == len(set(name_list))
+    assert not any(name.endswith(".json") and "entry_set" in name for name in name_list)
+
+    mm_zip = mmzip.MMZip(output_path)
+    try:
+        assert mm_zip.have_info()
+        assert mm_zip.get_entry_set_format() == mm_const.ENTRY_SET_FORMAT_BINARY
+        assert mm_zip.get_entry_set_num_list() == list(range(len(member_map_list)))
+        for entry_set_num, member_map in enumerate(member_map_list):
+            for name, data in member_map.items():
+                with mm_zip.open(entry_set_num, name) as f:
+                    assert f.read() == data
+        assert mm_zip.verify()["ok"]
+    finally:
+        mm_zip.close()
+
+def test_mmzip_convert_entry_set_copies_data_raw(tmp_path, mm_zip_path):
+    output_path = str(tmp_path / "binary.mmzip")
+    mmzip.mmzip_convert_entry_set(mm_zip_path, output_path)
+    with zipfile.ZipFile(mm_zip_path) as src, zipfile.ZipFile(output_path) as dst:
+        for src_info in src.infolist():
+            if not src_info.filename.startswith(mm_const.DIR_PATH_DATA):
+                continue
+            dst_info = dst.getinfo(src_info.filename)
+            assert (dst_info.compress_type, dst_info.compress_size, dst_info.CRC) == (src_info.compress_type, src_info.compress_size, src_info.CRC)
+            assert dst.read(dst_info) == src.read(src_info)
@@ -0,0 +1,25 @@
+import io
+import mmzip.mm_const as mm_const
+import mmzip.mm_data_writer as mm_data_writer
+
+def test_data_writer_reads_each_member_once(tmp_path):
+    (tmp_path / mm_const.DIR_PATH_DATA).mkdir()
+    data_writer = mm_data_writer.MMDataWriter(tmp_path, dedup=True)
+    open_count = [0]
+
+    def _open_func(data: bytes):
+        def _open():
+            open_count[0] += 1
+            return io.BytesIO(data)
+        return _open
+
+    # all of the same size, the third a duplicate of the first
+    data_list = [b"a" * 100, b"b" * 100, b"a" * 100, b"c" * 100]
+    entry_name_list = [data_writer.add(_open_func(data), len(data)) for data in data_list]
+    assert open_count[0] == len(data_list)
+    assert entry_name_list == ["data/00001", "data/00002", "data/00001", "data/00003"]
+    assert data_writer.next_data_num == 4
+    assert sorted(path.name for path in (tmp_path / mm_const.DIR_PATH_DATA).iterdir()) == ["00001", "00002", "00003"]
+    for entry_name, data in zip(entry_name_list, data_list):
+        assert (tmp_path / entry_name).read_bytes() == data
+    assert sorted(data_writer.data_index.get_entry_name_list()) == ["data/00001", "data/00002", "data/00003"]
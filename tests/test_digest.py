@@ -0,0 +1,17 @@
+import os
+import zlib
+import mmzip.mm_digest as mm_digest
+
+def test_crc32_combine_matches_zlib():
+    data_list = [b"", b"a", b"hello world", os.urandom(1), os.urandom(1000), os.urandom(65537)]
+    for data1 in data_list:
+        for data2 in data_list:
+            crc = mm_digest.crc32_combine(zlib.crc32(data1), zlib.crc32(data2), len(data2))
+            assert crc == zlib.crc32(data1 + data2)
+
+def test_crc32_combine_many_blocks():
+    block_list = [os.urandom(size) for size in (7, 4096, 0, 12345, 1)]
+    crc = 0
+    for block in block_list:
+        crc = mm_digest.crc32_combine(crc, zlib.crc32(block), len(block))
+    assert crc == zlib.crc32(b"".join(block_list))
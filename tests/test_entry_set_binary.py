@@ -0,0 +1,64 @@
+import json
+import mmzip.mm_const as mm_const
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_entry_set_binary as mm_entry_set_binary
+
+def _entry(file_name: str, entry_name: str, crc: int, is_dir: bool = False, **extra) -> dict:
+    entry = {
+        mm_const.ENTRY_FILE_NAME: file_name,
+        mm_const.ENTRY_DATE_TIME: [2024, 2, 29, 23, 59, 58],
+        mm_const.ENTRY_IS_DIR: is_dir,
+        mm_const.ENTRY_COMMENT: "",
+        mm_const.ENTRY_ENTRY_NAME: entry_name,
+        mm_const.ENTRY_CRC: crc
+    }
+    entry.update(extra)
+    return entry
+
+def _entry_set(entry_list: list) -> dict:
+    return {
+        mm_const.ENTRY_SET_FILE_NAME: "src.zip",
+        mm_const.ENTRY_SET_ENTRY_LIST: entry_list,
+        mm_const.ENTRY_SET_COMMENT: "comment é",
+        "extra_key": {"nested": [1, 2]}
+    }
+
+def _json_round_trip(entry_set: dict) -> dict:
+    return json.loads(json.dumps(entry_set))
+
+def test_binary_entry_set_round_trip():
+    entry_set = _entry_set([
+        _entry("a/", None, None, is_dir=True),
+        _entry("a/b.txt", "data/00001", 0, **{mm_const.ENTRY_COMMENT: "あ"}),
+        _entry("top.bin", "data/00002", 0xFFFFFFFF),
+        _entry("a/same.txt", "data/00001", 0),
+        _entry("a/chunked.bin", None, 123456, **{mm_const.ENTRY_CHUNK_LIST: ["data/00003", "data/00004"]}),
+        _entry("a/dir/", None, None, is_dir=True, mode=0o755),
+    ])
+    data = mm_entry_set.dumps(entry_set, mm_const.ENTRY_SET_FORMAT_BINARY)
+    assert mm_entry_set_binary.is_binary(data)
+
+    compact = mm_entry_set.loads(data)
+    assert isinstance(compact, mm_entry_set_binary.MMCompactEntrySet)
+    assert compact[mm_const.ENTRY_SET_FILE_NAME] == "src.zip"
+    assert compact["extra_key"] == {"nested": [1, 2]}
+    entry_list = compact[mm_const.ENTRY_SET_ENTRY_LIST]
+    assert len(entry_list) == 6
+    assert entry_list[-1] == entry_list[5] == _json_round_trip(entry_set)[mm_const.ENTRY_SET_ENTRY_LIST][5]
+    assert mm_entry_set.loads_dict(data) == _json_round_trip(entry_set)
+    # back to json from the compact form
+    assert json.loads(mm_entry_set.dumps(compact)) == _json_round_trip(entry_set)
+
+def test_binary_entry_set_untyped_values_round_trip():
+    # values the typed columns can not hold fall back to a json column
+    entry_set = _entry_set([
+        _entry("a.txt", "not/a/data/name", -5, **{mm_const.ENTRY_COMMENT: None}),
+        _entry("b.txt", "data/00001", 1, **{mm_const.ENTRY_COMMENT: 7}),
+    ])
+    del entry_set[mm_const.ENTRY_SET_ENTRY_LIST][1][mm_const.ENTRY_DATE_TIME]
+    data = mm_entry_set_binary.dumps(entry_set)
+    assert mm_entry_set.loads_dict(data) == _json_round_trip(entry_set)
+
+def test_binary_entry_set_empty():
+    entry_set = _entry_set([])
+    assert mm_entry_set.loads_dict(mm_entry_set_binary.dumps(entry_set)) == _json_round_trip(entry_set)
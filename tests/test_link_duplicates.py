@@ -0,0 +1,57 @@
+import os
+import zipfile
+import pytest
+import mmzip
+
+_DATA = bytes(range(256)) * 20
+_DATE_TIME = (2020, 1, 2, 3, 4, 6)
+_OTHER_DATE_TIME = (2021, 5, 6, 7, 8, 10)
+
+@pytest.fixture(params=["mmdir", "mmzip"])
+def mm_obj(request, tmp_path):
+    zip_path = tmp_path / "src.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, date_time in (("one.bin", _DATE_TIME), ("d/two.bin", _DATE_TIME), ("three.bin", _OTHER_DATE_TIME)):
+            zf.writestr(zipfile.ZipInfo(name, date_time), _DATA)
+    mm_dir_path = tmp_path / "mmdir"
+    mmzip.zip_to_mmdir(str(zip_path), str(mm_dir_path), dedup=True)
+    if request.param == "mmdir":
+        yield mmzip.MMDir(str(mm_dir_path))
+        return
+    mmzip.MMDir(str(mm_dir_path)).to_mmzip(str(tmp_path / "out.mmzip"))
+    mm_zip = mmzip.MMZip(str(tmp_path / "out.mmzip"))
+    yield mm_zip
+    mm_zip.close()
+
+def test_extract_link_duplicates(tmp_path, mm_obj):
+    extract_path = tmp_path / "out"
+    mm_obj.extract(0, str(extract_path), link_duplicates=True)
+    one_stat = (extract_path / "one.bin").stat()
+    two_stat = (extract_path / "d/two.bin").stat()
+    three_stat = (extract_path / "three.bin").stat()
+    # the same mtime shares the inode, another mtime gets its own file
+    assert two_stat.st_ino == one_stat.st_ino
+    assert three_stat.st_ino != one_stat.st_ino
+    assert three_stat.st_mtime != one_stat.st_mtime
+    for name in ("one.bin", "d/two.bin", "three.bin"):
+        assert (extract_path / name).read_bytes() == _DATA
+
+def test_extract_link_duplicates_over_existing_output(tmp_path, mm_obj):
+    extract_path = tmp_path / "out"
+    mm_obj.extract(0, str(extract_path), link_duplicates=True)
+    # files elsewhere hard linked to the outputs must not be written through
+    outside_path_map = {}
+    for name in ("one.bin", "d/two.bin", "three.bin"):
+        outside_path = tmp_path / ("outside_" + name.replace("/", "_"))
+        os.link(extract_path / name, outside_path)
+        outside_path_map[name] = outside_path
+    (tmp_path / "outside_one.bin").write_bytes(b"changed")
+    (tmp_path / "outside_three.bin").write_bytes(b"changed too")
+
+    mm_obj.extract(0, str(extract_path), exist_ok=True, link_duplicates=True)
+    for name, outside_path in outside_path_map.items():
+        assert (extract_path / name).read_bytes() == _DATA
+        assert (extract_path / name).stat().st_ino != outside_path.stat().st_ino
+    assert (tmp_path / "outside_one.bin").read_bytes() == b"changed"
+    assert (tmp_path / "outside_three.bin").read_bytes() == b"changed too"
+    assert (extract_path / "d/two.bin").stat().st_ino == (extract_path / "one.bin").stat().st_ino
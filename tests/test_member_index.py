@@ -0,0 +1,67 @@
+import mmap
+import zipfile
+import pytest
+import mmzip.mm_const as mm_const
+import mmzip.mm_member_index as mm_member_index
+
+_FIELD_LIST = ("header_offset", "compress_size", "file_size", "CRC", "compress_type", "flag_bits")
+
+def _zip_info(file_name: str, n: int) -> zipfile.ZipInfo:
+    zip_info = zipfile.ZipInfo(file_name)
+    zip_info.header_offset = n * 1000
+    zip_info.compress_size = n * 10
+    zip_info.file_size = n * 20
+    zip_info.CRC = 0xFFFFFFFF - n
+    zip_info.compress_type = zipfile.ZIP_DEFLATED if n % 2 else zipfile.ZIP_STORED
+    zip_info.flag_bits = n % 3
+    return zip_info
+
+def _fields(zip_info: zipfile.ZipInfo) -> list:
+    return [getattr(zip_info, field) for field in _FIELD_LIST]
+
+def _read_member_index(path: str) -> mm_member_index.MMMemberIndex:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            return mm_member_index.read_member_index(mapping)
+
+def test_member_index_round_trip():
+    # numbered data members out of order, and names that only look like one
+    name_list = ["mm_info/info.json", "data/00003", "data/00001", "data/1", "data/00002_0", "data/100000"]
+    zip_info_list = [_zip_info(name, n) for n, name in enumerate(name_list)]
+    member_index = mm_member_index.MMMemberIndex.loads(mm_member_index.MMMemberIndex.create(zip_info_list).dumps())
+    assert member_index.count == len(name_list)
+    assert list(member_index.data_num_list) == [1, 3, 100000]
+    for zip_info in zip_info_list:
+        assert zip_info.filename in member_index
+        assert _fields(member_index.get_info(zip_info.filename)) == _fields(zip_info)
+    assert "data/00004" not in member_index
+    with pytest.raises(KeyError):
+        member_index.get_info("data/00004")
+    assert sorted(member_index.get_data_entry_name_list()) == sorted(name for name in name_list if name.startswith(mm_const.DIR_PATH_DATA))
+    assert [zip_info.filename for zip_info in member_index.get_info_list("mm_info/")] == ["mm_info/info.json"]
+
+def test_read_member_index_of_mmzip(mm_zip_path):
+    with zipfile.ZipFile(mm_zip_path) as zf:
+        info_list = zf.infolist()
+        comment = zf.comment
+    # the zip comment points at the local header of the index, the last member
+    assert info_list[-1].filename == mm_const.FILE_PATH_MEMBER_INDEX
+    assert comment == mm_member_index.COMMENT_PREFIX + str(info_list[-1].header_offset).encode("ascii")
+
+    member_index = _read_member_index(mm_zip_path)
+    assert member_index is not None
+    assert member_index.count == len(info_list)
+    for zip_info in info_list[:-1]:
+        assert _fields(member_index.get_info(zip_info.filename)) == _fields(zip_info)
+
+def test_read_member_index_stale_after_append(mm_zip_path):
+    with zipfile.ZipFile(mm_zip_path, "a") as zf:
+        zf.writestr("appended.txt", b"appended")
+    assert _read_member_index(mm_zip_path) is None
+
+def test_read_member_index_without_index(tmp_path):
+    path = str(tmp_path / "plain.zip")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("a.txt", b"a")
+        zf.comment = mm_member_index.COMMENT_PREFIX + b"0"
+    assert _read_member_index(path) is None
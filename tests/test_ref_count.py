@@ -0,0 +1,30 @@
+import mmzip
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_ref_count as mm_ref_count
+from conftest import write_zip
+
+def _rebuilt_ref_count(mm_dir: mmzip.MMDir) -> mm_ref_count.MMRefCount:
+    path_map = mm_dir._scan_entry_set_path_map()
+    return mm_ref_count.create_ref_count((entry_set_num, mm_entry_set.loads(path.read_bytes())) for entry_set_num, path in path_map.items())
+
+def test_stored_ref_count_follows_remove_same_file(tmp_path, member_map_list):
+    mm_dir_path = str(tmp_path / "mmdir")
+    for i, member_map in enumerate(member_map_list):
+        zip_path = tmp_path / "src{}.zip".format(i)
+        write_zip(zip_path, member_map)
+        # without dedup, so remove_same_file has duplicates to merge
+        if i == 0:
+            mmzip.zip_to_mmdir(str(zip_path), mm_dir_path)
+        else:
+            mmzip.MMDir(mm_dir_path).add_archive(str(zip_path), dedup=False)
+    mm_dir = mmzip.MMDir(mm_dir_path)
+    mm_dir.get_ref_count()
+    assert mm_dir.ref_count_file_path.exists()
+
+    mmzip.mmdir_remove_same_file(mm_dir_path)
+
+    mm_dir = mmzip.MMDir(mm_dir_path)
+    stored = mm_dir._load_ref_count()
+    assert stored is not None
+    assert stored.ref_map == _rebuilt_ref_count(mm_dir).ref_map
+    assert stored.get("data/00001") == 2
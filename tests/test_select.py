@@ -0,0 +1,108 @@
+import os
+import pytest
+import mmzip
+import mmzip.mm_const as mm_const
+import mmzip.mm_entry_set as mm_entry_set
+import mmzip.mm_extract as mm_extract
+
+# entry list order differs from sorted order on purpose
+_NAME_LIST = ["b/x.py", "a/", "a/c/d.txt", "ab.txt", "a/b.txt", "a.txt", "a/c/"]
+
+def _entry_set(name_list: list = _NAME_LIST) -> dict:
+    return {mm_const.ENTRY_SET_ENTRY_LIST: [{mm_const.ENTRY_FILE_NAME: name} for name in name_list]}
+
+def _select(include=None, exclude=None, prefix=None) -> list:
+    entry_set = _entry_set()
+    entry_list = mm_extract.select_entry_list(entry_set, lambda: mm_entry_set.create_name_index(entry_set), include, exclude, prefix)
+    return [entry[mm_const.ENTRY_FILE_NAME] for entry in entry_list]
+
+def test_find_prefix():
+    name_index = mm_entry_set.create_name_index(_entry_set())
+    assert name_index.find_prefix("a/") == ["a/", "a/b.txt", "a/c/", "a/c/d.txt"]
+    assert name_index.find_prefix("a") == ["a.txt", "a/", "a/b.txt", "a/c/", "a/c/d.txt", "ab.txt"]
+    assert name_index.find_prefix("a/c/d.txt") == ["a/c/d.txt"]
+    assert name_index.find_prefix("c") == []
+    assert name_index.find_prefix("") == sorted(_NAME_LIST)
+
+def test_select_prefix_keeps_entry_order():
+    assert _select(prefix="a/") == ["a/", "a/c/d.txt", "a/b.txt", "a/c/"]
+    assert _select(prefix="zzz") == []
+
+def test_select_include_star_crosses_slash():
+    assert _select(include="a/*.txt") == ["a/c/d.txt", "a/b.txt"]
+    assert _select(include="*.txt") == ["a/c/d.txt", "ab.txt", "a/b.txt", "a.txt"]
+    assert _select(include="a/?.txt") == ["a/b.txt"]
+    assert _select(include="[ab]/*") == ["b/x.py", "a/", "a/c/d.txt", "a/b.txt", "a/c/"]
+    # matched against the whole name
+    assert _select(include="b.txt") == []
+    assert _select(include=["b/x.py", "a.txt"]) == ["b/x.py", "a.txt"]
+
+def test_select_include_with_prefix():
+    # an include narrower than the prefix, one wider than it and one outside it
+    assert _select(include="a/c/*", prefix="a/") == ["a/c/d.txt", "a/c/"]
+    assert _select(include="*.txt", prefix="a/c/") == ["a/c/d.txt"]
+    assert _select(include="b/*", prefix="a/") == []
+
+def test_select_exclude():
+    assert _select(exclude="*.txt") == ["b/x.py", "a/", "a/c/"]
+    assert _select(exclude=["a/*", "b/*"]) == ["ab.txt", "a.txt"]
+    assert _select(include="a/*", exclude="*/d.txt") == ["a/", "a/b.txt", "a/c/"]
+    assert _select(exclude="*") == []
+
+def test_select_nothing_to_select():
+    entry_set = _entry_set()
+
+    def _name_index_func():
+        raise AssertionError("no name index needed")
+    assert mm_extract.select_entry_list(entry_set, _name_index_func) is entry_set[mm_const.ENTRY_SET_ENTRY_LIST]
+    assert mm_extract.select_entry_list(entry_set, _name_index_func, [], [], "") is entry_set[mm_const.ENTRY_SET_ENTRY_LIST]
+
+@pytest.fixture(params=["mmdir", "mmzip"])
+def mm_obj(request, tmp_path, mm_zip_path):
+    if request.param == "mmdir":
+        yield mmzip.MMDir(str(tmp_path / "mmdir"))
+        return
+    mm_zip = mmzip.MMZip(mm_zip_path)
+    yield mm_zip
+    mm_zip.close()
+
+def _file_set(path) -> set:
+    return set(file.relative_to(path).as_posix() for file in path.rglob("*") if file.is_file())
+
+def test_extract_selected(tmp_path, mm_obj, member_map_list):
+    mm_obj.extract(0, str(tmp_path / "out"), include="*.bin", exclude="c/*")
+    assert _file_set(tmp_path / "out") == {"a/random.bin", "a/same.bin"}
+    mm_obj.extract(0, str(tmp_path / "out2"), prefix="b/")
+    assert _file_set(tmp_path / "out2") == {"b/text.txt", "b/empty.txt"}
+    for name in ("b/text.txt", "b/empty.txt"):
+        assert (tmp_path / "out2" / name).read_bytes() == member_map_list[0][name]
+
+def test_extract_exist_ok(tmp_path, mm_obj, member_map_list):
+    extract_path = tmp_path / "out"
+    extract_path.mkdir()
+    with pytest.raises(Exception):
+        mm_obj.extract(0, str(extract_path))
+    assert _file_set(extract_path) == set()
+    mm_obj.extract(0, str(extract_path), exist_ok=True)
+    assert _file_set(extract_path) == set(member_map_list[0])
+
+def test_extract_skip_up_to_date(tmp_path, mm_obj, member_map_list):
+    extract_path = tmp_path / "out"
+    mm_obj.extract(0, str(extract_path))
+    same_size_path = extract_path / "b/text.txt"
+    other_size_path = extract_path / "a/random.bin"
+    stat = same_size_path.stat()
+    # same size and mtime, taken as up to date even though the content differs
+    same_size_path.write_bytes(b"x" * stat.st_size)
+    os.utime(same_size_path, (stat.st_atime, stat.st_mtime))
+    stat = other_size_path.stat()
+    other_size_path.write_bytes(b"short")
+    os.utime(other_size_path, (stat.st_atime, stat.st_mtime))
+
+    mm_obj.extract(0, str(extract_path), exist_ok=True, skip_up_to_date=True)
+    assert same_size_path.read_bytes() == b"x" * len(member_map_list[0]["b/text.txt"])
+    assert other_size_path.read_bytes() == member_map_list[0]["a/random.bin"]
+
+    mm_obj.extract(0, str(extract_path), exist_ok=True)
+    for name, data in member_map_list[0].items():
+        assert (extract_path / name).read_bytes() == data